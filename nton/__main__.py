@@ -1,4 +1,7 @@
+import multiprocessing
+
 from nton.main import main
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # for build-batch workers in frozen builds
     main()
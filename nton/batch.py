@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import csv
+import glob
+import json
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence, Union
+
+from nton import pack, tools
+from nton.build import BuildError, BuildJob, BuildResult, build_forwarder, resolve_sdmc, resolve_title_id
+from nton.cache import AssetCache, BuildCache
+from nton.constants import Directories
+
+JOB_FIELDS = tuple(f.name for f in fields(BuildJob))
+
+
+@dataclass
+class BatchResult:
+    """The outcome of one job of a batch, either a BuildResult or an error."""
+
+    job: BuildJob
+    result: Optional[BuildResult] = None
+    error: Optional[str] = None
+    critical: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.result is not None
+
+    def to_dict(self) -> dict:
+        job = {k: str(v) if isinstance(v, Path) else v for k, v in asdict(self.job).items()}
+        data: dict = {"ok": self.ok, "job": job}
+        if self.result:
+            data.update(
+                title_id=self.result.title_id,
+                name=self.result.name,
+                publisher=self.result.publisher,
+                version=self.result.version,
+                output_path=str(self.result.output_path),
+                warnings=self.result.warnings,
+                cached=self.result.cached,
+            )
+        else:
+            data.update(error=self.error, critical=self.critical)
+        return data
+
+
+def _job(row: Any) -> BuildJob:
+    if not isinstance(row, dict):
+        raise ValueError(f"expected an object of fields, not {type(row).__name__}")
+    if None in row:  # csv.DictReader's key for the values of a row beyond its header
+        raise ValueError("it has more values than the header has fields")
+    unknown = {str(k) for k in row} - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}")
+    for k, v in row.items():
+        if v is not None and not isinstance(v, str):
+            raise ValueError(f'the field "{k}" must be a string, not {type(v).__name__}')
+    if not row.get("path"):
+        raise ValueError("every entry must have a path")
+    values: dict[str, Any] = {k: v or None for k, v in row.items()}
+    values["path"] = Path(row["path"])
+    if values.get("icon"):
+        values["icon"] = Path(row["icon"])
+    return BuildJob(**values)
+
+
+def read_manifest(path: Path) -> list[Union[BuildJob, BatchResult]]:
+    """
+    Read a manifest of build jobs, raising a ValueError if the file cannot be read.
+
+    A manifest is either a CSV file with a header row, or a file with one JSON object
+    per line. Both use the fields of a BuildJob, i.e., path, sdmc, name, publisher,
+    version, icon, id, and rom, where only path is required. Every field is a string.
+
+    An invalid entry is returned as a failed BatchResult naming its line, so only that
+    entry fails. Its job is a placeholder with the path of the manifest.
+    """
+    jobs: list[Union[BuildJob, BatchResult]] = []
+    with open(path, encoding="utf8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            reader = csv.DictReader(f)
+            rows: Iterable[tuple[int, Any]] = ((reader.line_num, row) for row in reader)
+        else:
+            rows = ((i, line) for i, line in enumerate(f, start=1) if line.strip())
+        for i, row in rows:
+            try:
+                jobs.append(_job(row if isinstance(row, dict) else json.loads(row)))
+            except ValueError as e:
+                jobs.append(BatchResult(BuildJob(path=path), error=f"Line {i} of the manifest is invalid, {e}"))
+    return jobs
+
+
+def expand_paths(paths: Iterable[str]) -> list[BuildJob]:
+    """Get a build job for every NRO path, expanding glob patterns."""
+    jobs: list[BuildJob] = []
+    for pattern in paths:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        jobs.extend(BuildJob(path=Path(match)) for match in matches)
+    return jobs
+
+
+def assign_title_ids(jobs: Sequence[Union[BuildJob, BatchResult]]) -> list[Union[BuildJob, BatchResult]]:
+    """
+    Resolve the sdmc path and Title ID of every job, making sure they are unique across the batch.
+
+    Jobs that fail to resolve are returned as a failed BatchResult instead, and jobs that
+    already failed, e.g., invalid manifest entries, are passed through.
+    """
+    taken: set[str] = set()
+    resolved: list[Union[BuildJob, BatchResult]] = []
+    for job in jobs:
+        if isinstance(job, BatchResult):
+            resolved.append(job)
+            continue
+        try:
+            sdmc = resolve_sdmc(job.path, job.sdmc)
+            title_id = resolve_title_id(job.path, sdmc, job.id, taken)
+        except BuildError as e:
+            resolved.append(BatchResult(job, error=str(e), critical=e.critical))
+            continue
+        except (TypeError, ValueError) as e:  # e.g., a field of the wrong type
+            resolved.append(BatchResult(job, error=f"The job is invalid, {e}"))
+            continue
+        taken.add(title_id)
+        resolved.append(replace(job, sdmc=sdmc, id=title_id))
+    return resolved
+
+
+def run_job(
+    job: BuildJob,
+    packer: Optional[str],
+    output_dir: Path,
+    cache: Optional[BuildCache] = None,
+    asset_cache: Optional[AssetCache] = None,
+) -> BatchResult:
+    """Build one job of a batch, returning any error rather than raising it."""
+    log = logging.getLogger(f"build.{job.path.stem}")
+    try:
+        return BatchResult(job, result=build_forwarder(job, packer, output_dir, log, cache, asset_cache))
+    except BuildError as e:
+        return BatchResult(job, error=str(e), critical=e.critical)
+    except Exception as e:  # any unexpected failure should only fail its own job
+        return BatchResult(job, error=f"{type(e).__name__}: {e}", critical=True)
+
+
+def _init_worker(level: int, tool_jobs: Optional[int], timeout: Optional[float]) -> None:
+    logging.basicConfig(level=level, format="%(asctime)s [%(levelname).1s] %(name)s : %(message)s")
+    tools.configure(tool_jobs, timeout)
+
+
+def run_batch(
+    jobs: Sequence[Union[BuildJob, BatchResult]],
+    packer: Optional[str] = None,
+    output_dir: Path = Directories.output,
+    max_workers: Optional[int] = None,
+    cache: Optional[BuildCache] = None,
+    asset_cache: Optional[AssetCache] = None,
+    tool_jobs: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> list[BatchResult]:
+    """
+    Build every job of a batch in parallel, in the order of the jobs.
+
+    Title IDs are assigned up front so that they are unique across the batch. A job
+    that fails does not stop the others, its error is in its BatchResult. Jobs that
+    already failed, e.g., invalid manifest entries, are reported as-is.
+
+    Builds with hacBrewPack mostly wait on the tool, so they run on a thread pool that
+    shares one tool runner. Up to `tool_jobs` hacBrewPack processes run at once while
+    the other builds extract and stage their NROs, and a tool that hangs for `timeout`
+    seconds is killed. The native packer is CPU-bound, so it runs on a process pool.
+    """
+    packer = packer or pack.default_packer()
+    resolved = assign_title_ids(jobs)
+    results: list[Optional[BatchResult]] = [x if isinstance(x, BatchResult) else None for x in resolved]
+    pending = {i: x for i, x in enumerate(resolved) if isinstance(x, BuildJob)}
+    if pending:
+        pool: Executor
+        if packer == "hacbrewpack":
+            tools.configure(tool_jobs, timeout)
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(logging.getLogger().getEffectiveLevel(), tool_jobs, timeout),
+            )
+        with pool:
+            futures = {
+                i: pool.submit(run_job, job, packer, output_dir, cache, asset_cache) for i, job in pending.items()
+            }
+            for i, future in futures.items():
+                try:
+                    results[i] = future.result()
+                except Exception as e:  # e.g., a worker process died
+                    results[i] = BatchResult(pending[i], error=f"{type(e).__name__}: {e}", critical=True)
+    return [x for x in results if x is not None]
+
+
+def format_summary(results: Sequence[BatchResult]) -> str:
+    """Format the results of a batch as a plain-text table."""
+    rows = [("Status", "Title ID", "NRO", "Output or Error")]
+    for x in results:
+        if x.result:
+            status = "CACHED" if x.result.cached else "OK"
+            rows.append((status, x.result.title_id, str(x.job.path), x.result.output_path.name))
+        else:
+            rows.append(("CRITICAL" if x.critical else "FAILED", x.job.id or "-", str(x.job.path), x.error or ""))
+    widths = [max(len(row[i]) for row in rows) for i in range(3)]
+    return "\n".join("  ".join([*(cell.ljust(width) for cell, width in zip(row[:3], widths)), row[3]]) for row in rows)
+
+
+def write_results(results: Sequence[BatchResult], path: Path) -> None:
+    """Write the results of a batch as JSON."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps([x.to_dict() for x in results], indent=2), encoding="utf8")
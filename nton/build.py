@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import base64
+import logging
+import string
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Container, Optional
+
+from nton import host, nro, pack, title_ids
+from nton.cache import AssetCache, BuildCache, get_build_key
+from nton.constants import Directories, Files
+from nton.forwarder import Forwarder
+from nton.icon import normalize_icon
+from nton.keys import KeysError
+from nton.nacp import Nacp
+from nton.toolchain import toolchain
+
+
+class BuildError(Exception):
+    """
+    A forwarder could not be built.
+
+    Critical errors are those where continuing would be unsafe or where a tool or
+    input failed unexpectedly, rather than a simple user error.
+    """
+
+    def __init__(self, message: str, critical: bool = False) -> None:
+        super().__init__(message)
+        self.critical = critical
+
+
+@dataclass
+class BuildJob:
+    """The inputs of a forwarder build, everything but the NRO path is optional."""
+
+    path: Path
+    sdmc: Optional[str] = None
+    name: Optional[str] = None
+    publisher: Optional[str] = None
+    version: Optional[str] = None
+    icon: Optional[Path] = None
+    id: Optional[str] = None
+    rom: Optional[str] = None
+
+
+@dataclass
+class BuildResult:
+    job: BuildJob
+    title_id: str
+    name: str
+    publisher: str
+    version: str
+    output_path: Path
+    warnings: list[str] = field(default_factory=list)
+    cached: bool = False
+
+
+def resolve_sdmc(path: Path, sdmc: Optional[str] = None) -> str:
+    """Get the sdmc:/ path of an NRO, inferring it from the path if it's on the Switch's microSD card."""
+    if sdmc:
+        if not sdmc.startswith("sdmc:/"):
+            if not sdmc.startswith("/"):
+                sdmc = f"/{sdmc}"
+            sdmc = f"sdmc:{sdmc}"
+        return sdmc
+
+    path_root = Path(path.anchor)
+    if not (
+        ((path_root / "Nintendo").exists() and (path_root / "switch").exists())
+        or ((path_root / "atmosphere").exists() and ((path_root / "bootloader").exists()))
+    ):
+        raise BuildError(
+            "The NRO path must be a path on your Switch's microSD card to implicitly infer the sdmc path. "
+            "You can use --sdmc to manually specify the path relative to the Switch's microSD card."
+        )
+    return path.resolve().absolute().as_posix().replace(path.anchor.replace("\\", "/"), "sdmc:/")
+
+
+def resolve_title_id(
+    path: Path,
+    sdmc: str,
+    id_: Optional[str] = None,
+    taken: Container[str] = frozenset(),
+    log: logging.Logger = logging.getLogger("build"),
+) -> str:
+    """
+    Get the Title ID of a forwarder, validating it if one was specified.
+
+    The unofficial Title ID of the NRO is used if it has one, otherwise a free Title ID
+    is allocated. Title IDs in `taken`, e.g., ones used by other titles of a batch, are
+    never used.
+    """
+    if id_:
+        if any(c not in string.hexdigits for c in id_):
+            raise BuildError(f'The Title ID "{id_}" is an invalid hex string. It must be a-fA-f0-9.')
+        id_ = id_.lower()
+        if title_ids.registry.is_system(id_):
+            raise BuildError(f'The Title ID "{id_}" is a reserved System Title! Using it is unsafe!', critical=True)
+        if id_ in taken:
+            raise BuildError(f'The Title ID "{id_}" is already used by another title in this batch.')
+        owner = title_ids.registry.owner_of(id_)
+        if owner:
+            log.warning(f'The Title ID "{id_}" is already used by "{owner}".')
+        return id_
+
+    id_ = title_ids.registry.unofficial_id(path.stem) or title_ids.registry.unofficial_id(Path(sdmc).stem)
+    while not id_ or id_ in taken:
+        id_ = title_ids.registry.allocate_free_id()
+    return id_
+
+
+def build_forwarder(
+    job: BuildJob,
+    packer: Optional[str] = None,
+    output_dir: Path = Directories.output,
+    log: logging.Logger = logging.getLogger("build"),
+    cache: Optional[BuildCache] = None,
+    asset_cache: Optional[AssetCache] = None,
+) -> BuildResult:
+    """
+    Build an NSP forwarder that loads an NRO on the Switch's microSD card.
+
+    If a build cache is given and an NSP was already built from the same inputs, it's
+    placed at the output path instead of packing it again. If an asset cache is given,
+    the NACP and Icon of an unchanged NRO are not extracted again.
+
+    Raises a BuildError if the forwarder could not be built.
+    """
+    warnings: list[str] = []
+
+    def warn(message: str) -> None:
+        warnings.append(message)
+        log.warning(message)
+
+    packer = packer or pack.default_packer()
+    if packer == "hacbrewpack" and not toolchain.path("hacbrewpack"):
+        raise BuildError("hacBrewPack binary is missing, cannot build NSP.")
+
+    path = job.path
+    if not path.is_file():
+        raise BuildError(f'The NRO path "{path}" does not exist, or is not a file.')
+
+    if path.suffix.lower() != ".nro":
+        raise BuildError(f'The NRO path "{path}" is not to an NRO file.')
+
+    sdmc = resolve_sdmc(path, job.sdmc)
+
+    try:
+        nro.verify(path)
+    except nro.NroError as e:
+        raise BuildError(f'The NRO "{path}" is invalid, {e}', critical=True)
+
+    log.info("NRO checked and verified")
+
+    id_ = resolve_title_id(path, sdmc, job.id, log=log)
+
+    rom = job.rom
+    if rom and not rom.startswith("/"):
+        rom = f"/{rom}"
+
+    log.info("Title ID: %s", id_)
+
+    try:
+        assets = asset_cache.get_assets(path) if asset_cache else nro.get_assets(path)
+    except nro.NroError as e:
+        raise BuildError(f"Failed extracting the NACP and Icon partitions from the NRO, {e}", critical=True)
+
+    name, publisher, version = job.name, job.publisher, job.version
+
+    if assets.nacp:
+        control = Nacp(assets.nacp)
+    else:
+        warn("The NRO does not have a NACP partition, building a new one.")
+        if not name or not publisher or not version:
+            raise BuildError(
+                "You must specify a Name, Publisher, and Version to be able to build the NACP. "
+                "You may also want to specify an Icon but it is not strictly necessary."
+            )
+        try:
+            control = Nacp.from_template(name, publisher, version, int(id_, 16))
+        except ValueError as e:
+            raise BuildError(f"Failed to build a new NACP, {e}")
+        log.info("Built a new NACP")
+
+    log.debug("Got the Control partition")
+    log.debug(base64.b64encode(control.data).decode())
+
+    for change in control.apply_forwarder_policy():
+        log.info(change)
+
+    if not name:
+        # TODO: Assumes "AmericanEnglish" name is the one that's used and wanted
+        name = control.name
+    if not name:
+        raise BuildError("The Control Partition does not have any listed Name nor was one manually specified.")
+    if not any(x in string.ascii_letters + string.digits for x in name):
+        raise BuildError(f'The Application Name, "{name}", cannot be all special characters.')
+    if len(name.encode("utf8")) > 0x200:  # fits 0x200 * 10 (16 fields)
+        raise BuildError(f'The Title Name "{name}" is too large to fit in the NSP.')
+    log.info("Title Name: %s", name)
+
+    if not publisher:
+        # TODO: Assumes "AmericanEnglish" publisher is the one that's used and wanted
+        publisher = control.publisher
+    if not publisher:
+        raise BuildError("The Control Partition does not have any listed Publisher nor was one manually specified.")
+    if not any(x in string.ascii_letters + string.digits for x in publisher):
+        raise BuildError(f'The Publisher, "{publisher}", cannot be all special characters.')
+    if len(publisher.encode("utf8")) > 0x100:  # fits 0x100 * 10 (16 fields)
+        raise BuildError(f'The Title Publisher "{publisher}" is too large to fit in the NSP.')
+    log.info("Publisher: %s", publisher)
+
+    # only keep one name/publisher, store as AmericanEnglish
+    # this is because the CLI has only one name/publisher option to use
+    control.set_only_title(name, publisher)
+
+    if not version:
+        version = control.display_version
+        if not version:
+            raise BuildError("The Control Partition does not have any listed Version nor was one manually specified.")
+    if len(version.encode("utf8")) > 0x10:
+        raise BuildError(f'The Title Version "{version}" is too large to fit in the NSP.')
+    control.display_version = version
+    log.info("Version: %s", version)
+
+    if job.icon:
+        try:
+            icon_data: Optional[bytes] = job.icon.read_bytes()
+        except OSError as e:
+            raise BuildError(f'The Icon "{job.icon}" could not be read, {e}')
+    elif assets.icon:
+        icon_data = assets.icon
+        log.debug("Got the Icon partition")
+        log.debug(base64.b64encode(assets.icon).decode())
+    else:
+        icon_data = None
+        warn("The NRO does not have an Icon, proceeding without one.")
+
+    next_argv = sdmc
+    if rom:
+        next_argv += f' "sdmc:{rom}"'
+
+    try:
+        icon_data = normalize_icon(icon_data) if icon_data else None
+    except (OSError, ValueError) as e:
+        if job.icon:
+            raise BuildError(f'The Icon "{job.icon}" could not be read, {e}')
+        raise BuildError(f"The Icon of the NRO could not be read, {e}")
+
+    forwarder = Forwarder(
+        title_id=id_,
+        control=bytes(control),
+        icon=icon_data,
+        next_nro_path=sdmc,
+        next_argv=next_argv,
+    )
+
+    # only make this directory at this point because we have a high chance of success
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    output_path = output_dir / f"{name} v{version} by {publisher} [{id_}].nsp"
+    if output_path.exists():
+        warn("An NSP forwarder of the same name, publisher and title ID already existed.")
+
+    cache_key = get_build_key(forwarder, packer) if cache else None
+    cached = bool(cache and cache_key and cache.fetch(cache_key, output_path))
+    if cached:
+        log.info("The NSP was already built from the same inputs, re-used it from the build cache")
+    else:
+        try:
+            pack.pack(forwarder, output_path, Files.keys, packer)
+            host.fix_console()
+        except subprocess.CalledProcessError as e:
+            raise BuildError(f'Failed to build NSP, "{e.args}", {e.output} [{e.returncode}]', critical=True)
+        except subprocess.TimeoutExpired as e:
+            raise BuildError(f"Failed to build NSP, {e.cmd[0]} did not finish within {e.timeout:.0f}s", critical=True)
+        except KeysError as e:
+            raise BuildError(f"Failed to build NSP, {e}", critical=True)
+        if cache and cache_key:
+            try:
+                cache.store(cache_key, output_path)
+            except OSError as e:
+                warn(f"Failed to store the NSP in the build cache, {e}")
+
+    return BuildResult(
+        job=job,
+        title_id=id_,
+        name=name,
+        publisher=publisher,
+        version=version,
+        output_path=output_path,
+        warnings=warnings,
+        cached=cached,
+    )
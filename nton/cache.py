@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import shutil
+import struct
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar, Optional
+
+from nton import __version__, nro
+from nton.constants import Directories
+from nton.forwarder import SHARED_ASSETS, Forwarder
+from nton.helpers import atomic_path
+
+# every bundled asset that ends up in an NSP, control.nacp is the template of NROs without a NACP
+BUILD_ASSETS = (*SHARED_ASSETS, "control.nacp")
+
+DEFAULT_MAX_SIZE = "1G"
+DEFAULT_ASSET_MAX_SIZE = "64M"
+ASSET_ENTRY = struct.Struct("<4sqq")  # magic, NACP size, Icon size, -1 if the NRO does not have one
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes with an optional K, M, or G suffix, e.g., `512M`."""
+    value = size.strip().upper().removesuffix("B").removesuffix("I")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    try:
+        return int(float(value.removesuffix(unit)) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f'The size "{size}" is invalid, e.g., use 1073741824, 1024M, or 1G.')
+
+
+@functools.lru_cache(maxsize=None)
+def get_assets_digest() -> str:
+    """
+    Get a digest of the bundled assets that end up in an NSP, so that cached builds are invalidated when one changes.
+
+    Only `BUILD_ASSETS` are hashed, other assets like the Game Title ID registry change
+    on every update without affecting the NSP.
+    """
+    hash_ = hashlib.sha256()
+    for name in BUILD_ASSETS:
+        path = Directories.assets / name
+        hash_.update(name.encode("utf8") + b"\x00")
+        hash_.update(hashlib.sha256(path.read_bytes() if path.is_file() else b"").digest())
+    return hash_.hexdigest()
+
+
+def get_build_key(forwarder: Forwarder, packer: str) -> str:
+    """
+    Get the cache key of a forwarder build, a digest of every input to the packer.
+
+    This covers the patched NACP, Icon, nextNroPath, nextArgv, and Title ID, as well
+    as the packer, bundled assets, and nton version that build it.
+    """
+    hash_ = hashlib.sha256()
+    for part in (__version__, packer, get_assets_digest(), forwarder.title_id):
+        hash_.update(part.encode("utf8") + b"\x00")
+    for name, data in sorted(forwarder.files.items()):
+        hash_.update(name.encode("utf8") + b"\x00" + len(data).to_bytes(8, "little"))
+        hash_.update(data)
+    return hash_.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    directory: Path
+    entries: int
+    size: int
+    max_size: int
+    oldest: Optional[float] = None  # last use, as a timestamp
+    newest: Optional[float] = None
+
+
+@dataclass
+class LruCache:
+    """
+    Directory of cache entries, evicting the least recently used entries past a size limit.
+
+    A hit refreshes the modification time of the entry, which is what eviction is
+    ordered by. Every write is atomic so processes may share a cache.
+    """
+
+    directory: Path
+    max_size: int
+    suffix: ClassVar[str]
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        entries = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:  # evicted by another process
+                continue
+        return entries
+
+    @staticmethod
+    def _place(source: Path, destination: Path) -> None:
+        """Hard-link or copy a file to a destination, atomically replacing it."""
+        tmp = destination.with_name(f".{destination.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            try:
+                os.link(source, tmp)
+            except OSError:  # e.g., a different drive or file system
+                shutil.copyfile(source, tmp)
+            os.replace(tmp, destination)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def prune(self, max_size: Optional[int] = None) -> tuple[int, int]:
+        """
+        Evict the least recently used entries until the cache fits within a size.
+
+        Returns the amount of entries evicted and the amount of bytes freed.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self._entries(), key=lambda x: x[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        evicted = freed = 0
+        for path, stat in entries:
+            if size <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+            evicted += 1
+            freed += stat.st_size
+        return evicted, freed
+
+    def stats(self) -> CacheStats:
+        entries = self._entries()
+        times = [stat.st_mtime for _, stat in entries]
+        return CacheStats(
+            directory=self.directory,
+            entries=len(entries),
+            size=sum(stat.st_size for _, stat in entries),
+            max_size=self.max_size,
+            oldest=min(times, default=None),
+            newest=max(times, default=None),
+        )
+
+
+@dataclass
+class BuildCache(LruCache):
+    """
+    Content-addressed cache of built NSPs, by their build key.
+
+    The size limit defaults to the NTON_CACHE_MAX_SIZE environment variable, or 1G.
+
+    NSPs are hard-linked into place on a hit, falling back to a copy.
+    """
+
+    directory: Path = field(default_factory=lambda: Directories.cache / "builds")
+    max_size: int = field(default_factory=lambda: parse_size(os.environ.get("NTON_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE)))
+    suffix: ClassVar[str] = ".nsp"
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Place a cached NSP at the output path, returning False if it is not cached."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+            self._place(path, output_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key: str, nsp_path: Path) -> None:
+        """Store a built NSP in the cache, then evict the least recently used NSPs if over the size limit."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._place(nsp_path, self.path_for(key))
+        os.utime(self.path_for(key))
+        self.prune()
+
+
+@dataclass
+class AssetCache(LruCache):
+    """
+    Cache of the NACP and Icon extracted from NROs, by a digest of the NRO.
+
+    The size limit defaults to the NTON_ASSET_CACHE_MAX_SIZE environment variable, or 64M.
+
+    The digest of an NRO is indexed by its path, size, and modification time, so an
+    unchanged NRO is neither hashed nor extracted again.
+    """
+
+    directory: Path = field(default_factory=lambda: Directories.cache / "assets")
+    max_size: int = field(
+        default_factory=lambda: parse_size(os.environ.get("NTON_ASSET_CACHE_MAX_SIZE", DEFAULT_ASSET_MAX_SIZE))
+    )
+    suffix: ClassVar[str] = ".assets"
+
+    def _index_path(self, path: Path) -> Path:
+        return self.directory / "index" / hashlib.sha256(str(path.resolve()).encode("utf8")).hexdigest()
+
+    def get_digest(self, path: Path) -> str:
+        """Get the digest of an NRO, only hashing it if it changed since it was last hashed."""
+        stat = path.stat()
+        index = self._index_path(path)
+        try:
+            size, mtime_ns, digest = index.read_text(encoding="utf8").split()
+            if int(size) == stat.st_size and int(mtime_ns) == stat.st_mtime_ns:
+                return digest
+        except (FileNotFoundError, ValueError):
+            pass
+
+        hash_ = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hash_.update(chunk)
+        digest = hash_.hexdigest()
+
+        try:
+            with atomic_path(index) as tmp:
+                tmp.write_text(f"{stat.st_size} {stat.st_mtime_ns} {digest}", encoding="utf8")
+        except OSError:  # the index is only an optimization
+            pass
+        return digest
+
+    def prune(self, max_size: Optional[int] = None) -> tuple[int, int]:
+        """
+        Evict the least recently used entries until the cache fits within a size, see `LruCache.prune`.
+
+        Index entries of digests that are no longer cached are removed in the same pass.
+        The index is only scanned if an entry was evicted, or a size was given, e.g., by
+        `nton cache prune`, so filling the cache stays cheap.
+        """
+        evicted, freed = super().prune(max_size)
+        if evicted or max_size is not None:
+            self._prune_index()
+        return evicted, freed
+
+    def _prune_index(self) -> None:
+        cached = {path.name[: -len(self.suffix)] for path, _ in self._entries()}
+        for index in (self.directory / "index").glob("*"):
+            try:
+                digest = index.read_text(encoding="utf8").split()[-1]
+            except (OSError, IndexError):  # removed by another process, or corrupt
+                digest = None
+            if digest not in cached:
+                index.unlink(missing_ok=True)
+
+    def get_assets(self, path: Path) -> nro.NroAssets:
+        """
+        Get the NACP and Icon of an NRO, only extracting them if they are not cached.
+
+        Raises an NroError if the NRO is invalid, see `nro.get_assets`.
+        """
+        key = self.get_digest(path)
+        entry = self.path_for(key)
+        try:
+            data = entry.read_bytes()
+            os.utime(entry)
+            return _unpack_assets(data)
+        except (FileNotFoundError, ValueError):  # not cached, evicted, or corrupt
+            pass
+
+        assets = nro.get_assets(path)
+        try:
+            with atomic_path(entry) as tmp:
+                tmp.write_bytes(_pack_assets(assets))
+            self.prune()
+        except OSError:  # caching is best effort
+            pass
+        return assets
+
+
+def _pack_assets(assets: nro.NroAssets) -> bytes:
+    nacp, icon = assets.nacp, assets.icon
+    header = ASSET_ENTRY.pack(b"NTAC", -1 if nacp is None else len(nacp), -1 if icon is None else len(icon))
+    return header + (nacp or b"") + (icon or b"")
+
+
+def _unpack_assets(data: bytes) -> nro.NroAssets:
+    if len(data) < ASSET_ENTRY.size:
+        raise ValueError("The cache entry is truncated.")
+    magic, nacp_size, icon_size = ASSET_ENTRY.unpack_from(data)
+    if magic != b"NTAC" or len(data) != ASSET_ENTRY.size + max(nacp_size, 0) + max(icon_size, 0):
+        raise ValueError("The cache entry is invalid.")
+    offset = ASSET_ENTRY.size + max(nacp_size, 0)
+    return nro.NroAssets(
+        nacp=None if nacp_size < 0 else data[ASSET_ENTRY.size : offset],
+        icon=None if icon_size < 0 else data[offset:],
+    )
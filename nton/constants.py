@@ -1,5 +1,5 @@
+import functools
 import os
-import shutil
 import tempfile
 from pathlib import Path
 
@@ -7,25 +7,26 @@ from pathlib import Path
 class Directories:
     root = Path(__file__).resolve().parent  # root of package/src
     temp = Path(tempfile.gettempdir()) / "rlaphoenix-nton"
+    cache = (
+        Path(os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+        / "rlaphoenix-nton"
+    )
     output = Path.home() / "Desktop" / "NTON"
     assets = root / "assets"
     bin = root / "bin"
 
 
-PATH = os.environ.get("PATH", "")
-PATH = os.pathsep.join([str(Directories.bin), PATH])
-os.environ["PATH"] = PATH
-
-
-class Binaries:
-    nstool = shutil.which("nstool")
-    hacbrewpack = shutil.which("hacbrewpack")
-    hptnacp = shutil.which("hptnacp")
-
-
-class Files:
+class _Files:
     keys_home = Path.home() / ".switch" / "prod.keys"
     keys_cwd = Path("./prod.keys").absolute()
-    keys = keys_cwd if keys_cwd.is_file() else keys_home
-    game_title_ids = Directories.assets / "game_title_ids.json"
+    game_title_ids = Directories.assets / "game_title_ids.bin"
+    game_title_ids_json = Directories.assets / "game_title_ids.json"
     ui_file = Directories.root / "gui" / "main.ui"
+
+    @functools.cached_property
+    def keys(self) -> Path:
+        """The prod.keys in the current working directory if there is one, otherwise at `keys_home`."""
+        return self.keys_cwd if self.keys_cwd.is_file() else self.keys_home
+
+
+Files = _Files()
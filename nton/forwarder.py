@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from nton.constants import Directories
+
+# assets shared by every forwarder, relative to `Directories.assets`
+SHARED_ASSETS = ("exefs/main", "exefs/main.npdm", "logo/NintendoLogo.png", "logo/StartupMovie.gif")
+
+
+@functools.lru_cache(maxsize=None)
+def get_shared_assets() -> dict[str, bytes]:
+    """Load the assets shared by every forwarder, once."""
+    return {name: (Directories.assets / name).read_bytes() for name in SHARED_ASSETS}
+
+
+@dataclass
+class Forwarder:
+    """
+    Every input of a forwarder NSP, kept in memory.
+
+    Nothing is written to disk unless a packer that needs files is used, see `stage`.
+    """
+
+    title_id: str
+    control: bytes  # the Control NACP
+    icon: Optional[bytes]  # a clean 256x256 JPEG, see `nton.icon.normalize_icon`
+    next_nro_path: str
+    next_argv: str
+
+    @property
+    def files(self) -> dict[str, bytes]:
+        """Every file of the forwarder by path, as laid out for hacBrewPack."""
+        files = dict(get_shared_assets())
+        files["control/control.nacp"] = self.control
+        if self.icon:
+            files["control/icon_AmericanEnglish.dat"] = self.icon
+        files["romfs/nextNroPath"] = self.next_nro_path.encode("utf8")
+        files["romfs/nextArgv"] = self.next_argv.encode("utf8")
+        return files
+
+    def stage(self, directory: Path) -> None:
+        """Write every file of the forwarder to a directory."""
+        for name, data in self.files.items():
+            file = directory / name
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_bytes(data)
@@ -1,33 +1,35 @@
-import ctypes
-import os
 import re
-import shutil
 import string
-import subprocess
 import sys
-import tempfile
 import webbrowser
 from functools import partial
 from pathlib import Path
-from typing import Optional, Union
+from typing import Optional
 
-from PIL import Image
-from PySide6.QtGui import QPixmap
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QThreadPool
+from PySide6.QtGui import QAction, QCloseEvent, QPixmap
 from PySide6.QtUiTools import QUiLoader
-from PySide6.QtWidgets import QApplication, QFileDialog, QInputDialog, QMainWindow, QMessageBox
+from PySide6.QtWidgets import QApplication, QFileDialog, QInputDialog, QMainWindow, QMessageBox, QProgressBar
 
-from nton import __version__, nstool, title_ids
-from nton.constants import Binaries, Directories, Files
+from nton import __version__, host, title_ids
+from nton.cache import AssetCache
+from nton.constants import Directories, Files
+from nton.gui.build_queue import BuildQueue
 from nton.gui.logger import log
 from nton.gui.main import Ui_MainWindow
 from nton.gui.widgets import FileDropper
+from nton.gui.workers import BuildSnapshot, NroData, NroLoader
 from nton.helpers import get_copyright_years
+from nton.keys import KeysError, load_keys
+from nton.nacp import Nacp, Screenshot, VideoCapture
 
 NRO_PATH: Optional[Path]
 SDMC: Optional[str]
-CONTROL_NACP: bytearray
+CONTROL_NACP: Optional[Nacp]  # None if the NRO has no NACP, one is built from a template
+NRO_LOADER: Optional[NroLoader] = None  # the NRO being loaded, if any
 
 RE_TITLE_ID = re.compile(r"^01([a-fA-F0-9]{11})000$")
+ASSET_CACHE = AssetCache()
 
 
 class MainWindow(QMainWindow):
@@ -36,11 +38,33 @@ class MainWindow(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
+        # busy indicator shown while work runs in the background
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setMaximumWidth(120)
+        self.progress.setTextVisible(False)
+        self.progress.hide()
+        self.ui.statusbar.addPermanentWidget(self.progress)
+
+        self.build_queue = BuildQueue(self)
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        if self.build_queue.busy:
+            res = QMessageBox.question(
+                self,
+                "Builds in Progress",
+                "Some builds have not finished yet. Cancel them and exit?",
+            )
+            if res != QMessageBox.StandardButton.Yes:
+                event.ignore()
+                return
+            self.build_queue.cancel_all()
+        super().closeEvent(event)
+
 
 def start(debug: bool = False) -> None:
     """Start the GUI and Qt execution loop."""
-    # https://stackoverflow.com/a/12522799/13183782
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("com.rlaphoenix.nton")
+    host.set_app_user_model_id("com.rlaphoenix.nton")
 
     if debug:
         log.setLevel("DEBUG")
@@ -62,18 +86,6 @@ def start(debug: bool = False) -> None:
 
 
 def ensure_dependencies(window: MainWindow) -> None:
-    for binary, path in vars(Binaries).items():
-        if binary.startswith("__"):
-            continue
-        if not path:
-            QMessageBox.critical(
-                window,
-                "Corrupt Installation",
-                f"Could not find binary for {binary} which should be pre-bundled with NTON.<br/><br/>"
-                "If this continues to happen <a href='https://github.com/rlaphoenix/nton/issues'>Create an Issue</a>.",
-                QMessageBox.StandardButton.Ok,
-            )
-            sys.exit(1)
     if not Files.game_title_ids.exists():
         QMessageBox.critical(
             window,
@@ -92,6 +104,16 @@ def ensure_dependencies(window: MainWindow) -> None:
             "Press OK once done to continue.",
             QMessageBox.StandardButton.Ok,
         )
+    try:
+        load_keys(Files.keys).validate()
+    except KeysError as e:
+        QMessageBox.critical(
+            window,
+            "Invalid prod.keys",
+            f"The prod.keys file is invalid, {e}",
+            QMessageBox.StandardButton.Ok,
+        )
+        sys.exit(1)
 
     # TODO: Add GUI menu bar option to update Game Title ID registry, then warn if outdated
     # if Files.game_title_ids.stat().st_mtime + (60 * 24 * 30) < time.time():
@@ -103,17 +125,15 @@ def setup_logic(window: MainWindow) -> None:
     window.ui.actionOpen.triggered.connect(partial(open_nro_file, window))
     window.ui.actionClose.triggered.connect(partial(reset_ui, window))
     window.ui.actionExit.triggered.connect(window.close)
+    actionBuildQueue = QAction("Build Queue", window)
+    actionBuildQueue.triggered.connect(window.build_queue.show)
+    window.ui.menuFile.insertAction(window.ui.actionExit, actionBuildQueue)
     window.ui.actionTroubleshooting.triggered.connect(
         lambda: webbrowser.open("https://github.com/rlaphoenix/nton#troubleshooting")
     )
     window.ui.actionAbout.triggered.connect(partial(about, window))
 
     # main ui fields
-    window.ui.name.textChanged.connect(partial(update_control_nacp, 0x0, 0x200))
-    window.ui.author.textChanged.connect(partial(update_control_nacp, 0x200, 0x100))
-    window.ui.displayVersion.textChanged.connect(partial(update_control_nacp, 0x3060, 0x10))
-    window.ui.videoCapture.currentIndexChanged.connect(partial(update_control_nacp, 0x3035, 0x01))
-    window.ui.screenshots.currentIndexChanged.connect(partial(update_control_nacp, 0x3034, 0x01))
     window.ui.titleId.textChanged.connect(partial(title_id_validator, window))
 
     # main ui buttons
@@ -142,14 +162,21 @@ def setup_logic(window: MainWindow) -> None:
 
 
 def reset_ui(window: MainWindow) -> None:
-    """Reset the UI to initial startup state."""
+    """Reset the UI to initial startup state, cancelling any NRO being loaded."""
     global NRO_PATH
     global SDMC
     global CONTROL_NACP
+    global NRO_LOADER
+
+    if NRO_LOADER:
+        NRO_LOADER.cancel()
+        QThreadPool.globalInstance().tryTake(NRO_LOADER)  # if not yet started
+        NRO_LOADER = None
+    window.progress.hide()
 
     NRO_PATH = None
     SDMC = None
-    CONTROL_NACP = bytearray()
+    CONTROL_NACP = None
 
     window.ui.appPage.setCurrentIndex(0)
 
@@ -213,8 +240,6 @@ def about(window: MainWindow) -> None:
         + "&nbsp;&nbsp; <a href='https://github.com/The-4n/hacBrewPack' style='color:blue'>https://github.com/The-4n/hacBrewPack</a><br/>"
         + " • nstool licensed under MIT for NRO extraction and verification:<br/>"
         + "&nbsp;&nbsp; <a href='https://github.com/jakcron/nstool' style='color:blue'>https://github.com/jakcron/nstool</a><br/>"
-        + " • hptnacp from hacPack licensed under GPL-v2 for creating new NACP partitions if the NRO did not have one:<br/>"
-        + "&nbsp;&nbsp; <a href='https://github.com/The-4n/hacPack/tree/master/hacPack-Tools/hacPackTools-NACP' style='color:blue'>https://github.com/The-4n/hacPack/tree/master/hacPack-Tools/hacPackTools-NACP</a><br/>"
         + "<br/>"
         + "No changes were made to any of the aforementioned software.<br/>"
         + "<br/>"
@@ -228,36 +253,78 @@ def about(window: MainWindow) -> None:
     )
 
 
-def open_nro_file(window: MainWindow) -> bool:
+def open_nro_file(window: MainWindow) -> None:
     """Open a File Dialogue to open and load a file as an NRO."""
     loc = QFileDialog.getOpenFileName(window, "Homebrew Applet (NRO)", "", "NRO files (*.nro);;All files (*.*)")
     if not loc[0]:
-        return False
+        return
 
     file_path = Path(loc[0])
     log.debug("Opened File %s", file_path)
 
-    return load_nro_file(window, file_path)
+    load_nro_file(window, file_path)
 
 
-def load_nro_file(window: MainWindow, file_path: Path) -> bool:
+def load_nro_file(window: MainWindow, file_path: Path) -> None:
     """
     Load NRO file by path.
 
+    The NRO is loaded in the background by an `NroLoader` so the UI stays responsive,
+    see `on_nro_loaded`. Loading another NRO cancels this one.
+    """
+    global NRO_LOADER
+
+    reset_ui(window)
+
+    window.ui.statusbar.showMessage(f"Loading {file_path.name}...")
+    window.progress.show()
+    log.info("Loading NRO: %s", file_path)
+
+    loader = NroLoader(file_path, ASSET_CACHE)
+    loader.signals.loaded.connect(partial(on_nro_loaded, window, loader))
+    loader.signals.failed.connect(partial(on_nro_failed, window, loader))
+    NRO_LOADER = loader
+    QThreadPool.globalInstance().start(loader)
+
+
+def on_nro_failed(window: MainWindow, loader: NroLoader, error: str) -> None:
+    """Report an NRO that failed to load, unless it was superseded."""
+    global NRO_LOADER
+
+    if loader is not NRO_LOADER:
+        return
+    NRO_LOADER = None
+    window.progress.hide()
+
+    log.info("Error loading NRO: %s", error)
+    window.ui.statusbar.showMessage(f"Failed loading {loader.path.name}")
+    log.error("Failed loading NRO: %s", loader.path)
+    QMessageBox.critical(
+        window,
+        "Failed to load file",
+        f"The file '{loader.path.name}' does not seem to be a valid NRO file,<br/><br/>{error}",
+        QMessageBox.StandardButton.Ok,
+    )
+
+
+def on_nro_loaded(window: MainWindow, loader: NroLoader, data: NroData) -> None:
+    """
+    Show a loaded NRO, unless it was superseded.
+
     This calculates the SDMC path (path to NRO relative to microSD card), loads the data
     to the UI fields, and sets the Stacked Widget to page 2 (the main file-loaded UI).
     """
     global SDMC
     global NRO_PATH
+    global NRO_LOADER
 
-    reset_ui(window)
+    if loader is not NRO_LOADER:
+        return
+    NRO_LOADER = None
+    window.progress.hide()
 
-    window.ui.statusbar.showMessage(f"Loading {file_path.name}")
-    log.info("Loading NRO: %s", file_path)
-    if not load_nro_data(window, file_path):
-        window.ui.statusbar.showMessage(f"Failed loading {file_path.name}")
-        log.error("Failed loading NRO: %s", file_path)
-        return False
+    file_path = data.path
+    load_nro_data(window, data)
 
     NRO_PATH = file_path
 
@@ -276,9 +343,9 @@ def load_nro_file(window: MainWindow, file_path: Path) -> bool:
         sdmc = sdmc.strip()
         if not ok or not sdmc:
             log.debug("User did not give an SDMC")
+            reset_ui(window)
             window.ui.statusbar.showMessage(f"Cancelled loading {file_path.name}")
-            window.ui.appPage.setCurrentIndex(0)
-            return False
+            return
         log.debug("SDMC given: %s", sdmc)
         if not sdmc.startswith("/"):
             sdmc = f"/{sdmc}"
@@ -291,151 +358,74 @@ def load_nro_file(window: MainWindow, file_path: Path) -> bool:
     window.ui.statusbar.showMessage(f"Loaded {file_path.name}")
     log.info("Loaded NRO: %s", file_path)
 
-    return True
-
 
-def load_nro_data(window: MainWindow, nro_path: Path) -> bool:
+def load_nro_data(window: MainWindow, data: NroData) -> None:
     """Load NRO Name, Author, Icon, Version, and more to the UI."""
     global CONTROL_NACP
 
-    if nro_path.stem.lower() in title_ids.unofficial:
-        title_id = title_ids.unofficial[nro_path.stem.lower()]
-        log.info("Got Title ID from NTON registry: %s", title_id)
+    if data.registered:
+        log.info("Got Title ID from NTON registry: %s", data.title_id)
     else:
-        title_id = generate_title_id()
-        log.info("Got Randomized Title ID: %s", title_id)
-    window.ui.titleId.setText(title_id.upper())
-
-    with tempfile.TemporaryDirectory(prefix="rlaphoenix-nton") as t:
-        log.debug("Opened Temporary Directory: %s", t)
-        load_dir = Path(t)
-
-        control_file = load_dir / "control.nacp"
-        icon_file = load_dir / "icon_AmericanEnglish.dat"
-
-        control_file_res = nstool.get_nacp(nro_path, control_file)
-        if control_file_res:
-            log.info("Error loading NACP: %s", control_file_res)
-            if control_file_res == "No NACP was extracted from the asset.":
-                window.ui.name.setText(nro_path.stem)
-                window.ui.icon.setPixmap(QPixmap(":/branding/images/sad.png"))
-                window.ui.displayVersion.setText("v1.0.0")
-                window.ui.videoCapture.setCurrentIndex(2)
-                enable_all_fields(window)
-                QMessageBox.information(
-                    window,
-                    "Notice: Crappy NRO",
-                    f"The NRO file '{nro_path.name}' is poorly made; it has no NACP partition.<br/>"
-                    "This means NTON cannot infer ANY information. Some common defaults have been set, and "
-                    "some have been assumed based on the filename.<br/><br/>"
-                    "Please note that this is not an error, but there are few NROs without a NACP "
-                    "partition. If this is not expected, please verify the integrity of your NRO file.",
-                    QMessageBox.StandardButton.Ok,
-                )
-                return True
-
-            window.ui.appPage.setCurrentIndex(0)
-            if "Input file type was undetermined" in str(control_file_res):
-                QMessageBox.critical(
-                    window,
-                    "Failed to load file",
-                    f"The file '{nro_path.name}' does not seem to be a valid NRO file,<br/><br/>{control_file_res}",
-                    QMessageBox.StandardButton.Ok,
-                )
-            else:
-                QMessageBox.critical(
-                    window,
-                    "Failed to load file",
-                    f"The NRO file '{nro_path.name}' failed to load while extracting the NACP partition,<br/><br/>"
-                    f"{control_file_res}<br/><br/>"
-                    f"Cannot continue...",
-                    QMessageBox.StandardButton.Ok,
-                )
-            return False
+        log.info("Got Randomized Title ID: %s", data.title_id)
+    window.ui.titleId.setText(data.title_id.upper())
+
+    if not data.nacp:
+        log.info("The NRO does not have a NACP partition")
+        CONTROL_NACP = None
+        window.ui.name.setText(data.path.stem)
+        window.ui.icon.setPixmap(QPixmap(":/branding/images/sad.png"))
+        window.ui.displayVersion.setText("v1.0.0")
+        window.ui.videoCapture.setCurrentIndex(2)
+        enable_all_fields(window)
+        QMessageBox.information(
+            window,
+            "Notice: Crappy NRO",
+            f"The NRO file '{data.path.name}' is poorly made; it has no NACP partition.<br/>"
+            "This means NTON cannot infer ANY information. Some common defaults have been set, and "
+            "some have been assumed based on the filename.<br/><br/>"
+            "Please note that this is not an error, but there are few NROs without a NACP "
+            "partition. If this is not expected, please verify the integrity of your NRO file.",
+            QMessageBox.StandardButton.Ok,
+        )
+        return
 
-        CONTROL_NACP = bytearray(control_file.read_bytes())
-        log.info("Extracted the Control NACP Partition")
-
-        window.ui.videoCapture.setCurrentIndex(CONTROL_NACP[0x3035])
-        log.info("Video Capture: %d", CONTROL_NACP[0x3035])
-        window.ui.screenshots.setCurrentIndex(CONTROL_NACP[0x3034])
-        log.info("Screenshots: %s", CONTROL_NACP[0x3034])
-
-        language_data = {
-            lang: {
-                "name": CONTROL_NACP[offset : offset + 0x10].replace(b"\x00", b"").strip().decode("utf8"),
-                "publisher": CONTROL_NACP[offset + 0x200 : offset + 0x210].replace(b"\x00", b"").strip().decode("utf8"),
-            }
-            for i, lang in enumerate(
-                (
-                    "AmericanEnglish",
-                    "BritishEnglish",
-                    "Japanese",
-                    "French",
-                    "German",
-                    "LatinAmericanSpanish",
-                    "Spanish",
-                    "Italian",
-                    "Dutch",
-                    "CanadianFrench",
-                    "Portuguese",
-                    "Russian",
-                    "Korean",
-                    "TraditionalChinese",
-                    "SimplifiedChinese",
-                )
-            )
-            for offset in [0x0300 * i]
-        }
-
-        log.info("Language Data:")
-
-        for lang, data in language_data.items():
-            if not data["name"] and not data["publisher"]:
-                continue
-            log.info(' - %s: [Name: "%s", Publisher: "%s"]', lang, data["name"], data["publisher"])
-
-        for lang, data in language_data.items():
-            if data["name"]:
-                # TODO: What if another is preferred?
-                window.ui.name.setText(data["name"])
-                window.ui.author.setText(data["publisher"])
-                log.info("Chosen NRO name and publisher from %s Language Data", lang)
-                break
-
-        # only keep one name/publisher, store as AmericanEnglish
-        # this is because the GUI has only one name/publisher field to use
-        update_control_nacp(0x0, 0x300 * 0x10, 0x0)
-        update_control_nacp(0x0, 0x200, window.ui.name.text())
-        update_control_nacp(0x200, 0x100, window.ui.author.text())
-        log.info("Removed all languages, set chosen data as AmericanEnglish")
-
-        icon_file_res = nstool.get_icon(nro_path, icon_file)
-        if icon_file_res:
-            if icon_file_res == "No Icon was extracted from the asset.":
-                log.info("The NRO did not have an Icon")
-            else:
-                log.error("Failed extracting the Icon partition from the NRO, %s", icon_file_res)
-                res = QMessageBox.question(
-                    window,
-                    "Failed to extract Icon",
-                    f"The NRO file '{nro_path.name}' failed to load while extracting the Icon,<br/><br/>"
-                    f"{icon_file_res}",
-                    QMessageBox.StandardButton.Cancel,
-                    QMessageBox.StandardButton.Ignore,
-                )
-                if res != QMessageBox.StandardButton.Ignore:
-                    sys.exit(2)
-        else:
-            log.info("Got the Icon from the NRO")
-        window.ui.icon.setPixmap(QPixmap(icon_file))
+    CONTROL_NACP = data.nacp
+    log.info("Extracted the Control NACP Partition")
 
-        window.ui.displayVersion.setText(CONTROL_NACP[0x3060:0x306F].replace(b"\x00", b"").strip().decode("utf8"))
-        log.info("Display Version: %s", window.ui.displayVersion.text())
+    window.ui.videoCapture.setCurrentIndex(CONTROL_NACP.video_capture)
+    log.info("Video Capture: %d", CONTROL_NACP.video_capture)
+    window.ui.screenshots.setCurrentIndex(CONTROL_NACP.screenshot)
+    log.info("Screenshots: %d", CONTROL_NACP.screenshot)
 
-        enable_all_fields(window)
+    language_data = CONTROL_NACP.titles
 
-        return True
+    log.info("Language Data:")
+
+    for lang, (name, publisher) in language_data.items():
+        if not name and not publisher:
+            continue
+        log.info(' - %s: [Name: "%s", Publisher: "%s"]', lang, name, publisher)
+
+    for lang, (name, publisher) in language_data.items():
+        if name:
+            # TODO: What if another is preferred?
+            window.ui.name.setText(name)
+            window.ui.author.setText(publisher)
+            log.info("Chosen NRO name and publisher from %s Language Data", lang)
+            break
+
+    icon = QPixmap()
+    if data.icon:
+        icon.loadFromData(data.icon)
+        log.info("Got the Icon from the NRO")
+    else:
+        log.info("The NRO did not have an Icon")
+    window.ui.icon.setPixmap(icon)
+
+    window.ui.displayVersion.setText(CONTROL_NACP.display_version)
+    log.info("Display Version: %s", window.ui.displayVersion.text())
+
+    enable_all_fields(window)
 
 
 def open_icon_file(window: MainWindow) -> None:
@@ -471,29 +461,7 @@ def generate_title_id() -> str:
     The Title ID is ensured to begin with `01` and end with `000`.
     A Base Title typically ends with `000` while a Patch ends with `800`.
     """
-    title_id = "0100000000000000"
-    while title_id in title_ids.ALL:
-        title_id = "01%s000" % os.urandom(6).hex()[:-1]
-    return title_id
-
-
-def update_control_nacp(offset: int, length: int, value: Union[int, str, bytes]) -> None:
-    """
-    Overwrite Data on the Control NACP at specific offsets.
-
-    If the specified length is larger than the value itself, then it will be
-    right-padded with 0x00. If the value is a string, it will be UTF-8 encoded.
-    If the value is a number, it will be encoded to bytes in little-endian order.
-    """
-    if isinstance(value, str):
-        vb = value.encode("utf8")
-    elif isinstance(value, int):
-        vb = value.to_bytes(length, "little")
-    elif not isinstance(value, bytes):
-        raise TypeError("Value must be int, str, or bytes")
-    if len(vb) < length:
-        vb = vb.ljust(length, b"\x00")
-    CONTROL_NACP[offset : offset + length] = vb
+    return title_ids.registry.allocate_free_id()
 
 
 def set_rom_args(window: MainWindow) -> None:
@@ -546,16 +514,7 @@ def set_rom_args(window: MainWindow) -> None:
 
 
 def build(window: MainWindow) -> bool:
-    """Build the NSP using the currently loaded Control NACP and UI fields."""
-    if not Binaries.hacbrewpack:
-        QMessageBox.critical(
-            window,
-            "Missing Dependency",
-            "The hacBrewPack binary is missing, which is required to build NSP files.<br/><br/>"
-            "Please reinstall NTON or visit <a href='https://github.com/switchbrew/hacBrewPack'>https://github.com/switchbrew/hacBrewPack</a>",
-            QMessageBox.StandardButton.Ok,
-        )
-        return False
+    """Queue a build of the NSP using the currently loaded Control NACP and UI fields, see `BuildQueue`."""
     if not NRO_PATH:
         QMessageBox.critical(
             window,
@@ -592,7 +551,7 @@ def build(window: MainWindow) -> bool:
             "<br/><br/>Build cannot continue...",
         )
         return False
-    if title_id in title_ids.ALL_SYSTEM:
+    if title_ids.registry.is_system(title_id):
         QMessageBox.critical(
             window,
             "System Title ID Conflict",
@@ -600,27 +559,16 @@ def build(window: MainWindow) -> bool:
             "Build cannot continue...",
         )
         return False
-    if title_id in title_ids.game_title_ids:
+    owner = title_ids.registry.owner_of(title_id)
+    if owner:
         res = QMessageBox.question(
             window,
             "Game Title ID Conflict",
-            f'The Title ID "{title_id}" is already used by "{title_ids.game_title_ids[title_id]}".<br/><br/>'
-            "Are you sure you want to continue?",
+            f'The Title ID "{title_id}" is already used by "{owner}".<br/><br/>Are you sure you want to continue?',
         )
         if res != QMessageBox.StandardButton.Yes:
             return False
 
-    verification = nstool.verify(NRO_PATH, "nro")
-    if verification:
-        log.error("Integrity Error on the NRO file: %s", verification)
-        QMessageBox.critical(
-            window,
-            "Integrity Error",
-            f'The NRO "{NRO_PATH}" is invalid, {verification}<br/><br/>Build cannot continue...',
-        )
-        return False
-    log.info("NRO Integrity: OK")
-
     save_filename = QFileDialog.getSaveFileName(
         window,
         "Build NSP",
@@ -634,111 +582,51 @@ def build(window: MainWindow) -> bool:
     save_path = Path(save_filename)
     log.debug("Chosen Save Path: %s", save_path)
 
-    build_dir = Directories.temp / title_id
-    control_dir = build_dir / "control"
-    romfs_dir = build_dir / "romfs"
-    exefs_dir = build_dir / "exefs"
-    logo_dir = build_dir / "logo"
-    hacbrewpack_backup_dir = build_dir / "hacbrewpack_backup"
-    control_file = control_dir / "control.nacp"
-    icon_file = control_dir / "icon_AmericanEnglish.dat"
-    next_argv_file = romfs_dir / "nextArgv"
-    next_nro_path_file = romfs_dir / "nextNroPath"
-
+    # only keep one name/publisher, store as AmericanEnglish
+    # this is because the GUI has only one name/publisher field to use
     try:
-        if build_dir.exists():
-            log.debug("Build Directory already exists, somehow, deleting...")
-            shutil.rmtree(build_dir)
-        build_dir.mkdir(parents=True)
-        control_dir.mkdir()
-        romfs_dir.mkdir()
-
-        shutil.copytree(Directories.assets / "exefs", exefs_dir)
-        shutil.copytree(Directories.assets / "logo", logo_dir)
-
-        # disable user profile selection as it's unnecessary
-        update_control_nacp(0x3025, 0x01, 0x0)
-
-        # disable all storage allocation to ensure a 1MB install size
-        update_control_nacp(0x3080, 0x08, 0x00)  # User Account Save Data
-        update_control_nacp(0x3088, 0x08, 0x00)  # User Account Save Data Journal
-        update_control_nacp(0x3090, 0x08, 0x00)  # Device Save Data
-        update_control_nacp(0x3098, 0x08, 0x00)  # Device Save Data Journal
-        update_control_nacp(0x30A0, 0x08, 0x00)  # BCAT Delivery Cache Storage
-        update_control_nacp(0x3148, 0x08, 0x00)  # Max User Account Save Data
-        update_control_nacp(0x3150, 0x08, 0x00)  # Max User Account Save Data Journal
-        update_control_nacp(0x3158, 0x08, 0x00)  # Max Device Save Data
-        update_control_nacp(0x3160, 0x08, 0x00)  # Max Device Save Data Journal
-        update_control_nacp(0x3168, 0x08, 0x00)  # Temporary Storage
-        update_control_nacp(0x3170, 0x08, 0x00)  # Cache Storage
-        update_control_nacp(0x3178, 0x08, 0x00)  # Cache Storage Journal
-        update_control_nacp(0x3180, 0x08, 0x00)  # Max Cache Storage Data and Journal
-        update_control_nacp(0x3188, 0x02, 0x00)  # Max Cache Storage Index
-
-        control_file.write_bytes(CONTROL_NACP)
-        log.debug("Written %d bytes to Control NACP file", len(CONTROL_NACP))
-        window.ui.icon.pixmap().save(str(icon_file), "JPG")
-
-        if icon_file.exists():
-            # We must strip every unnecessary metadata or the icon will be a '?'
-            im = Image.open(icon_file)
-            if im.size != (256, 256):
-                im = im.resize((256, 256))
-            if im.mode != "RGB":
-                im = im.convert("RGB")
-            clean_im = Image.new(im.mode, im.size)
-            clean_im.putdata(list(im.getdata()))
-            clean_im.save(icon_file, format="JPEG")
-            clean_im.close()
-            im.close()
-            log.debug("Converted and Stripped Icon File")
-
-        next_nro_path_file.write_text(SDMC)
-
-        next_argv = SDMC
-        args = window.ui.args.text().strip()
-        if args:
-            next_argv += f" {args}"
-        next_argv_file.write_text(next_argv)
-
-        # only make this directory at this point because we have a high chance of success
-        Directories.output.mkdir(parents=True, exist_ok=True)
-
-        try:
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            subprocess.check_output(
-                [
-                    Binaries.hacbrewpack,
-                    "--titleid",
-                    title_id,
-                    "--nspdir",
-                    str(Directories.output.absolute()),
-                    "-k",
-                    str(Files.keys.absolute()),
-                ],
-                cwd=build_dir,
-                startupinfo=startupinfo,
-            )
-        except subprocess.CalledProcessError as e:
-            log.error('Failed to build NSP, "%s", %s [%d]', e.args, e.output, e.returncode)
-            QMessageBox.critical(
-                window, "Build Failed", f'Failed to build NSP, "{e.args}", {e.output} [{e.returncode}]'
-            )
-            return False
+        if CONTROL_NACP:
+            control = Nacp(CONTROL_NACP.data)
+            control.set_only_title(name, author)
+            control.display_version = window.ui.displayVersion.text()
+        else:
+            control = Nacp.from_template(name, author, window.ui.displayVersion.text(), int(title_id, 16))
+            log.info("Built a new NACP")
+    except ValueError as e:
+        QMessageBox.critical(window, "Control NACP Error", f"{e}<br/><br/>Build cannot continue...")
+        return False
 
-        if save_path.exists():
-            save_path.unlink()
-        shutil.move(Directories.output / f"{title_id}.nsp", save_path)
-
-        log.info("Build NSP to %s", save_path)
-        QMessageBox.information(window, "Success", f'An NSP forwarder was built to "{save_path}".')
-        return True
-    finally:
-        if build_dir.exists():
-            shutil.rmtree(build_dir)
-        if hacbrewpack_backup_dir.exists():
-            shutil.rmtree(hacbrewpack_backup_dir)
+    for change in control.apply_forwarder_policy(
+        video_capture=VideoCapture(window.ui.videoCapture.currentIndex()),
+        screenshot=Screenshot(window.ui.screenshots.currentIndex()),
+    ):
+        log.info(change)
+
+    icon = QByteArray()
+    icon_buffer = QBuffer(icon)
+    icon_buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    icon_data = icon.data() if window.ui.icon.pixmap().save(icon_buffer, "JPG") else None
+    icon_buffer.close()
+
+    next_argv = SDMC
+    args = window.ui.args.text().strip()
+    if args:
+        next_argv += f" {args}"
+
+    # the UI may be changed, or another NRO loaded, while the build is queued
+    window.build_queue.enqueue(
+        BuildSnapshot(
+            nro_path=NRO_PATH,
+            output_path=save_path,
+            title_id=title_id,
+            control=bytes(control),
+            icon=bytes(icon_data) if icon_data else None,
+            sdmc=SDMC,
+            next_argv=next_argv,
+        )
+    )
+    window.ui.statusbar.showMessage(f"Queued Build of {save_path.name}")
+    return True
 
 
 if __name__ == "__main__":
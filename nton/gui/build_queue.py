@@ -0,0 +1,148 @@
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional
+
+from PySide6.QtCore import Qt, QThreadPool, QTimer
+from PySide6.QtWidgets import QGridLayout, QHeaderView, QPushButton, QTableWidget, QTableWidgetItem, QWidget
+
+from nton.gui.logger import log
+from nton.gui.workers import BuildSnapshot, BuildState, BuildTask
+
+
+@dataclass
+class QueuedBuild:
+    task: BuildTask
+    state: BuildState = BuildState.QUEUED
+    message: str = ""
+    queued_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> str:
+        """How long the build has waited in the queue, or has been building for."""
+        if self.started_at is None:
+            return "-" if self.state.finished else f"waiting {time.monotonic() - self.queued_at:.0f}s"
+        return f"{(self.finished_at or time.monotonic()) - self.started_at:.1f}s"
+
+
+class BuildQueue(QWidget):
+    """
+    A window of queued builds, each built in the background from a snapshot of the UI.
+
+    Builds run on their own thread pool, so they never wait on NRO loads. The amount of
+    hacBrewPack processes is further limited by the tool runner, see `nton.tools`.
+    """
+
+    COLUMNS = ("NSP", "State", "Time")
+
+    def __init__(self, parent: QWidget) -> None:
+        super().__init__(parent, Qt.WindowType.Tool)
+        self.setWindowTitle("Build Queue")
+        self.resize(520, 260)
+
+        self.pool = QThreadPool(self)
+        self.builds: list[QueuedBuild] = []
+
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+
+        self.cancelButton = QPushButton("Cancel", self)
+        self.cancelButton.clicked.connect(self.cancel_selected)
+        self.clearButton = QPushButton("Clear Finished", self)
+        self.clearButton.clicked.connect(self.clear_finished)
+
+        layout = QGridLayout(self)
+        layout.addWidget(self.table, 0, 0, 1, 3)
+        layout.setColumnStretch(0, 1)
+        layout.addWidget(self.cancelButton, 1, 1)
+        layout.addWidget(self.clearButton, 1, 2)
+
+        # keep the times of waiting and running builds ticking
+        self.timer = QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh)
+
+    @property
+    def busy(self) -> bool:
+        """Whether any build has not finished yet."""
+        return any(not build.state.finished for build in self.builds)
+
+    def enqueue(self, snapshot: BuildSnapshot) -> None:
+        """Queue a build, showing the queue."""
+        build = QueuedBuild(BuildTask(snapshot), queued_at=time.monotonic())
+        build.task.signals.state_changed.connect(partial(self.on_state_changed, build))
+        self.builds.append(build)
+        self.pool.start(build.task)
+        log.info("Queued Build of %s", snapshot.output_path)
+
+        self.refresh()
+        self.timer.start()
+        self.show()
+        self.raise_()
+
+    def cancel_selected(self) -> None:
+        """Cancel the selected builds that have not finished."""
+        rows = {index.row() for index in self.table.selectionModel().selectedRows()}
+        for row in sorted(rows):
+            self.cancel(self.builds[row])
+
+    def cancel_all(self) -> None:
+        for build in self.builds:
+            self.cancel(build)
+
+    def cancel(self, build: QueuedBuild) -> None:
+        if build.state.finished:
+            return
+        if self.pool.tryTake(build.task):  # not yet started
+            self.on_state_changed(build, BuildState.CANCELLED, "")
+        else:
+            build.task.cancel()
+            self.refresh()
+
+    def clear_finished(self) -> None:
+        self.builds = [build for build in self.builds if not build.state.finished]
+        self.refresh()
+
+    def on_state_changed(self, build: QueuedBuild, state: BuildState, message: str) -> None:
+        if build.state.finished:  # e.g., cancelled while queued
+            return
+        build.state = state
+        build.message = message
+        if state != BuildState.QUEUED and build.started_at is None and not state.finished:
+            build.started_at = time.monotonic()
+        if state.finished:
+            build.finished_at = time.monotonic()
+
+        path = build.task.snapshot.output_path
+        if state == BuildState.DONE:
+            log.info("Built NSP to %s", path)
+        elif state == BuildState.FAILED:
+            log.error("Failed to build %s, %s", path.name, message)
+        elif state == BuildState.CANCELLED:
+            log.info("Cancelled Build of %s", path)
+
+        if not self.busy:
+            self.timer.stop()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Show the state and time of every build."""
+        self.table.setRowCount(len(self.builds))
+        for row, build in enumerate(self.builds):
+            path = build.task.snapshot.output_path
+            state = build.state.value
+            if build.task.cancelled and not build.state.finished:
+                state = "Cancelling"
+            for column, text in enumerate((path.name, state, build.elapsed)):
+                item = QTableWidgetItem(text)
+                item.setToolTip(build.message or str(path))
+                self.table.setItem(row, column, item)
@@ -0,0 +1,184 @@
+"""Background workers, so slow tools and disks never block the Qt main thread."""
+
+import subprocess
+import threading
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from nton import nro, pack, title_ids
+from nton.cache import AssetCache
+from nton.constants import Files
+from nton.forwarder import Forwarder
+from nton.gui.logger import log
+from nton.icon import normalize_icon
+from nton.keys import KeysError
+from nton.nacp import Nacp
+
+
+@dataclass(frozen=True)
+class NroData:
+    """The data of an NRO needed by the UI. The NACP and Icon are None if the NRO does not have one."""
+
+    path: Path
+    title_id: str
+    registered: bool  # whether the Title ID is from the NTON registry, otherwise it's random
+    nacp: Optional[Nacp]
+    icon: Optional[bytes]
+
+
+class NroLoaderSignals(QObject):
+    loaded = Signal(object)  # NroData
+    failed = Signal(str)
+
+
+class NroLoader(QRunnable):
+    """
+    Load the Title ID, NACP, and Icon of an NRO on a thread pool.
+
+    The signals are emitted from the worker thread and delivered on the thread the
+    loader was created on, e.g., the Qt main thread. A cancelled loader does not
+    emit anything. If it's already running, the NRO is still loaded to completion,
+    but the results are dropped.
+    """
+
+    def __init__(self, path: Path, asset_cache: AssetCache) -> None:
+        super().__init__()
+        self.setAutoDelete(False)  # so it can still be cancelled and checked once finished
+        self.path = path
+        self.asset_cache = asset_cache
+        self.signals = NroLoaderSignals()
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def run(self) -> None:
+        if self.cancelled:
+            return
+        try:
+            title_id = title_ids.registry.unofficial_id(self.path.stem)
+            registered = bool(title_id)
+            if not title_id:
+                title_id = title_ids.registry.allocate_free_id()
+
+            assets = self.asset_cache.get_assets(self.path)
+            data = NroData(
+                path=self.path,
+                title_id=title_id,
+                registered=registered,
+                nacp=Nacp(assets.nacp) if assets.nacp else None,
+                icon=assets.icon,
+            )
+        except nro.NroError as e:
+            if not self.cancelled:
+                self.signals.failed.emit(str(e))
+            return
+        except Exception as e:  # an exception on a worker thread would otherwise be lost
+            log.exception("Unexpected error loading NRO: %s", self.path)
+            if not self.cancelled:
+                self.signals.failed.emit(f"An unexpected error occurred, {e}")
+            return
+
+        if not self.cancelled:
+            self.signals.loaded.emit(data)
+
+
+@dataclass(frozen=True)
+class BuildSnapshot:
+    """Everything needed to build an NSP, copied from the UI when the build was queued."""
+
+    nro_path: Path
+    output_path: Path
+    title_id: str
+    control: bytes  # the patched Control NACP
+    icon: Optional[bytes]  # any image, normalized when built
+    sdmc: str
+    next_argv: str
+
+
+class BuildState(Enum):
+    QUEUED = "Queued"
+    VERIFYING = "Verifying"
+    PACKING = "Packing"
+    DONE = "Done"
+    FAILED = "Failed"
+    CANCELLED = "Cancelled"
+
+    @property
+    def finished(self) -> bool:
+        return self in (BuildState.DONE, BuildState.FAILED, BuildState.CANCELLED)
+
+
+class BuildTaskSignals(QObject):
+    state_changed = Signal(object, str)  # BuildState, message
+
+
+class BuildTask(QRunnable):
+    """
+    Verify an NRO and pack an NSP forwarder from a `BuildSnapshot` on a thread pool.
+
+    Each change of state is emitted with a message, e.g., the error of a failed build.
+    Cancellation is checked between each step. A build cancelled while packing is
+    packed to completion, as the packers cannot be interrupted, and then removed.
+    """
+
+    def __init__(self, snapshot: BuildSnapshot) -> None:
+        super().__init__()
+        self.setAutoDelete(False)  # so it can still be cancelled and checked once finished
+        self.snapshot = snapshot
+        self.signals = BuildTaskSignals()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def run(self) -> None:
+        state, message = self._build()
+        self.signals.state_changed.emit(state, message)
+
+    def _build(self) -> tuple[BuildState, str]:
+        snapshot = self.snapshot
+        if self.cancelled:
+            return BuildState.CANCELLED, ""
+
+        self.signals.state_changed.emit(BuildState.VERIFYING, "")
+        try:
+            nro.verify(snapshot.nro_path)
+        except nro.NroError as e:
+            return BuildState.FAILED, f'The NRO "{snapshot.nro_path}" is invalid, {e}'
+        log.info("NRO Integrity: OK")
+        if self.cancelled:
+            return BuildState.CANCELLED, ""
+
+        self.signals.state_changed.emit(BuildState.PACKING, "")
+        try:
+            forwarder = Forwarder(
+                title_id=snapshot.title_id,
+                control=snapshot.control,
+                icon=normalize_icon(snapshot.icon) if snapshot.icon else None,
+                next_nro_path=snapshot.sdmc,
+                next_argv=snapshot.next_argv,
+            )
+            pack.pack(forwarder, snapshot.output_path, Files.keys)
+        except subprocess.CalledProcessError as e:
+            return BuildState.FAILED, f'Failed to build NSP, "{e.args}", {e.output} [{e.returncode}]'
+        except subprocess.TimeoutExpired as e:
+            return BuildState.FAILED, f"Failed to build NSP, hacBrewPack did not finish within {e.timeout:.0f}s."
+        except KeysError as e:
+            return BuildState.FAILED, f"Failed to build NSP, {e}"
+        except Exception as e:  # an exception on a worker thread would otherwise be lost
+            log.exception("Unexpected error building NSP: %s", snapshot.output_path)
+            return BuildState.FAILED, f"Failed to build NSP, an unexpected error occurred, {e}"
+
+        if self.cancelled:
+            snapshot.output_path.unlink(missing_ok=True)
+            return BuildState.CANCELLED, ""
+        return BuildState.DONE, str(snapshot.output_path)
@@ -1,4 +1,9 @@
+import os
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import Iterator
 
 
 def get_copyright_years() -> str:
@@ -7,3 +12,36 @@ def get_copyright_years() -> str:
     if start_year == current_year:
         return str(start_year)
     return f"{start_year}-{current_year}"
+
+
+def _get_umask() -> int:
+    # the umask can only be read by setting it, so it's read once on import rather than racing other threads
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+UMASK = _get_umask()
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """
+    Get a temporary path to write to that replaces `path` once the write succeeds.
+
+    The temporary file is made in the same directory so the final rename is atomic,
+    meaning readers only ever see the old or the new file, never a partial one.
+    The file gets the usual permissions of a new file, not the owner-only ones of a
+    temporary file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+import platform
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Optional
+
+IS_WINDOWS = sys.platform == "win32"
+# e.g., linux-x86_64, darwin-arm64, windows-amd64
+PLATFORM = f"{platform.system()}-{platform.machine()}".lower()
+
+
+def get_bin_dirs(bin_dir: Path) -> list[Path]:
+    """
+    Get the directories bundled tools are searched in, in order of priority.
+
+    Tools built for the host platform go in a sub-directory named after the platform,
+    e.g., `bin/linux-x86_64`. The root of the directory has the Windows builds, which
+    are only used on Windows.
+    """
+    bin_dirs = [bin_dir / PLATFORM]
+    if IS_WINDOWS:
+        bin_dirs.append(bin_dir)
+    return bin_dirs
+
+
+def find_tool(name: str, bin_dir: Path) -> Optional[str]:
+    """
+    Find the path to an external tool that can run on the host platform.
+
+    The NTON_<NAME> environment variable takes priority, e.g., NTON_HACBREWPACK, then
+    tools bundled for the host platform, then the PATH Environment Variable.
+    """
+    override = os.environ.get(f"NTON_{name.upper()}")
+    if override:
+        return shutil.which(override)
+    for path in get_bin_dirs(bin_dir):
+        found = shutil.which(name, path=str(path))
+        if found:
+            return found
+    return shutil.which(name)
+
+
+def get_subprocess_kwargs() -> dict[str, Any]:
+    """Get the platform-specific arguments for running a tool, e.g., to not open a console window on Windows."""
+    if sys.platform != "win32":  # not IS_WINDOWS, so type checkers can narrow it
+        return {}
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return {"startupinfo": startupinfo}
+
+
+def set_app_user_model_id(app_id: str) -> None:
+    """Set the AppUserModelID so Windows groups the windows and uses the icon of the app, not Python's."""
+    if sys.platform == "win32":
+        import ctypes
+
+        # https://stackoverflow.com/a/12522799/13183782
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(app_id)
+
+
+def fix_console() -> None:
+    """Enable ANSI escape codes on Windows consoles, which tools like hacBrewPack may disable."""
+    if IS_WINDOWS:
+        os.system("")
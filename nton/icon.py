@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from io import BytesIO
+
+from PIL import Image, UnidentifiedImageError
+
+ICON_SIZE = (256, 256)
+
+
+def normalize_icon(data: bytes) -> bytes:
+    """
+    Convert an image of any format and resolution to a 256x256 JPEG Icon.
+
+    We must strip every unnecessary metadata or the icon will be a '?'.
+
+    Large sources are downscaled cheaply before the final resize. JPEGs are decoded
+    at a reduced scale with draft mode, and anything still over twice the icon size is
+    reduced by an integer factor. The metadata is stripped by re-wrapping the raw pixel
+    buffer in a new image, rather than copying it pixel by pixel.
+
+    Raises an OSError or ValueError if the image is corrupt or of an unsupported format.
+    """
+    try:
+        with Image.open(BytesIO(data)) as im:
+            im.draft("RGB", ICON_SIZE)  # only JPEGs support draft mode, otherwise a no-op
+            if im.mode != "RGB":  # reduce() and resize() do not support every mode, e.g., P, 1, or I;16
+                im = im.convert("RGB")
+            factor = min(im.width // (ICON_SIZE[0] * 2), im.height // (ICON_SIZE[1] * 2))
+            if factor > 1:
+                im = im.reduce(factor)
+            if im.size != ICON_SIZE:
+                im = im.resize(ICON_SIZE)
+            clean_im = Image.frombuffer("RGB", ICON_SIZE, im.tobytes(), "raw", "RGB", 0, 1)
+    except UnidentifiedImageError as e:
+        raise ValueError("the image is corrupt or of an unsupported format") from e
+    except (SyntaxError, Image.DecompressionBombError) as e:  # raised by some decoders for corrupt data
+        raise ValueError(e) from e
+
+    out = BytesIO()
+    clean_im.save(out, format="JPEG")
+    return out.getvalue()
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# keys needed by the forwarder pipeline, i.e., to build and encrypt the NCAs
+REQUIRED_KEYS = ("header_key", "key_area_key_application_00")
+
+# sizes of the keys that are not 0x10 bytes
+KEY_SIZES = {"header_key": 0x20, "header_key_source": 0x20}
+
+
+class KeysError(ValueError):
+    """The keys file is invalid or is missing keys."""
+
+
+def _aes_ecb_decrypt(key: bytes, data: bytes) -> bytes:
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    return decryptor.update(data) + decryptor.finalize()
+
+
+def _generate_kek(source: bytes, master_key: bytes, kek_seed: bytes, key_seed: bytes) -> bytes:
+    kek = _aes_ecb_decrypt(master_key, kek_seed)
+    source_kek = _aes_ecb_decrypt(kek, source)
+    return _aes_ecb_decrypt(source_kek, key_seed)
+
+
+def parse_keys(text: str) -> dict[str, bytes]:
+    """Parse the contents of a prod.keys file, i.e., `name = hex` per line, raising a KeysError if invalid."""
+    keys = {}
+    for i, line in enumerate(text.splitlines(), start=1):
+        line = line.split(";", 1)[0].strip()
+        if not line:
+            continue
+        name, sep, value = line.partition("=")
+        name = name.strip().lower()
+        if not sep or not name:
+            raise KeysError(f"Line {i} is not a valid key, expected `name = hex`.")
+        try:
+            key = bytes.fromhex(value.strip())
+        except ValueError:
+            raise KeysError(f'The key "{name}" on line {i} is not a valid hex string.')
+        if len(key) != KEY_SIZES.get(name, len(key)):
+            raise KeysError(f'The key "{name}" on line {i} is {len(key)} bytes, expected {KEY_SIZES[name]} bytes.')
+        keys[name] = key
+    return keys
+
+
+def derive_keys(keys: Mapping[str, bytes]) -> dict[str, bytes]:
+    """
+    Derive the Header and Key Area Keys from their sources and the Master Keys, where missing.
+
+    Keys that are already present are kept as-is.
+    """
+    derived = dict(keys)
+    kek_seed = keys.get("aes_kek_generation_source")
+    key_seed = keys.get("aes_key_generation_source")
+    if not kek_seed or not key_seed:
+        return derived
+
+    master_key_00 = keys.get("master_key_00")
+    header_kek_source = keys.get("header_kek_source")
+    header_key_source = keys.get("header_key_source")
+    if "header_key" not in derived and master_key_00 and header_kek_source and header_key_source:
+        header_kek = _generate_kek(header_kek_source, master_key_00, kek_seed, key_seed)
+        derived["header_key"] = _aes_ecb_decrypt(header_kek, header_key_source)
+
+    source = keys.get("key_area_key_application_source")
+    if source:
+        for name, master_key in keys.items():
+            if not name.startswith("master_key_"):
+                continue
+            generation = name.removeprefix("master_key_")
+            key_area_key = f"key_area_key_application_{generation}"
+            if key_area_key not in derived:
+                derived[key_area_key] = _generate_kek(source, master_key, kek_seed, key_seed)
+
+    return derived
+
+
+@dataclass(frozen=True)
+class KeySet:
+    """
+    Keys parsed and derived from a prod.keys file.
+
+    The keys are read-only so that one KeySet may be safely shared process-wide,
+    see `load_keys`.
+    """
+
+    path: Path
+    mtime_ns: int
+    size: int
+    sha256: bytes
+    keys: Mapping[str, bytes]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.keys
+
+    def __getitem__(self, name: str) -> bytes:
+        try:
+            return self.keys[name]
+        except KeyError:
+            raise KeysError(f'The key "{name}" is missing from {self.path}.')
+
+    def missing(self, names: Iterable[str] = REQUIRED_KEYS) -> list[str]:
+        """Get the keys that are missing from the KeySet."""
+        return [name for name in names if name not in self.keys]
+
+    def validate(self, names: Iterable[str] = REQUIRED_KEYS) -> None:
+        """Raise a KeysError if any of the keys are missing."""
+        missing = self.missing(names)
+        if missing:
+            raise KeysError(f"The keys {', '.join(missing)} are missing from {self.path}.")
+
+    @property
+    def header_key(self) -> bytes:
+        return self["header_key"]
+
+    def key_area_key(self, key_generation: int) -> bytes:
+        """Get the Application Key Area Key of an NCA Key Generation."""
+        return self[f"key_area_key_application_{max(key_generation - 1, 0):02x}"]
+
+
+_cache: dict[Path, KeySet] = {}
+_cache_lock = threading.Lock()
+
+
+def load_keys(path: Path) -> KeySet:
+    """
+    Load a prod.keys file, once per process.
+
+    The KeySet is cached and re-used until the file's modification time or size
+    changes, and even then it's only re-parsed if the file's hash has changed.
+    Raises a KeysError if the file is not valid UTF-8 text or has an invalid key.
+    """
+    path = path.absolute()
+    stat = path.stat()
+    with _cache_lock:
+        cached: Optional[KeySet] = _cache.get(path)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+
+        data = path.read_bytes()
+        sha256 = hashlib.sha256(data).digest()
+        if cached and cached.sha256 == sha256:
+            key_set = replace(cached, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            try:
+                text = data.decode("utf8")
+            except UnicodeDecodeError as e:
+                line = data[: e.start].count(b"\n") + 1
+                raise KeysError(f"Line {line} is not valid UTF-8 text, is this a prod.keys file?")
+            key_set = KeySet(
+                path=path,
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                sha256=sha256,
+                keys=MappingProxyType(derive_keys(parse_keys(text))),
+            )
+        _cache[path] = key_set
+        return key_set
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -1,25 +1,23 @@
 from __future__ import annotations
 
-import base64
+import functools
 import logging
-import os
-import shutil
-import string
-import subprocess
 import sys
 import time
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable, TypeVar, cast
 
 import click as click
 import coloredlogs
-import jsonpickle
-from bs4 import BeautifulSoup
-from PIL import Image
 
-from nton import __version__, nstool, title_ids
-from nton.constants import Binaries, Directories, Files
+# only modules that are cheap to import, commands import what they need so e.g. `--version` starts quickly
+from nton import __version__, pack
+from nton.constants import Directories, Files
 from nton.helpers import get_copyright_years
-from nton.title_ids import get_game_title_ids
+from nton.toolchain import TOOLS, toolchain
+
+F = TypeVar("F", bound=Callable[..., Any])
 
 
 @click.group(invoke_without_command=True)
@@ -43,26 +41,60 @@ def main(ctx: click.Context, version: bool, debug: bool) -> None:
         from nton import gui  # noqa
 
         gui.start(debug)
-    else:
-        for binary, path in vars(Binaries).items():
-            if binary.startswith("__"):
-                continue
-            if not path:
-                log.error(
-                    f"{binary} cannot be found! Place it in the current working directory, "
-                    "or put the folder it's at into your PATH Environment Variable."
-                )
-                sys.exit(1)
-        if not Files.keys.is_file():
-            log.error(
-                f'prod.keys cannot be found! Place it in the current working directory, or at "{Files.keys_home}"'
-            )
-            sys.exit(1)
-        if not Files.game_title_ids.exists():
-            log.error("Game Title ID registry is missing! Please re-add `/assets/game_title_ids.json`!")
-            sys.exit(1)
-        if Files.game_title_ids.stat().st_mtime + (60 * 24 * 30) < time.time():
-            log.warning("Game Title ID registry is quite old, I recommend updating it with `nton update-game-ids`")
+
+
+def check_keys() -> None:
+    """Check the prod.keys exist and have every key needed to build."""
+    from nton.keys import KeysError, load_keys
+
+    log = logging.getLogger("preflight")
+    if not Files.keys.is_file():
+        log.error(f'prod.keys cannot be found! Place it in the current working directory, or at "{Files.keys_home}"')
+        sys.exit(1)
+    try:
+        load_keys(Files.keys).validate()
+    except KeysError as e:
+        log.error(f"prod.keys is invalid, {e}")
+        sys.exit(1)
+
+
+def check_registry() -> None:
+    """Check the Game Title ID registry exists, warning if it's quite old."""
+    from nton import title_ids
+
+    log = logging.getLogger("preflight")
+    if not Files.game_title_ids.exists():
+        log.error("Game Title ID registry is missing! Please re-add `/assets/game_title_ids.bin`!")
+        sys.exit(1)
+    if title_ids.get_last_updated(Files.game_title_ids) + (60 * 24 * 30) < time.time():
+        log.warning("Game Title ID registry is quite old, I recommend updating it with `nton update-game-ids`")
+
+
+def check_tools() -> None:
+    """Resolve the external tools, which are all optional."""
+    log = logging.getLogger("preflight")
+    for name in TOOLS:
+        tool = toolchain.get(name)
+        if tool.path:
+            log.debug(f"Using {name} {tool.version or '(unknown version)'} at {tool.path}")
+        else:
+            # every tool is optional, NROs are parsed and NSPs are packed in-process without them
+            log.debug(f"{name} cannot be found, using the in-process implementation instead.")
+
+
+def preflight(*checks: Callable[[], None]) -> Callable[[F], F]:
+    """Run checks before a command, exiting if any fail. Each command declares only the checks it needs."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            for check in checks:
+                check()
+            return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
 
 
 @main.command()
@@ -74,6 +106,14 @@ def main(ctx: click.Context, version: bool, debug: bool) -> None:
 @click.option("--id", "id_", type=str, default=None, help="Title ID.")
 @click.option("--rom", type=str, default=None, help="ROM path for Direct Game Forwarding.")
 @click.option("--sdmc", type=str, default=None, help="NRO path relative to the root of the Switch's microSD card.")
+@click.option(
+    "--packer",
+    type=click.Choice(list(pack.PACKERS), case_sensitive=False),
+    default=None,
+    help="Packer used to write the NSP. Defaults to hacBrewPack if available, otherwise native.",
+)
+@click.option("--no-cache", is_flag=True, default=False, help="Always extract and pack, ignoring the caches.")
+@preflight(check_keys, check_registry, check_tools)
 def build(
     path: Path,
     name: str | None,
@@ -83,6 +123,8 @@ def build(
     id_: str | None,
     rom: str | None,
     sdmc: str | None,
+    packer: str | None,
+    no_cache: bool,
 ) -> None:
     """
     Build an NSP that loads an NRO on the Switch's microSD card.
@@ -102,313 +144,271 @@ def build(
             ROM by args (e.g., a RetroArch Core, MGBA, possibly others).
         sdmc: Path to the NRO path relative to the root of the Switch's microSD card. This should only be used if the
             NRO path you provided is NOT on the microSD card, as it is implicitly inferred.
+        packer: Packer used to write the NSP. hacBrewPack is the reference implementation, while the native packer
+            builds the NCAs and NSP in-process without hacBrewPack, streaming the NSP to the output path. Defaults
+            to hacBrewPack if it's available, otherwise the native packer, e.g., on Linux.
+        no_cache: Always extract the NACP and Icon and pack the NSP. Otherwise, the NACP and Icon of an unchanged
+            NRO are re-used from the asset cache, and if an NSP was already built from the same NACP, Icon, paths,
+            Title ID, assets, and packer, it's re-used from the build cache.
     """
+    from nton.build import BuildError, BuildJob, build_forwarder
+    from nton.cache import AssetCache, BuildCache
+
     log = logging.getLogger("build")
     log.info("Building!")
 
-    if not Binaries.hptnacp:
-        log.error("hptnacp binary is missing, cannot build NSP.")
+    job = BuildJob(path=path, sdmc=sdmc, name=name, publisher=publisher, version=version, icon=icon, id=id_, rom=rom)
+    try:
+        result = build_forwarder(
+            job,
+            packer,
+            log=log,
+            cache=None if no_cache else BuildCache(),
+            asset_cache=None if no_cache else AssetCache(),
+        )
+    except BuildError as e:
+        if e.critical:
+            log.critical(e)
+            sys.exit(2)
+        log.error(e)
         sys.exit(1)
 
-    if not Binaries.hacbrewpack:
-        log.error("hacBrewPack binary is missing, cannot build NSP.")
-        sys.exit(1)
+    log.info(f"Done! The NSP has been saved to {result.output_path}")
 
-    if not path.is_file():
-        log.error(f'The NRO path "{path}" does not exist, or is not a file.')
+
+@main.command()
+@click.argument("paths", type=str, nargs=-1)
+@click.option("-m", "--manifest", type=Path, default=None, help="Manifest of NROs to build, as CSV or JSON lines.")
+@click.option("-j", "--jobs", type=click.IntRange(min=1), default=None, help="Amount of builds to run in parallel.")
+@click.option(
+    "--packer",
+    type=click.Choice(list(pack.PACKERS), case_sensitive=False),
+    default=None,
+    help="Packer used to write the NSPs. Defaults to hacBrewPack if available, otherwise native.",
+)
+@click.option(
+    "-t",
+    "--tool-jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    envvar="NTON_TOOL_JOBS",
+    help="Amount of each external tool (e.g., hacBrewPack) to run at once.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    envvar="NTON_TOOL_TIMEOUT",
+    help="Seconds to wait for an external tool before killing it.",
+)
+@click.option("-r", "--results", type=Path, default=None, help="Path to save the results of every build as JSON.")
+@click.option("--no-cache", is_flag=True, default=False, help="Always extract and pack, ignoring the caches.")
+@preflight(check_keys, check_registry, check_tools)
+def build_batch(
+    paths: tuple[str, ...],
+    manifest: Path | None,
+    jobs: int | None,
+    packer: str | None,
+    tool_jobs: int | None,
+    timeout: float | None,
+    results: Path | None,
+    no_cache: bool,
+) -> None:
+    """
+    Build NSPs for many NROs on the Switch's microSD card at once.
+
+    \b
+    Parameters:
+        paths: Paths to NRO files on the Switch's microSD card, or glob patterns (e.g., "E:/switch/**/*.nro").
+        manifest: Path to a manifest of NROs to build with per-NRO options. Either a CSV file with a header row,
+            or a file with a JSON object per line. The fields are path, sdmc, name, publisher, version, icon, id,
+            and rom, which work like the options of `build`. Only path is required.
+        jobs: Amount of builds to run in parallel, defaults to the amount of CPU cores.
+        packer: Packer used to write the NSPs, see `build`.
+        tool_jobs: Amount of each external tool to run at once, defaults to the amount of CPU cores. With
+            hacBrewPack, builds beyond this extract and stage their NROs while waiting for a free slot.
+        timeout: Seconds to wait for an external tool before killing it and failing its build, defaults to 300.
+        results: Path to save the results of every build as JSON. Defaults to the output directory.
+        no_cache: Always extract the NACPs and Icons and pack the NSPs, see `build`.
+
+    Title IDs are unique across the batch. A build that fails does not stop the others.
+    """
+    from nton import batch
+    from nton.cache import AssetCache, BuildCache
+
+    log = logging.getLogger("build-batch")
+
+    try:
+        build_jobs = (batch.read_manifest(manifest) if manifest else []) + batch.expand_paths(paths)
+    except (OSError, ValueError) as e:
+        log.error(f"Failed to read the manifest, {e}")
+        sys.exit(1)
+    if not build_jobs:
+        log.error("No NROs to build, specify NRO paths or a manifest.")
         sys.exit(1)
 
-    if path.suffix.lower() != ".nro":
-        log.error(f'The NRO path "{path}" is not to an NRO file.')
+    log.info(f"Building {len(build_jobs)} NSPs!")
+    batch_results = batch.run_batch(
+        build_jobs,
+        packer,
+        max_workers=jobs,
+        cache=None if no_cache else BuildCache(),
+        asset_cache=None if no_cache else AssetCache(),
+        tool_jobs=tool_jobs,
+        timeout=timeout,
+    )
+
+    click.echo(batch.format_summary(batch_results))
+    results = results or Directories.output / "build-batch-results.json"
+    batch.write_results(batch_results, results)
+
+    failed = sum(not x.ok for x in batch_results)
+    log.info(
+        f"Done! Built {len(batch_results) - failed}/{len(batch_results)} NSPs, the results were saved to {results}"
+    )
+    if failed:
         sys.exit(1)
 
-    if sdmc:
-        if not sdmc.startswith("sdmc:/"):
-            if not sdmc.startswith("/"):
-                sdmc = f"/{sdmc}"
-            sdmc = f"sdmc:{sdmc}"
-    else:
-        path_root = Path(path.anchor)
-        if not (
-            ((path_root / "Nintendo").exists() and (path_root / "switch").exists())
-            or ((path_root / "atmosphere").exists() and ((path_root / "bootloader").exists()))
-        ):
-            log.error("The NRO path must be a path on your Switch's microSD card to implicitly infer the sdmc path.")
-            log.error("You can use --sdmc to manually specify the path relative to the Switch's microSD card.")
-            sys.exit(1)
-        sdmc = path.resolve().absolute().as_posix().replace(path.anchor.replace("\\", "/"), "sdmc:/")
-
-    verification = nstool.verify(path, "nro")
-    if verification:
-        log.critical('The NRO "%s" is invalid, %s', path, verification)
-        sys.exit(2)
-
-    log.info("NRO checked and verified")
-
-    if id_:
-        if any(c not in string.hexdigits for c in id_):
-            log.error(f'The Title ID "{id_}" is an invalid hex string. It must be a-fA-f0-9.')
-            sys.exit(1)
-        id_ = id_.lower()
-        if id_ in title_ids.ALL_SYSTEM:
-            log.critical(f'The Title ID "{id_}" is a reserved System Title! Using it is unsafe!')
-            sys.exit(2)
-        if id_ in title_ids.game_title_ids:
-            log.warning(f'The Title ID "{id_}" is already used by "{title_ids.game_title_ids[id_]}".')
-    elif path.stem.lower() in title_ids.unofficial:
-        id_ = title_ids.unofficial[path.stem.lower()]
-    elif sdmc and Path(sdmc).stem.lower() in title_ids.unofficial:
-        id_ = title_ids.unofficial[Path(sdmc).stem.lower()]
-    else:
-        id_ = "0100000000000000"
-        while id_ in title_ids.ALL:
-            id_ = "01%s000" % os.urandom(6).hex()[:-1]
 
-    if rom and not rom.startswith("/"):
-        rom = f"/{rom}"
+@main.group()
+def cache() -> None:
+    """Manage the caches of previously built NSPs and extracted NRO assets."""
+
+
+@cache.command()
+def stats() -> None:
+    """Show the size and usage of the build and asset caches."""
+    from nton.cache import AssetCache, BuildCache
+
+    log = logging.getLogger("cache")
 
-    log.info("Title ID: %s", id_)
+    def format_time(timestamp: float | None) -> str:
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
 
-    build_dir = Directories.temp / id_
-    control_template_file = Directories.assets / "control.nacp.xml"
-    control_dir = build_dir / "control"
-    romfs_dir = build_dir / "romfs"
-    exefs_dir = build_dir / "exefs"
-    logo_dir = build_dir / "logo"
-    hacbrewpack_backup_dir = build_dir / "hacbrewpack_backup"
-    control_file = control_dir / "control.nacp"
-    icon_file = control_dir / "icon_AmericanEnglish.dat"
-    next_argv_file = romfs_dir / "nextArgv"
-    next_nro_path_file = romfs_dir / "nextNroPath"
+    for name, cache_stats in (("Build", BuildCache().stats()), ("Asset", AssetCache().stats())):
+        log.info(f"{name} cache:")
+        log.info(f" - Directory: {cache_stats.directory}")
+        log.info(f" - Entries: {cache_stats.entries}")
+        log.info(f" - Size: {cache_stats.size / 1024**2:.1f} MiB of {cache_stats.max_size / 1024**2:.1f} MiB")
+        log.info(f" - Least recently used: {format_time(cache_stats.oldest)}")
+        log.info(f" - Most recently used: {format_time(cache_stats.newest)}")
 
-    log.debug("Build Directory: %s", build_dir)
 
+@cache.command()
+@click.option(
+    "-s",
+    "--max-size",
+    type=str,
+    default=None,
+    help="Size to prune each cache to, e.g., 512M. Defaults to the size limit of each cache.",
+)
+@click.option("-a", "--all", "all_", is_flag=True, default=False, help="Remove every entry from the caches.")
+def prune(max_size: str | None, all_: bool) -> None:
+    """
+    Remove the least recently used entries from the build and asset caches.
+
+    The build cache size limit defaults to 1G and can be changed with the NTON_CACHE_MAX_SIZE
+    environment variable. The asset cache size limit defaults to 64M and can be changed with
+    the NTON_ASSET_CACHE_MAX_SIZE environment variable.
+    """
+    from nton.cache import AssetCache, BuildCache, parse_size
+
+    log = logging.getLogger("cache")
     try:
-        if build_dir.exists():
-            log.debug("Build Directory pre-existing")
-            shutil.rmtree(build_dir)
-        build_dir.mkdir(parents=True)
-        control_dir.mkdir()
-        romfs_dir.mkdir()
-
-        shutil.copytree(Directories.assets / "exefs", exefs_dir)
-        shutil.copytree(Directories.assets / "logo", logo_dir)
-
-        control_file_res = nstool.get_nacp(path, control_file)
-        if control_file_res:
-            if control_file_res == "No NACP was extracted from the asset.":
-                log.warning("The NRO does not have a NACP partition, building a new one.")
-                if not name or not publisher or not version:
-                    log.error("You must specify a Name, Publisher, and Version to be able to build the NACP.")
-                    log.error("You may also want to specify an Icon but it is not strictly necessary.")
-                    sys.exit(1)
-                control_template = control_template_file.read_text(encoding="utf8")
-                root = BeautifulSoup(control_template, "xml")
-                for title in root.find_all("Title"):
-                    if title.Name:
-                        title.Name.string = name
-                    if title.Publisher:
-                        title.Publisher.string = publisher
-                for title_id in root.find_all(["PresenceGroupId", "SaveDataOwnerId", "LocalCommunicationId"]):
-                    title_id.string = f"0x{id_}"
-                displayVersion = root.find("DisplayVersion")
-                if displayVersion:
-                    displayVersion.string = version
-                addOnContentBaseId = root.find("AddOnContentBaseId")
-                if addOnContentBaseId:
-                    addOnContentBaseId.string = hex(int(id_, 16) + 0x1000)
-                tmp_control_template = build_dir / "control.nacp.xml"
-                tmp_control_template.write_text(str(root))
-                try:
-                    subprocess.check_output(
-                        [
-                            Binaries.hptnacp,
-                            "-a",
-                            "createnacp",
-                            "-i",
-                            str(tmp_control_template.absolute()),
-                            "-o",
-                            str(control_file.absolute()),
-                        ]
-                    )
-                except subprocess.CalledProcessError as e:
-                    log.critical(f"Failed to build a new NACP, {e.output} [{e.returncode}]")
-                    sys.exit(2)
-                log.info("Built a new NACP")
-            else:
-                log.critical(f"Failed extracting the NACP partition from the NRO, {control_file_res}")
-                sys.exit(2)
-
-        control_file_data = bytearray(control_file.read_bytes())
-        log.debug("Got the Control partition")
-        log.debug(base64.b64encode(control_file_data).decode())
-
-        # enable video capture and screenshots if disabled
-        if control_file_data[0x3035] != 0x02:
-            # 0x00 = Disabled, 0x01 = Manual, 0x02 = Enabled
-            control_file_data[0x3035] = 0x02
-            log.info("Enabled Video Capture")
-        if control_file_data[0x3034] != 0x00:
-            # 0x00 = Enabled, 0x01 = Disabled
-            control_file_data[0x3034] = 0x00
-            log.info("Enabled Screenshots")
-
-        # disable storage allocation as none of them would be used
-        save_data_size_offsets = {
-            0x3080: "User Account Save Data",
-            0x3088: "User Account Save Data Journal",
-            0x3090: "Device Save Data",
-            0x3098: "Device Save Data Journal",
-            0x30A0: "BCAT Delivery Cache Storage",
-            0x3148: "Max User Account Save Data",
-            0x3150: "Max User Account Save Data Journal",
-            0x3158: "Max Device Save Data",
-            0x3160: "Max Device Save Data Journal",
-            0x3168: "Temporary Storage",
-            0x3170: "Cache Storage",
-            0x3178: "Cache Storage Journal",
-            0x3180: "Max Cache Storage Data and Journal",
-        }
-        for offset, offset_name in save_data_size_offsets.items():
-            save_data_size = int.from_bytes(control_file_data[offset : offset + 8], byteorder="little")
-            if save_data_size != 0:
-                control_file_data[offset : offset + 8] = b"\x00" * 8
-                log.info(f"Removed {offset_name} Allocation")
-
-        # set cache storage index max to 0
-        control_file_data[0x3188 : 0x3188 + 0x2] = b"\x00\x00"
-
-        # disable user profile selection as it's unnecessary
-        control_file_data[0x3025] = 0x00
-
-        if not name:
-            # TODO: Assumes "AmericanEnglish" name is the one that's used and wanted
-            name = control_file_data[0x0000:0x000F].replace(b"\x00", b"").strip().decode("utf8")
-        if not name:
-            log.error("The Control Partition does not have any listed Name nor was one manually specified.")
-            sys.exit(1)
-        if not any(x in string.ascii_letters + string.digits for x in name):
-            log.error(f'The Application Name, "{name}", cannot be all special characters.')
-            sys.exit(1)
-        if len(name.encode("utf8")) > 0x200:  # fits 0x200 * 10 (16 fields)
-            log.error(f'The Title Name "{name}" is too large to fit in the NSP.')
-            sys.exit(1)
-        log.info("Title Name: %s", name)
-
-        if not publisher:
-            # TODO: Assumes "AmericanEnglish" publisher is the one that's used and wanted
-            publisher = control_file_data[0x0200:0x020F].replace(b"\x00", b"").strip().decode("utf8")
-        if not publisher:
-            log.error("The Control Partition does not have any listed Publisher nor was one manually specified.")
-            sys.exit(1)
-        if not any(x in string.ascii_letters + string.digits for x in publisher):
-            log.error(f'The Publisher, "{publisher}", cannot be all special characters.')
-            sys.exit(1)
-        if len(publisher.encode("utf8")) > 0x100:  # fits 0x100 * 10 (16 fields)
-            log.error(f'The Title Publisher "{publisher}" is too large to fit in the NSP.')
-            sys.exit(1)
-        log.info("Publisher: %s", publisher)
-
-        # only keep one name/publisher, store as AmericanEnglish
-        # this is because the CLI has only one name/publisher option to use
-        control_file_data[0x0:0x3000] = b"\x00" * 0x3000
-        control_file_data[0x0:0x200] = name.encode("utf8").ljust(0x200, b"\x00")
-        control_file_data[0x200:0x300] = publisher.encode("utf8").ljust(0x100, b"\x00")
-
-        if version:
-            version_utf8 = version.encode("utf8")
-            while len(version_utf8) < 0x10:
-                version_utf8 += b"\x00"
-            control_file_data[0x3060:0x306F] = version_utf8
-        else:
-            version = control_file_data[0x3060:0x306F].replace(b"\x00", b"").strip().decode("utf8")
-            if not version:
-                log.error("The Control Partition does not have any listed Version nor was one manually specified.")
-                sys.exit(1)
-        if len(version.encode("utf8")) > 0x10:
-            log.error(f'The Title Version "{version}" is too large to fit in the NSP.')
-            sys.exit(1)
-        log.info("Version: %s", version)
-
-        control_file.write_bytes(control_file_data)
-
-        if icon:
-            shutil.copy(icon, icon_file)
-        else:
-            icon_file_res = nstool.get_icon(path, icon_file)
-            if icon_file_res:
-                if icon_file_res == "No Icon was extracted from the asset.":
-                    log.warning("The NRO does not have an Icon, proceeding without one.")
-                else:
-                    log.critical(f"Failed extracting the Icon partition from the NRO, {icon_file_res}")
-                    sys.exit(2)
-            else:
-                log.debug("Got the Icon partition")
-                log.debug(base64.b64encode(icon_file.read_bytes()).decode())
-
-        if icon_file.exists():
-            # We must strip every unnecessary metadata or the icon will be a '?'
-            im = Image.open(icon_file)
-            if im.size != (256, 256):
-                im = im.resize((256, 256))
-            if im.mode != "RGB":
-                im = im.convert("RGB")
-            clean_im = Image.new(im.mode, im.size)
-            clean_im.putdata(list(im.getdata()))
-            clean_im.save(icon_file, format="JPEG")
-            clean_im.close()
-            im.close()
-
-        next_nro_path = sdmc
-        next_nro_path_file.write_text(next_nro_path)
-
-        next_argv = next_nro_path
-        if rom:
-            next_argv += f' "sdmc:{rom}"'
-        next_argv_file.write_text(next_argv)
-
-        # only make this directory at this point because we have a high chance of success
-        Directories.output.mkdir(parents=True, exist_ok=True)
-
-        try:
-            subprocess.check_output(
-                [
-                    Binaries.hacbrewpack,
-                    "--titleid",
-                    id_,
-                    "--nspdir",
-                    str(Directories.output.absolute()),
-                    "-k",
-                    str(Files.keys.absolute()),
-                ],
-                cwd=build_dir,
-            )
-            os.system("")  # fixes logs, I don't know why or how
-        except subprocess.CalledProcessError as e:
-            log.critical(f'Failed to build NSP, "{e.args}", {e.output} [{e.returncode}]')
-            sys.exit(2)
+        size = 0 if all_ else parse_size(max_size) if max_size else None
+    except ValueError as e:
+        log.error(e)
+        sys.exit(1)
+    evicted, freed = BuildCache().prune(size)
+    log.info(f"Removed {evicted} NSPs from the build cache, freeing {freed / 1024**2:.1f} MiB.")
+    evicted, freed = AssetCache().prune(size)
+    log.info(f"Removed {evicted} NRO assets from the asset cache, freeing {freed / 1024**2:.1f} MiB.")
+    log.info("Done!")
 
-        nsp_final_path = Directories.output / f"{name} v{version} by {publisher} [{id_}].nsp"
-        if nsp_final_path.exists():
-            log.warning("An NSP forwarder of the same name, publisher and title ID already existed.")
-            nsp_final_path.unlink()
-        shutil.move(Directories.output / f"{id_}.nsp", nsp_final_path)
 
-        log.info(f"Done! The NSP has been saved to {nsp_final_path}")
-    finally:
-        if build_dir.exists():
-            shutil.rmtree(build_dir)
-        if hacbrewpack_backup_dir.exists():
-            shutil.rmtree(hacbrewpack_backup_dir)
+@main.command()
+@click.option("-r", "--refresh", is_flag=True, default=False, help="Probe every tool again, ignoring the cache.")
+def tools(refresh: bool) -> None:
+    """
+    Show the external tools in use, their version, and SHA-256.
+
+    Tools are probed once and cached until the tool's file changes. Tools that
+    cannot be found are optional, nton falls back to in-process implementations.
+    """
+    log = logging.getLogger("tools")
+    for name in TOOLS:
+        tool = toolchain.get(name, refresh=refresh)
+        if not tool.path:
+            log.info(f"{name}: not found, using the in-process implementation")
+            continue
+        log.info(f"{name}:")
+        log.info(f" - Path: {tool.path}")
+        log.info(f" - Version: {tool.version or 'unknown'}")
+        log.info(f" - SHA-256: {tool.sha256}")
 
 
 @main.command()
-def update_game_ids() -> None:
+@click.option(
+    "-s",
+    "--source",
+    "sources",
+    type=str,
+    multiple=True,
+    default=("tinfoil",),
+    envvar="NTON_TITLE_ID_SOURCES",
+    show_default=True,
+    help="Source to fetch the registry from: tinfoil, a mirror URL, or a local directory/file of JSON or CSV. "
+    "May be used multiple times, with earlier sources taking priority on conflicts.",
+)
+@click.option(
+    "-j", "--json", "json_path", type=Path, default=None, help="Also export the registry as JSON to this path."
+)
+def update_game_ids(sources: tuple[str, ...], json_path: Path | None) -> None:
     """
     Update the pre-existing Title ID registry.
 
+    All sources are fetched in parallel. Only new or changed Game Title IDs are merged into
+    the registry, and nothing is downloaded from a source that has not changed since the
+    last update.
+
     Note: This makes calls to Tinfoil.io that may fail.
     """
-    print("Updating the Game Title ID registry via Tinfoil API, this may take a while...")
-    game_title_ids = get_game_title_ids()
-    Files.game_title_ids.write_text(jsonpickle.dumps(game_title_ids), encoding="utf8")
+    from nton import title_ids
+
+    log = logging.getLogger("update-game-ids")
+    try:
+        providers = [title_ids.get_provider(source, len(sources) - i) for i, source in enumerate(sources)]
+    except ValueError as e:
+        log.error(e)
+        sys.exit(1)
+
+    log.info("Updating the Game Title ID registry from %s, this may take a while...", ", ".join(sources))
+    update = title_ids.update_game_title_ids(Files.game_title_ids, providers)
+    for source, error in update.errors.items():
+        log.warning("Failed updating from %s, %s", source, error)
+    if update.modified:
+        log.info(f"Updated the registry with {update.added} new and {update.changed} changed Game Title IDs.")
+    else:
+        log.info("The registry is already up to date.")
+    log.info(f"The registry has {update.count} Game Title IDs.")
+    if json_path:
+        title_ids.export_game_title_ids(title_ids.read_game_title_ids(Files.game_title_ids), json_path)
+
+
+@main.command()
+@click.argument("path", type=Path, default=Files.game_title_ids)
+def migrate_game_ids(path: Path) -> None:
+    """
+    Clean an existing Title ID registry in place.
+
+    This strips HTML markup and entities from Game Names stored by older versions.
+    Both compiled and JSON registries are supported.
+    """
+    from nton import title_ids
+
+    log = logging.getLogger("migrate-game-ids")
+    if not path.is_file():
+        log.error(f'The Title ID registry "{path}" does not exist, or is not a file.')
+        sys.exit(1)
+    saved = title_ids.migrate_game_title_ids(path)
+    log.info(f"Done! Migrated the Title ID registry at {path}, saving {saved} bytes.")
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import functools
+import struct
+from enum import IntEnum
+from typing import Any, Generic, Optional, TypeVar, Union, overload
+
+from nton.constants import Directories
+
+# https://switchbrew.org/wiki/NACP
+NACP_SIZE = 0x4000
+# compiled from the former control.nacp.xml; AmericanEnglish only, Screenshot Allow, VideoCapture Enable,
+# DataLossConfirmation Required, LogoType Nintendo, the same Rating ages, and no storage allocation
+TEMPLATE = Directories.assets / "control.nacp"
+TITLE = struct.Struct("<512s256s")  # name, publisher
+TITLE_COUNT = 16
+LANGUAGES = (
+    "AmericanEnglish",
+    "BritishEnglish",
+    "Japanese",
+    "French",
+    "German",
+    "LatinAmericanSpanish",
+    "Spanish",
+    "Italian",
+    "Dutch",
+    "CanadianFrench",
+    "Portuguese",
+    "Russian",
+    "Korean",
+    "TraditionalChinese",
+    "SimplifiedChinese",
+    "BrazilianPortuguese",
+)
+
+# storage sizes allocated on install, none of which are used by a forwarder
+STORAGE_SIZES = {
+    0x3080: "User Account Save Data",
+    0x3088: "User Account Save Data Journal",
+    0x3090: "Device Save Data",
+    0x3098: "Device Save Data Journal",
+    0x30A0: "BCAT Delivery Cache Storage",
+    0x3148: "Max User Account Save Data",
+    0x3150: "Max User Account Save Data Journal",
+    0x3158: "Max Device Save Data",
+    0x3160: "Max Device Save Data Journal",
+    0x3168: "Temporary Storage",
+    0x3170: "Cache Storage",
+    0x3178: "Cache Storage Journal",
+    0x3180: "Max Cache Storage Data and Journal",
+}
+STORAGE_SIZE = struct.Struct("<q")
+
+T = TypeVar("T")
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class StartupUserAccount(IntEnum):
+    NONE = 0
+    REQUIRED = 1
+    REQUIRED_WITH_NETWORK_SERVICE_ACCOUNT_AVAILABLE = 2
+
+
+class Screenshot(IntEnum):
+    ALLOW = 0
+    DENY = 1
+
+
+class VideoCapture(IntEnum):
+    DISABLE = 0
+    MANUAL = 1
+    ENABLE = 2
+
+
+class _Field(Generic[T]):
+    """A typed field at a fixed offset of the NACP, packed and unpacked in place."""
+
+    def __init__(self, offset: int, fmt: str, type_: Any = int) -> None:
+        self.offset = offset
+        self.struct = struct.Struct(f"<{fmt}")
+        self.type = type_
+
+    @overload
+    def __get__(self, instance: None, owner: type) -> _Field[T]: ...
+
+    @overload
+    def __get__(self, instance: Nacp, owner: type) -> T: ...
+
+    def __get__(self, instance: Optional[Nacp], owner: type) -> Union[_Field[T], T]:
+        if instance is None:
+            return self
+        value = self.struct.unpack_from(instance.view, self.offset)[0]
+        try:
+            return self.type(value)  # type: ignore[no-any-return]
+        except ValueError:  # e.g., an unknown enum value
+            return value  # type: ignore[no-any-return]
+
+    def __set__(self, instance: Nacp, value: T) -> None:
+        self.struct.pack_into(instance.view, self.offset, value)
+
+
+class _String:
+    """A NUL-padded UTF-8 string field at a fixed offset of the NACP."""
+
+    def __init__(self, offset: int, size: int) -> None:
+        self.offset = offset
+        self.size = size
+
+    @overload
+    def __get__(self, instance: None, owner: type) -> _String: ...
+
+    @overload
+    def __get__(self, instance: Nacp, owner: type) -> str: ...
+
+    def __get__(self, instance: Optional[Nacp], owner: type) -> Union[_String, str]:
+        if instance is None:
+            return self
+        return _decode(instance.view[self.offset : self.offset + self.size])
+
+    def __set__(self, instance: Nacp, value: str) -> None:
+        instance.view[self.offset : self.offset + self.size] = _encode(value, self.size)
+
+
+def _decode(data: Buffer) -> str:
+    return bytes(data).split(b"\x00", 1)[0].decode("utf8", errors="replace").strip()
+
+
+def _encode(value: str, size: int) -> bytes:
+    data = value.encode("utf8")
+    if len(data) > size:
+        raise ValueError(f'"{value}" is too large, it must fit in {size} bytes as UTF-8.')
+    return data.ljust(size, b"\x00")
+
+
+@functools.lru_cache(maxsize=1)
+def _read_template() -> bytes:
+    return TEMPLATE.read_bytes()
+
+
+class Nacp:
+    """
+    Application Control Property (NACP), backed by a single 0x4000-byte buffer.
+
+    Fields are read and written in place through a memoryview of the buffer with
+    precomputed struct layouts, so editing a NACP never re-allocates it.
+    """
+
+    startup_user_account = _Field[StartupUserAccount](0x3025, "B", StartupUserAccount)
+    screenshot = _Field[Screenshot](0x3034, "B", Screenshot)
+    video_capture = _Field[VideoCapture](0x3035, "B", VideoCapture)
+    presence_group_id = _Field[int](0x3038, "Q")
+    display_version = _String(0x3060, 0x10)
+    add_on_content_base_id = _Field[int](0x3070, "Q")
+    save_data_owner_id = _Field[int](0x3078, "Q")
+    local_communication_id = _Field[int](0x30B0, "Q")  # the first of 8
+    cache_storage_index_max = _Field[int](0x3188, "H")
+
+    def __init__(self, data: Optional[Buffer] = None) -> None:
+        if data is not None and len(data) != NACP_SIZE:
+            raise ValueError(f"A NACP must be {NACP_SIZE} bytes, not {len(data)} bytes.")
+        self.data = bytearray(data) if data is not None else bytearray(NACP_SIZE)
+        self.view = memoryview(self.data)
+
+    @classmethod
+    def from_template(cls, name: str, publisher: str, version: str, title_id: int) -> Nacp:
+        """
+        Create a new NACP for a title from the bundled template.
+
+        Raises a ValueError if the name, publisher, or version is too large.
+        """
+        nacp = cls(_read_template())
+        nacp.set_only_title(name, publisher)
+        nacp.display_version = version
+        nacp.presence_group_id = title_id
+        nacp.save_data_owner_id = title_id
+        nacp.local_communication_id = title_id
+        nacp.add_on_content_base_id = title_id + 0x1000
+        return nacp
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.data)
+
+    def get_title(self, language: Union[int, str] = 0) -> tuple[str, str]:
+        """Get the Name and Publisher of a language, by index or name."""
+        offset = self._title_offset(language)
+        name, publisher = TITLE.unpack_from(self.view, offset)
+        return _decode(name), _decode(publisher)
+
+    def set_title(self, language: Union[int, str], name: str, publisher: str) -> None:
+        """Set the Name and Publisher of a language, by index or name."""
+        TITLE.pack_into(self.view, self._title_offset(language), _encode(name, 0x200), _encode(publisher, 0x100))
+
+    @property
+    def titles(self) -> dict[str, tuple[str, str]]:
+        """The Name and Publisher of every language."""
+        return {language: self.get_title(i) for i, language in enumerate(LANGUAGES)}
+
+    def set_only_title(self, name: str, publisher: str) -> None:
+        """Set the Name and Publisher as AmericanEnglish, clearing every other language."""
+        title = _encode(name, 0x200) + _encode(publisher, 0x100)
+        self.view[: TITLE.size * TITLE_COUNT] = title.ljust(TITLE.size * TITLE_COUNT, b"\x00")
+
+    @staticmethod
+    def _title_offset(language: Union[int, str]) -> int:
+        index = LANGUAGES.index(language) if isinstance(language, str) else language
+        if not 0 <= index < TITLE_COUNT:
+            raise IndexError(f"There is no title for the language index {index}.")
+        return index * TITLE.size
+
+    @property
+    def name(self) -> str:
+        return self.get_title(0)[0]
+
+    @property
+    def publisher(self) -> str:
+        return self.get_title(0)[1]
+
+    def get_storage_size(self, offset: int) -> int:
+        return STORAGE_SIZE.unpack_from(self.view, offset)[0]  # type: ignore[no-any-return]
+
+    @property
+    def storage_sizes(self) -> dict[str, int]:
+        """The size of every storage allocated on install, by name."""
+        return {name: self.get_storage_size(offset) for offset, name in STORAGE_SIZES.items()}
+
+    def apply_forwarder_policy(
+        self,
+        video_capture: VideoCapture = VideoCapture.ENABLE,
+        screenshot: Screenshot = Screenshot.ALLOW,
+    ) -> list[str]:
+        """
+        Apply the settings every forwarder should use, in one pass.
+
+        This sets the capture flags, removes every storage allocation as none of them
+        would be used, and disables user profile selection as it's unnecessary.
+        Returns a description of each change made.
+        """
+        changes = []
+
+        if self.video_capture != video_capture:
+            self.video_capture = video_capture
+            if video_capture == VideoCapture.ENABLE:
+                changes.append("Enabled Video Capture")
+            else:
+                changes.append(f"Set Video Capture to {video_capture.name.title()}")
+        if self.screenshot != screenshot:
+            self.screenshot = screenshot
+            changes.append("Enabled Screenshots" if screenshot == Screenshot.ALLOW else "Disabled Screenshots")
+
+        for offset, name in STORAGE_SIZES.items():
+            if self.get_storage_size(offset):
+                STORAGE_SIZE.pack_into(self.view, offset, 0)
+                changes.append(f"Removed {name} Allocation")
+        self.cache_storage_index_max = 0
+
+        self.startup_user_account = StartupUserAccount.NONE
+
+        return changes
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Optional, Sequence
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from nton.pack import pfs0
+
+# https://switchbrew.org/wiki/NCA
+MEDIA_SIZE = 0x200
+HEADER_SIZE = 0xC00
+SDK_VERSION = 0x000C1100
+NCA_HEADER = struct.Struct("<256s256s4sBBBBQQIIBB14x16s64s128s64s192x")
+FS_ENTRY = struct.Struct("<II8x")  # start and end offset, in media units
+FS_HEADER = struct.Struct(
+    "<HBBB3x248s64xII184x"
+)  # version, fs/hash/encryption type, hash data, generation, secure value
+
+# https://switchbrew.org/wiki/NCA#HierarchicalSha256Data
+PFS0_BLOCK_SIZE = 0x10000
+PFS0_HASH_DATA = struct.Struct("<32sII4Q")  # master hash, block size, layer count, hash table and PFS0 regions
+
+# https://switchbrew.org/wiki/NCA#HierarchicalIntegrity
+IVFC_BLOCK_SIZE_LOG2 = 14
+IVFC_LEVELS = 6
+IVFC_HEADER = struct.Struct("<4sIII")  # magic, version, master hash size, layer count
+IVFC_LEVEL = struct.Struct("<QQI4x")  # offset, size, block size (log2)
+
+# https://switchbrew.org/wiki/RomFS
+ROMFS_HEADER = struct.Struct("<10Q")
+ROMFS_DIR_ENTRY = struct.Struct("<6I")  # parent, sibling, child dir, child file, hash sibling, name size
+ROMFS_FILE_ENTRY = struct.Struct("<IIQQII")  # parent, sibling, data offset, data size, hash sibling, name size
+ROMFS_DATA_OFFSET = 0x200
+ROMFS_NONE = 0xFFFFFFFF
+
+# https://switchbrew.org/wiki/CNMT
+CNMT_HEADER = struct.Struct("<QIBBHHHB3xI4x")
+CNMT_APPLICATION_HEADER = struct.Struct("<QII")  # patch id, required system version, required application version
+CNMT_CONTENT_RECORD = struct.Struct("<32s16s6sBB")  # hash, content id, size, content type, id offset
+CNMT_APPLICATION = 0x80
+
+# https://switchbrew.org/wiki/NPDM
+NPDM_ACID_OFFSET = 0x78
+NPDM_ACI0_OFFSET = 0x70
+
+
+class ContentType(IntEnum):
+    PROGRAM = 0
+    META = 1
+    CONTROL = 2
+
+
+class CnmtContentType(IntEnum):
+    META = 0
+    PROGRAM = 1
+    DATA = 2
+    CONTROL = 3
+
+
+class FsType(IntEnum):
+    ROMFS = 0
+    PFS0 = 1
+
+
+class HashType(IntEnum):
+    HIERARCHICAL_SHA256 = 2
+    HIERARCHICAL_INTEGRITY = 3
+
+
+class EncryptionType(IntEnum):
+    NONE = 1
+    AES_CTR = 3
+
+
+@dataclass(frozen=True)
+class Section:
+    """A plaintext NCA section and the data needed for its FS header."""
+
+    fs_type: FsType
+    hash_type: HashType
+    hash_data: bytes
+    data: bytes
+    encrypted: bool = True
+
+
+@dataclass(frozen=True)
+class Nca:
+    content_type: ContentType
+    data: bytes
+
+    @property
+    def hash(self) -> bytes:
+        return hashlib.sha256(self.data).digest()
+
+    @property
+    def content_id(self) -> str:
+        return self.hash[:16].hex()
+
+    @property
+    def filename(self) -> str:
+        if self.content_type == ContentType.META:
+            return f"{self.content_id}.cnmt.nca"
+        return f"{self.content_id}.nca"
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def _pad(data: bytes, alignment: int) -> bytes:
+    return data.ljust(_align(len(data), alignment), b"\x00")
+
+
+def pfs0_section(files: dict[str, bytes], encrypted: bool = True) -> Section:
+    """Build a PFS0 section with a HierarchicalSha256 hash table, e.g., for the ExeFS or Logo."""
+    names = sorted(files)
+    container = pfs0.build_header([(name, len(files[name])) for name in names]) + b"".join(
+        files[name] for name in names
+    )
+
+    hash_table = b"".join(
+        hashlib.sha256(container[i : i + PFS0_BLOCK_SIZE]).digest() for i in range(0, len(container), PFS0_BLOCK_SIZE)
+    )
+    pfs0_offset = _align(len(hash_table), MEDIA_SIZE)
+
+    return Section(
+        fs_type=FsType.PFS0,
+        hash_type=HashType.HIERARCHICAL_SHA256,
+        hash_data=PFS0_HASH_DATA.pack(
+            hashlib.sha256(hash_table).digest(),
+            PFS0_BLOCK_SIZE,
+            2,
+            0,
+            len(hash_table),
+            pfs0_offset,
+            len(container),
+        ),
+        data=hash_table.ljust(pfs0_offset, b"\x00") + container,
+        encrypted=encrypted,
+    )
+
+
+def _romfs_hash(parent: int, name: bytes) -> int:
+    hash_ = parent ^ 123456789
+    for c in name:
+        hash_ = ((hash_ >> 5) | (hash_ << 27)) & 0xFFFFFFFF
+        hash_ ^= c
+    return hash_
+
+
+def _romfs_hash_table_size(count: int) -> int:
+    if count < 3:
+        return 3
+    if count < 19:
+        return count | 1
+    while any(count % prime == 0 for prime in (2, 3, 5, 7, 11, 13, 17)):
+        count += 1
+    return count
+
+
+def build_romfs(files: dict[str, bytes]) -> bytes:
+    """
+    Build a RomFS image of files in its root directory.
+
+    Sub-directories are not supported as forwarders never need them.
+    """
+    names = sorted(name.encode("utf8") for name in files)
+    if any(b"/" in name for name in names):
+        raise ValueError("Only files in the root directory of the RomFS are supported.")
+
+    data = bytearray()
+    file_table = bytearray()
+    file_hash_table = [ROMFS_NONE] * _romfs_hash_table_size(len(names))
+    for i, name in enumerate(names):
+        file_data = files[name.decode("utf8")]
+        data_offset = _align(len(data), 0x10)
+        data = data.ljust(data_offset, b"\x00") + file_data
+
+        entry_offset = len(file_table)
+        entry_size = ROMFS_FILE_ENTRY.size + _align(len(name), 4)
+        bucket = _romfs_hash(0, name) % len(file_hash_table)
+        sibling = entry_offset + entry_size if i + 1 < len(names) else ROMFS_NONE
+        file_table += ROMFS_FILE_ENTRY.pack(0, sibling, data_offset, len(file_data), file_hash_table[bucket], len(name))
+        file_table += _pad(name, 4)
+        file_hash_table[bucket] = entry_offset
+
+    dir_hash_table = [ROMFS_NONE] * _romfs_hash_table_size(1)
+    root_bucket = _romfs_hash(0, b"") % len(dir_hash_table)
+    dir_table = ROMFS_DIR_ENTRY.pack(
+        0, ROMFS_NONE, ROMFS_NONE, 0 if names else ROMFS_NONE, dir_hash_table[root_bucket], 0
+    )
+    dir_hash_table[root_bucket] = 0
+
+    tables = [
+        struct.pack(f"<{len(dir_hash_table)}I", *dir_hash_table),
+        dir_table,
+        struct.pack(f"<{len(file_hash_table)}I", *file_hash_table),
+        bytes(file_table),
+    ]
+    regions = []
+    offset = _align(ROMFS_DATA_OFFSET + len(data), 4)
+    for table in tables:
+        regions += [offset, len(table)]
+        offset += len(table)
+
+    header = ROMFS_HEADER.pack(ROMFS_HEADER.size, *regions, ROMFS_DATA_OFFSET)
+    return header.ljust(ROMFS_DATA_OFFSET, b"\x00") + _pad(bytes(data), 4) + b"".join(tables)
+
+
+def romfs_section(files: dict[str, bytes]) -> Section:
+    """Build a RomFS section with IVFC (HierarchicalIntegrity) hash levels, e.g., for the RomFS or Control."""
+    block_size = 1 << IVFC_BLOCK_SIZE_LOG2
+    levels = [build_romfs(files)]
+    for _ in range(IVFC_LEVELS - 1):
+        level = levels[0]
+        levels.insert(
+            0,
+            b"".join(
+                hashlib.sha256(level[i : i + block_size].ljust(block_size, b"\x00")).digest()
+                for i in range(0, len(level), block_size)
+            ),
+        )
+
+    data = bytearray()
+    level_headers = b""
+    for level in levels:
+        offset = _align(len(data), block_size)
+        data = data.ljust(offset, b"\x00") + level
+        level_headers += IVFC_LEVEL.pack(offset, len(level), IVFC_BLOCK_SIZE_LOG2)
+
+    return Section(
+        fs_type=FsType.ROMFS,
+        hash_type=HashType.HIERARCHICAL_INTEGRITY,
+        hash_data=(
+            IVFC_HEADER.pack(b"IVFC", 0x20000, 0x20, IVFC_LEVELS + 1)
+            + level_headers
+            + b"\x00" * 0x20  # signature salt
+            # the master hash is of level 1 as a padded block, the same as every other level
+            + hashlib.sha256(levels[0].ljust(block_size, b"\x00")).digest()
+        ),
+        data=bytes(data),
+    )
+
+
+def patch_npdm(npdm: bytes, title_id: int) -> bytes:
+    """Set the Program ID of the ACI0 and the Program ID range of the ACID in an NPDM."""
+    data = bytearray(npdm)
+    aci0_offset = struct.unpack_from("<I", data, NPDM_ACI0_OFFSET)[0]
+    acid_offset = struct.unpack_from("<I", data, NPDM_ACID_OFFSET)[0]
+    if data[aci0_offset : aci0_offset + 4] != b"ACI0" or data[acid_offset + 0x200 : acid_offset + 0x204] != b"ACID":
+        raise ValueError("The NPDM does not have a valid ACI0 and ACID.")
+    struct.pack_into("<Q", data, aci0_offset + 0x10, title_id)
+    struct.pack_into("<QQ", data, acid_offset + 0x210, title_id, title_id)
+    return bytes(data)
+
+
+def build_cnmt(title_id: int, contents: Sequence[tuple[CnmtContentType, Nca]], version: int = 0) -> bytes:
+    """Build the Content Meta of an Application, listing the hash, ID, and size of its NCAs."""
+    records = b"".join(
+        CNMT_CONTENT_RECORD.pack(nca.hash, bytes.fromhex(nca.content_id), len(nca.data).to_bytes(6, "little"), type_, 0)
+        for type_, nca in contents
+    )
+    return (
+        CNMT_HEADER.pack(title_id, version, CNMT_APPLICATION, 0, CNMT_APPLICATION_HEADER.size, len(contents), 0, 0, 0)
+        + CNMT_APPLICATION_HEADER.pack(title_id + 0x800, 0, 0)
+        + records
+        + b"\x00" * 0x20  # digest
+    )
+
+
+def build_nca(
+    content_type: ContentType,
+    title_id: int,
+    sections: Sequence[Section],
+    header_key: bytes,
+    key_area_key: bytes,
+    key_generation: int = 1,
+    key: Optional[bytes] = None,
+) -> Nca:
+    """
+    Build and encrypt an NCA of up to four sections.
+
+    The header is AES-XTS encrypted with the header key, and the sections with AES-CTR
+    using a key stored in the key area, encrypted with the key area key. The key
+    defaults to a hash of the sections so that builds are reproducible.
+
+    The NCA is not signed, i.e., both header signatures are left blank.
+    """
+    if len(sections) > 4:
+        raise ValueError(f"An NCA can have at most 4 sections, not {len(sections)}.")
+    if key is None:
+        key = hashlib.sha256(b"".join(hashlib.sha256(section.data).digest() for section in sections)).digest()[:16]
+
+    body = bytearray()
+    fs_entries = b""
+    fs_headers = b""
+    fs_header_hashes = b""
+    for i, section in enumerate(sections):
+        offset = HEADER_SIZE + len(body)
+        data = _pad(section.data, MEDIA_SIZE)
+        generation, secure_value = 0, i
+        if section.encrypted:
+            counter = struct.pack(">IIQ", secure_value, generation, offset >> 4)
+            encryptor = Cipher(algorithms.AES(key), modes.CTR(counter)).encryptor()
+            data = encryptor.update(data) + encryptor.finalize()
+        body += data
+        fs_entries += FS_ENTRY.pack(offset // MEDIA_SIZE, (offset + len(data)) // MEDIA_SIZE)
+        fs_header = FS_HEADER.pack(
+            2,
+            section.fs_type,
+            section.hash_type,
+            EncryptionType.AES_CTR if section.encrypted else EncryptionType.NONE,
+            section.hash_data,
+            generation,
+            secure_value,
+        )
+        fs_headers += fs_header
+        fs_header_hashes += hashlib.sha256(fs_header).digest()
+
+    key_area_encryptor = Cipher(algorithms.AES(key_area_key), modes.ECB()).encryptor()
+    key_area = key_area_encryptor.update(b"\x00" * 0x20 + key + b"\x00" * 0x10) + key_area_encryptor.finalize()
+
+    header = NCA_HEADER.pack(
+        b"\x00" * 0x100,
+        b"\x00" * 0x100,
+        b"NCA3",
+        0,  # distribution type, download
+        content_type,
+        key_generation if key_generation <= 2 else 2,
+        0,  # key area key index, application
+        HEADER_SIZE + len(body),
+        title_id,
+        0,  # content index
+        SDK_VERSION,
+        key_generation if key_generation > 2 else 0,
+        0,  # signature key generation
+        b"\x00" * 0x10,  # rights id, none as it uses standard crypto
+        fs_entries.ljust(4 * FS_ENTRY.size, b"\x00"),
+        fs_header_hashes.ljust(4 * 0x20, b"\x00"),
+        key_area,
+    )
+    header += fs_headers.ljust(4 * FS_HEADER.size, b"\x00")
+
+    encrypted_header = b""
+    for sector in range(HEADER_SIZE // MEDIA_SIZE):
+        encryptor = Cipher(algorithms.AES(header_key), modes.XTS(sector.to_bytes(16, "big"))).encryptor()
+        encrypted_header += encryptor.update(header[sector * MEDIA_SIZE : (sector + 1) * MEDIA_SIZE])
+        encrypted_header += encryptor.finalize()
+
+    return Nca(content_type, encrypted_header + bytes(body))
+
+
+def build_meta_nca(
+    title_id: int,
+    contents: Sequence[tuple[CnmtContentType, Nca]],
+    header_key: bytes,
+    key_area_key: bytes,
+    key_generation: int = 1,
+) -> Nca:
+    """Build the Meta NCA of an Application, a PFS0 section with its Content Meta (CNMT)."""
+    cnmt = build_cnmt(title_id, contents)
+    return build_nca(
+        ContentType.META,
+        title_id,
+        [pfs0_section({f"Application_{title_id:016x}.cnmt": cnmt})],
+        header_key,
+        key_area_key,
+        key_generation,
+    )
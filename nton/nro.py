@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import functools
+import mmap
+import struct
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+from nton.toolchain import toolchain
+
+if TYPE_CHECKING:
+    from nton import nstool
+
+# https://switchbrew.org/wiki/NRO
+NRO_START = struct.Struct("<II8x")  # unused (branch), MOD0 offset, padding
+NRO_HEADER = struct.Struct("<4sIII6II4x32sI4x6I")  # from 0x10, see `Nro.__init__`
+ASSET_HEADER = struct.Struct("<4sI6Q")  # magic, version, icon/nacp/romfs (offset, size) pairs
+MOD0_HEADER = struct.Struct("<4s6i")  # magic, dynamic/bss start/bss end/eh_frame_hdr start/end/module object offsets
+NACP_SIZE = 0x4000
+
+
+class NroError(ValueError):
+    """The NRO is invalid or could not be parsed."""
+
+
+@dataclass(frozen=True)
+class Segment:
+    offset: int
+    size: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+@dataclass(frozen=True)
+class Mod0:
+    offset: int
+    dynamic_offset: int
+    bss_start_offset: int
+    bss_end_offset: int
+    eh_frame_hdr_start_offset: int
+    eh_frame_hdr_end_offset: int
+    module_object_offset: int
+
+
+@dataclass(frozen=True)
+class NroAssets:
+    """The NACP and Icon of an NRO, None if the NRO does not have one."""
+
+    nacp: Optional[bytes]
+    icon: Optional[bytes]
+
+
+class Nro:
+    """
+    Homebrew NRO executable with an optional Homebrew Asset Blob (ASET).
+
+    Only the unencrypted header, MOD0, and ASET section are parsed, which is all that's
+    needed to verify the NRO and get its NACP, Icon, and RomFS. Data is read directly
+    from the buffer, so opening an NRO from a path memory-maps it instead of reading
+    the whole file.
+    """
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> None:
+        self._data = data
+        self._mm = data if isinstance(data, mmap.mmap) else None
+
+        if len(data) < NRO_START.size + NRO_HEADER.size:
+            raise NroError("The file is too small to be an NRO.")
+
+        _, self.mod0_offset = NRO_START.unpack_from(data, 0)
+        (
+            magic,
+            self.version,
+            self.size,
+            self.flags,
+            text_offset,
+            text_size,
+            ro_offset,
+            ro_size,
+            data_offset,
+            data_size,
+            self.bss_size,
+            self.build_id,
+            self.dso_handle_offset,
+            *_,  # api info, dynstr, and dynsym segments
+        ) = NRO_HEADER.unpack_from(data, NRO_START.size)
+
+        if magic != b"NRO0":
+            raise NroError(f"Invalid NRO header magic, {magic!r}.")
+        if self.size > len(data):
+            raise NroError(f"The NRO is truncated, expected at least {self.size} bytes but got {len(data)}.")
+
+        self.text = Segment(text_offset, text_size)
+        self.ro = Segment(ro_offset, ro_size)
+        self.data = Segment(data_offset, data_size)
+        for name, segment in (("text", self.text), ("ro", self.ro), ("data", self.data)):
+            if segment.end > self.size:
+                raise NroError(f"The {name} segment ends outside of the NRO.")
+
+        self.mod0 = self._parse_mod0()
+        self._assets = self._parse_assets()
+
+    @classmethod
+    def open(cls, path: Path) -> Nro:
+        """Open an NRO by memory-mapping it. Use as a context manager to close it."""
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # e.g., empty file
+                raise NroError(f"The file could not be mapped, {e}")
+        try:
+            return cls(mm)
+        except NroError:
+            mm.close()
+            raise
+
+    def __enter__(self) -> Nro:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+
+    def _parse_mod0(self) -> Optional[Mod0]:
+        if not self.mod0_offset:
+            return None
+        if self.mod0_offset + MOD0_HEADER.size > self.size:
+            raise NroError("The MOD0 header is outside of the NRO.")
+        magic, *offsets = MOD0_HEADER.unpack_from(self._data, self.mod0_offset)
+        if magic != b"MOD0":
+            raise NroError(f"Invalid MOD0 header magic, {magic!r}.")
+        return Mod0(self.mod0_offset, *offsets)
+
+    def _parse_assets(self) -> dict[str, Segment]:
+        if len(self._data) < self.size + ASSET_HEADER.size:
+            return {}
+        magic, self.asset_version, *sections = ASSET_HEADER.unpack_from(self._data, self.size)
+        if magic != b"ASET":
+            raise NroError(f"Invalid Homebrew Asset Blob magic, {magic!r}.")
+        assets = {}
+        for i, name in enumerate(("icon", "nacp", "romfs")):
+            offset, size = sections[i * 2 : i * 2 + 2]
+            segment = Segment(self.size + offset, size)
+            if segment.end > len(self._data):
+                raise NroError(f"The {name} asset ends outside of the file.")
+            if size:
+                assets[name] = segment
+        return assets
+
+    def _asset(self, name: str) -> Optional[bytes]:
+        segment = self._assets.get(name)
+        if not segment:
+            return None
+        return bytes(self._data[segment.offset : segment.end])
+
+    @property
+    def icon(self) -> Optional[bytes]:
+        """The Icon, typically a 256x256 JPEG."""
+        return self._asset("icon")
+
+    @property
+    def nacp(self) -> Optional[bytes]:
+        """The Control Partition (NACP)."""
+        return self._asset("nacp")
+
+    @property
+    def romfs(self) -> Optional[bytes]:
+        return self._asset("romfs")
+
+
+def verify(path: Path) -> None:
+    """
+    Verify if the NRO is valid, raising an NroError if not.
+
+    If the NRO cannot be parsed natively, nstool is used as a fallback and its
+    verdict is final.
+    """
+    try:
+        with Nro.open(path):
+            return
+    except NroError as e:
+        if not toolchain.path("nstool"):
+            raise
+        error = e
+
+    session = _nstool_session(path)
+    if not session.ok:
+        raise NroError(session.error) from error
+
+
+def get_assets(path: Path) -> NroAssets:
+    """
+    Get the NACP and Icon of an NRO in memory.
+
+    If the NRO cannot be parsed natively, nstool is used as a fallback.
+    """
+    try:
+        with Nro.open(path) as nro:
+            nacp = nro.nacp
+            if nacp is not None and len(nacp) != NACP_SIZE:
+                raise NroError(f"An invalid NACP of {len(nacp)} bytes was found in the asset.")
+            return NroAssets(nacp=nacp, icon=nro.icon)
+    except NroError as e:
+        if not toolchain.path("nstool"):
+            raise
+        error = e
+
+    session = _nstool_session(path)
+    if not session.ok:
+        raise NroError(session.error) from error
+    if session.nacp is not None and len(session.nacp) != NACP_SIZE:
+        raise NroError(f"An invalid NACP of {len(session.nacp)} bytes was extracted from the asset.") from error
+    if session.icon is not None and len(session.icon) <= 2:
+        raise NroError("An empty Icon was extracted from the asset.") from error
+
+    return NroAssets(nacp=session.nacp, icon=session.icon)
+
+
+def _nstool_session(path: Path) -> nstool.Session:
+    """
+    Verify an NRO and extract its NACP and Icon with nstool, once.
+
+    The session is re-used by `verify` and `get_assets` for as long as the NRO is
+    unchanged, so a build that needs the fallback only runs nstool once.
+    """
+    stat = path.stat()
+    try:
+        return _nstool_session_cached(path.resolve(), stat.st_size, stat.st_mtime_ns)
+    except subprocess.TimeoutExpired as e:
+        raise NroError(f"nstool did not finish within {e.timeout:.0f}s.")
+
+
+@functools.lru_cache(maxsize=8)
+def _nstool_session_cached(path: Path, size: int, mtime_ns: int) -> nstool.Session:
+    from nton import nstool
+
+    return nstool.run(path, "nro", verify=True, nacp=True, icon=True)
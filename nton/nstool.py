@@ -1,99 +1,88 @@
 from __future__ import annotations
 
-import subprocess
+import tempfile
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
-from nton.constants import Binaries, Files
+from nton import tools
+from nton.constants import Files
+from nton.toolchain import toolchain
 
-BIN = Binaries.nstool
 FILE_TYPES = ("xci", "pfs", "romfs", "nca", "meta", "cnmt", "nso", "nro", "ini", "kip", "nacp", "aset", "cert", "tik")
-SUBPROCESS_STARTUP_INFO = subprocess.STARTUPINFO()
-SUBPROCESS_STARTUP_INFO.dwFlags |= subprocess.STARTF_USESHOWWINDOW
 
 
-def verify(path: Path, type_: str) -> str | int | None:
+@dataclass(frozen=True)
+class Session:
     """
-    Verify if the Nintendo Switch file is valid.
-    Returns an empty string if valid, an error str or return code otherwise.
+    The results of a single nstool invocation on a file.
+
+    The NACP and Icon are None if they were not requested or if the file does not have one.
     """
-    if not BIN or not Path(BIN).is_file():
-        raise EnvironmentError("nstool binary was not found. Please ensure nstool is installed and in your PATH.")
 
-    if not path:
-        raise ValueError("The path must not be empty.")
-    if not isinstance(path, Path):
-        raise TypeError("The path variable is not a Path object.")
-    if not path.is_file():
-        raise FileNotFoundError("The path was not found or is not a file.")
+    returncode: int
+    output: str
+    nacp: Optional[bytes] = None
+    icon: Optional[bytes] = None
 
-    if not type_:
-        raise ValueError("The type must not be empty.")
-    if not isinstance(type_, str):
-        raise TypeError("The type_ variable is not a str object.")
-    type_ = type_.lower()
-    if type_ not in FILE_TYPES:
-        raise ValueError(f'The type_ "{type_}" is not a valid type. File types: {", ".join(FILE_TYPES)}')
+    @property
+    def ok(self) -> bool:
+        """Whether nstool succeeded, and if verifying, that the file is valid."""
+        return self.returncode == 0
 
-    try:
-        subprocess.check_output(
-            [BIN, "-k", str(Files.keys.absolute()), "-t", type_, "--verify", str(path.absolute())],
-            stderr=subprocess.PIPE,
-            startupinfo=SUBPROCESS_STARTUP_INFO,
-        )
-        return None
-    except subprocess.CalledProcessError as e:
-        return e.output.decode("utf8").strip() or e.returncode
+    @property
+    def error(self) -> Optional[str]:
+        if self.ok:
+            return None
+        return self.output or f"nstool failed with return code {self.returncode}."
 
 
-def get_nacp(asset_path: Path, output_path: Path) -> str | int | None:
+def run(path: Path, type_: str, verify: bool = True, nacp: bool = False, icon: bool = False) -> Session:
     """
-    Extract the NACP partition from a Homebrew Asset Blob.
+    Verify a Nintendo Switch file and extract its NACP and Icon with one nstool invocation.
 
     Parameters:
-        asset_path: Homebrew Asset Blob to get the NACP from. E.g., an NRO.
-        output_path: Path to save the NACP to.
-
-    Returns an empty string if valid, an error str or return code otherwise.
+        path: Nintendo Switch file to process. The NACP and Icon can only be extracted from
+            a Homebrew Asset Blob, e.g., an NRO.
+        type_: File type of the file, see `FILE_TYPES`.
+        verify: Verify the file is valid.
+        nacp: Extract the NACP partition.
+        icon: Extract the Icon partition.
+
+    The extracted partitions are read into memory, nothing is left on disk.
+    Raises a TimeoutExpired if nstool hangs, see `tools.ToolRunner`.
     """
-    if not BIN or not Path(BIN).is_file():
+    binary = toolchain.path("nstool")
+    if not binary:
         raise EnvironmentError("nstool binary was not found. Please ensure nstool is installed and in your PATH.")
 
-    try:
-        subprocess.check_output(
-            [BIN, "-k", str(Files.keys.absolute()), "--nacp", str(output_path.absolute()), str(asset_path.absolute())],
-            startupinfo=SUBPROCESS_STARTUP_INFO,
-        )
-        if not output_path.is_file():
-            return "No NACP was extracted from the asset."
-        if output_path.stat().st_size <= 2:
-            return "An empty NACP was extracted from the asset."
-        return None
-    except subprocess.CalledProcessError as e:
-        return e.output.decode("utf8").strip() or e.returncode
-
-
-def get_icon(asset_path: Path, output_path: Path) -> str | int | None:
-    """
-    Extract the Icon partition from a Homebrew Asset Blob.
-
-    Parameters:
-        asset_path: Homebrew Asset Blob to get the Icon from. E.g., an NRO.
-        output_path: Path to save the Icon to.
+    if not isinstance(path, Path):
+        raise TypeError("The path variable is not a Path object.")
+    if not path.is_file():
+        raise FileNotFoundError("The path was not found or is not a file.")
 
-    Returns an empty string if valid, an error str or return code otherwise.
-    """
-    if not BIN or not Path(BIN).is_file():
-        raise EnvironmentError("nstool binary was not found. Please ensure nstool is installed and in your PATH.")
+    type_ = type_.lower()
+    if type_ not in FILE_TYPES:
+        raise ValueError(f'The type_ "{type_}" is not a valid type. File types: {", ".join(FILE_TYPES)}')
 
-    try:
-        subprocess.check_output(
-            [BIN, "-k", str(Files.keys.absolute()), "--icon", str(output_path.absolute()), str(asset_path.absolute())],
-            startupinfo=SUBPROCESS_STARTUP_INFO,
+    with tempfile.TemporaryDirectory(prefix="rlaphoenix-nton") as t:
+        nacp_file = Path(t) / "control.nacp"
+        icon_file = Path(t) / "icon_AmericanEnglish.dat"
+
+        args = [binary, "-k", str(Files.keys.absolute()), "-t", type_]
+        if verify:
+            args.append("--verify")
+        if nacp:
+            args += ["--nacp", str(nacp_file)]
+        if icon:
+            args += ["--icon", str(icon_file)]
+        args.append(str(path.absolute()))
+
+        res = tools.get_runner().run_sync("nstool", args, check=False)
+
+        return Session(
+            returncode=res.returncode,
+            output=(res.stdout + res.stderr).decode("utf8", errors="replace").strip(),
+            nacp=nacp_file.read_bytes() if nacp_file.is_file() else None,
+            icon=icon_file.read_bytes() if icon_file.is_file() else None,
         )
-        if not output_path.is_file():
-            return "No Icon was extracted from the asset."
-        if output_path.stat().st_size <= 2:
-            return "An empty Icon was extracted from the asset."
-        return None
-    except subprocess.CalledProcessError as e:
-        return e.output.decode("utf8").strip() or e.returncode
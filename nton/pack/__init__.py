@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import importlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from nton.toolchain import toolchain
+
+if TYPE_CHECKING:
+    from nton.forwarder import Forwarder
+
+# every packer is a module of this package with a pack() function, only imported when used
+PACKERS = ("hacbrewpack", "native")
+
+
+def default_packer() -> str:
+    """Get hacBrewPack if it's available as it's the reference implementation, otherwise the native packer."""
+    return "hacbrewpack" if toolchain.path("hacbrewpack") else "native"
+
+
+def pack(forwarder: Forwarder, output_path: Path, keys: Path, packer: Optional[str] = None) -> None:
+    """
+    Pack a forwarder to an NSP with the chosen packer, see `default_packer`.
+
+    hacBrewPack is the reference implementation, while the native packer writes the
+    NSP container in-process.
+    """
+    packer = packer or default_packer()
+    if packer not in PACKERS:
+        raise ValueError(f'The packer "{packer}" is not supported. Packers: {", ".join(PACKERS)}')
+    importlib.import_module(f"{__name__}.{packer}").pack(forwarder, output_path, keys)
+
+
+__all__ = ("PACKERS", "default_packer", "pack")
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+from pathlib import Path
+
+from nton import tools
+from nton.constants import Directories
+from nton.forwarder import Forwarder
+from nton.toolchain import toolchain
+
+
+def _run(forwarder: Forwarder, keys: Path, work_dir: Path, *args: str) -> Path:
+    """Stage the forwarder and run hacBrewPack on it, returning the NSP directory."""
+    binary = toolchain.path("hacbrewpack")
+    if not binary:
+        raise EnvironmentError("hacBrewPack binary was not found. Please ensure it is installed and in your PATH.")
+
+    build_dir = work_dir / "build"
+    nsp_dir = work_dir / "nsp"
+    forwarder.stage(build_dir)
+    tools.get_runner().run_sync(
+        "hacbrewpack",
+        [
+            binary,
+            "--titleid",
+            forwarder.title_id,
+            "--nspdir",
+            str(nsp_dir.absolute()),
+            "--backupdir",
+            str((work_dir / "backup").absolute()),
+            "-k",
+            str(keys.absolute()),
+            *args,
+        ],
+        cwd=build_dir,
+    )
+    return nsp_dir
+
+
+def build_ncas(forwarder: Forwarder, keys: Path) -> dict[str, bytes]:
+    """
+    Build the NCAs of a forwarder with hacBrewPack, by NCA filename.
+
+    hacBrewPack only works with files, so the forwarder is staged to a temporary
+    directory, which is unique per build so that builds may run concurrently.
+    Raises a CalledProcessError if hacBrewPack fails, or a TimeoutExpired if it hangs.
+    """
+    Directories.temp.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f"{forwarder.title_id}-", dir=Directories.temp) as t:
+        nca_dir = Path(t) / "nca"
+        _run(forwarder, keys, Path(t), "--ncadir", str(nca_dir.absolute()), "--keepncadir")
+        return {nca.name: nca.read_bytes() for nca in sorted(nca_dir.glob("*.nca"))}
+
+
+def pack(forwarder: Forwarder, output_path: Path, keys: Path) -> None:
+    """
+    Pack a forwarder to an NSP with hacBrewPack.
+
+    hacBrewPack only works with files, so the forwarder is staged to a temporary
+    directory, which is unique per build so that builds may run concurrently.
+    Raises a CalledProcessError if hacBrewPack fails, or a TimeoutExpired if it hangs.
+    """
+    Directories.temp.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f"{forwarder.title_id}-", dir=Directories.temp) as t:
+        nsp_dir = _run(forwarder, keys, Path(t))
+        if output_path.exists():
+            output_path.unlink()
+        shutil.move(nsp_dir / f"{forwarder.title_id}.nsp", output_path)
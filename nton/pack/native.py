@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from nton import nca
+from nton.forwarder import Forwarder
+from nton.helpers import atomic_path
+from nton.keys import load_keys
+from nton.pack import pfs0
+
+KEY_GENERATION = 1
+
+
+def build_ncas(forwarder: Forwarder, keys: Path) -> dict[str, bytes]:
+    """
+    Build the Program, Control, and Meta NCAs of a forwarder in memory, by NCA filename.
+
+    Raises a KeysError if the keys needed to encrypt the NCAs are missing.
+    """
+    key_set = load_keys(keys)
+    header_key = key_set.header_key
+    key_area_key = key_set.key_area_key(KEY_GENERATION)
+
+    title_id = int(forwarder.title_id, 16)
+    partitions: dict[str, dict[str, bytes]] = {}
+    for name, data in forwarder.files.items():
+        partition, _, file_name = name.partition("/")
+        partitions.setdefault(partition, {})[file_name] = data
+    partitions["exefs"]["main.npdm"] = nca.patch_npdm(partitions["exefs"]["main.npdm"], title_id)
+
+    program = nca.build_nca(
+        nca.ContentType.PROGRAM,
+        title_id,
+        [
+            nca.pfs0_section(partitions["exefs"]),
+            nca.romfs_section(partitions["romfs"]),
+            nca.pfs0_section(partitions["logo"], encrypted=False),
+        ],
+        header_key,
+        key_area_key,
+        KEY_GENERATION,
+    )
+    control = nca.build_nca(
+        nca.ContentType.CONTROL,
+        title_id,
+        [nca.romfs_section(partitions["control"])],
+        header_key,
+        key_area_key,
+        KEY_GENERATION,
+    )
+    meta = nca.build_meta_nca(
+        title_id,
+        [(nca.CnmtContentType.PROGRAM, program), (nca.CnmtContentType.CONTROL, control)],
+        header_key,
+        key_area_key,
+        KEY_GENERATION,
+    )
+
+    return {x.filename: x.data for x in (program, control, meta)}
+
+
+def pack(forwarder: Forwarder, output_path: Path, keys: Path) -> None:
+    """
+    Pack a forwarder to an NSP natively, without hacBrewPack.
+
+    The NCAs are built in memory and the NSP is streamed to the output path in a single
+    pass, with the NCAs in filename order like hacBrewPack.
+    """
+    ncas = build_ncas(forwarder, keys)
+    with atomic_path(output_path) as tmp, open(tmp, "wb") as f:
+        pfs0.write_pfs0(sorted(ncas.items()), f)
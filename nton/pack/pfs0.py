@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import struct
+from typing import BinaryIO, Sequence, Union
+
+HEADER = struct.Struct("<4sIII")  # magic, file count, string table size, reserved
+FILE_ENTRY = struct.Struct("<QQII")  # data offset, data size, name offset, reserved
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def build_header(files: Sequence[tuple[str, int]]) -> bytes:
+    """
+    Build a PFS0 header, i.e., the header, file entries, and string table.
+
+    The string table is padded so that the file data begins 0x20-aligned, the same
+    way hacBrewPack (hacPack) pads it, so that both produce identical containers. A
+    header that is already aligned is not padded.
+    """
+    string_table = bytearray()
+    entries = bytearray()
+    offset = 0
+    for name, size in files:
+        entries += FILE_ENTRY.pack(offset, size, len(string_table), 0)
+        string_table += name.encode("utf8") + b"\x00"
+        offset += size
+
+    header_size = HEADER.size + len(entries) + len(string_table)
+    string_table += b"\x00" * (-header_size % 0x20)
+
+    return HEADER.pack(b"PFS0", len(files), len(string_table), 0) + entries + string_table
+
+
+def write_pfs0(files: Sequence[tuple[str, Buffer]], out: BinaryIO) -> int:
+    """
+    Write a PFS0 container of in-memory files to a stream in a single pass.
+
+    Returns the amount of bytes written.
+    """
+    header = build_header([(name, len(data)) for name, data in files])
+    written = out.write(header)
+    for _, data in files:
+        written += out.write(data)
+    return written
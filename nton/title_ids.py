@@ -1,12 +1,28 @@
 # Source: https://switchbrew.org/wiki/Title_list
 # Last updated: 2022-11-12 08:00 UTC+0
 # When updating make sure all title IDs are lowercase hex, 16 digits in length (a-z0-9{16}).
-import time
+from __future__ import annotations
 
-import jsonpickle
-import requests
+import codecs
+import csv
+import functools
+import hashlib
+import json
+import os
+import string
+import struct
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Mapping, Optional, Sequence, Union
 
 from nton.constants import Files
+from nton.helpers import atomic_path
+
+if TYPE_CHECKING:
+    import requests
 
 system_modules = (
     # https://switchbrew.org/wiki/Title_list#System_Modules
@@ -432,10 +448,151 @@ unofficial = {
 }
 
 
-def get_game_title_ids() -> dict:
+TINFOIL_API_URL = "https://tinfoil.media/Title/ApiJson/"
+
+
+@dataclass
+class RegistryMetadata:
+    """Fetch metadata of one source of a Game Title ID registry, stored next to the registry."""
+
+    source: str
+    fetched_at: str  # ISO-8601 UTC timestamp of the last fetch or revalidation
+    count: int
+    sha256: str  # hash of the last source body that was fetched
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @staticmethod
+    def path_for(registry_path: Path) -> Path:
+        return registry_path.with_name(f"{registry_path.stem}.meta.json")
+
+    @classmethod
+    def load(cls, registry_path: Path) -> dict[str, RegistryMetadata]:
+        """Load the metadata of every source of a registry, by source."""
+        path = cls.path_for(registry_path)
+        if not path.is_file():
+            return {}
+        try:
+            return {metadata.source: metadata for metadata in (cls(**x) for x in json.loads(path.read_text("utf8")))}
+        except (ValueError, TypeError):
+            return {}
+
+    @classmethod
+    def save(cls, registry_path: Path, metadata: Iterable[RegistryMetadata]) -> None:
+        """Save the metadata of every source of a registry."""
+        with atomic_path(cls.path_for(registry_path)) as tmp:
+            tmp.write_text(json.dumps([asdict(x) for x in metadata], indent=2), encoding="utf8")
+
+
+def get_last_updated(path: Path) -> float:
+    """
+    Get when a registry was last updated or revalidated, as a POSIX timestamp.
+
+    The registry is only rewritten if an entry was added or changed, so this is the
+    latest fetch recorded in its metadata, or the registry's modification time if later.
+    """
+    updated = [path.stat().st_mtime]
+    for metadata in RegistryMetadata.load(path).values():
+        try:
+            updated.append(datetime.fromisoformat(metadata.fetched_at).timestamp())
+        except ValueError:
+            pass
+    return max(updated)
+
+
+@dataclass
+class RegistryUpdate:
+    """Result of updating a Game Title ID registry."""
+
+    modified: bool
+    added: int
+    changed: int
+    count: int
+    metadata: list[RegistryMetadata]
+    errors: dict[str, str]  # source -> error, for sources that failed
+
+
+@functools.lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """Get a persistent HTTP Session, so connections are reused between requests."""
+    import requests
+
+    session = requests.Session()
+    session.headers.update(
+        {
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
+        }
+    )
+    return session
+
+
+def _hashed(chunks: Iterable[bytes], hash_: Any) -> Iterator[bytes]:
+    """Pass through byte chunks while updating a hash with them."""
+    for chunk in chunks:
+        hash_.update(chunk)
+        yield chunk
+
+
+def fetch_json_titles(
+    url: str,
+    session: Optional[requests.Session] = None,
+    previous: Optional[RegistryMetadata] = None,
+    params: Optional[dict[str, str]] = None,
+    headers: Optional[dict[str, str]] = None,
+) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
+    """
+    Get a mapping of Game Title IDs -> Game Names from a JSON document over HTTP.
+
+    The document may be in Tinfoil's API format or a JSON registry export, see
+    `iter_json_titles`. If metadata of a previous fetch from the same URL is given,
+    the request is made conditional, and None is returned in place of the mapping
+    if the source has not been modified since.
+    """
+    session = session or get_session()
+
+    headers = dict(headers or {})
+    if previous and previous.source == url:
+        if previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+
+    with session.get(url=url, params=params, headers=headers, stream=True) as res:
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        if res.status_code == 304 and previous:
+            return None, replace(previous, fetched_at=fetched_at)
+
+        if not res.ok:
+            import requests
+
+            raise requests.ConnectionError(f"Failed to get a list of Game Title IDs from {url}, [{res.status_code}]")
+
+        source_hash = hashlib.sha256()
+        chunks = _hashed(res.iter_content(chunk_size=0x10000), source_hash)
+        title_ids = normalize_game_title_ids(iter_json_titles(chunks))
+        for _ in chunks:
+            pass  # hash anything after the data array
+
+        return title_ids, RegistryMetadata(
+            source=url,
+            fetched_at=fetched_at,
+            count=len(title_ids),
+            sha256=source_hash.hexdigest(),
+            etag=res.headers.get("ETag"),
+            last_modified=res.headers.get("Last-Modified"),
+        )
+
+
+def get_game_title_ids(
+    session: Optional[requests.Session] = None, previous: Optional[RegistryMetadata] = None
+) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
     """Get a mapping of Game Title IDs -> Game Names from Tinfoil's API."""
-    res = requests.get(
-        url="https://tinfoil.media/Title/ApiJson/",
+    return fetch_json_titles(
+        url=TINFOIL_API_URL,
+        session=session,
+        previous=previous,
         params={
             # is this actually returning a full list?
             "rating_content": "",
@@ -444,32 +601,482 @@ def get_game_title_ids() -> dict:
             "region": "ar,at,au,be,bg,br,ca,ch,cl,cn,co,cy,cz,de,dk,ee,es,fi,fr,gb,gr,hk,hr,hu,"
             "ie,it,jp,kr,lt,lu,lv,mt,mx,nl,no,nz,pe,pl,pt,ro,ru,se,si,sk,us,xx,za,zh",
             "rating": "",
-            "_": str(time.time_ns() // 1000000),
         },
         headers={
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
             "Origin": "https://tinfoil.io",
             "Referer": "https://tinfoil.io/",
         },
     )
 
-    if not res.ok:
-        raise requests.ConnectionError(
-            f"Failed to get a list of Game Title IDs from Tinfoil's API, [{res.status_code}]"
+
+class _JsonStream:
+    """Incrementally decoded JSON text, read from an iterable of UTF-8 byte chunks as needed."""
+
+    WHITESPACE = " \t\r\n"
+    NUMBER = "0123456789+-.eE"
+    DECODER = json.JSONDecoder()
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read(self) -> bool:
+        """Read the next chunk into the buffer, dropping what was already consumed."""
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self._text.decode(b"", final=True)
+        else:
+            text = self._text.decode(chunk)
+        self.buffer = self.buffer[self.pos :] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and get the next character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read():
+                raise ValueError("Unexpected end of the JSON stream.")
+
+    def skip(self, char: str) -> bool:
+        """Consume the next character if it is `char`."""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char: str) -> None:
+        if not self.skip(char):
+            raise ValueError(f"Expected '{char}' in the JSON stream but got '{self.peek()}'.")
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.DECODER.raw_decode(self.buffer, self.pos)
+                # a number ending at the buffer's end or before a number character may be truncated, e.g., `-12.`
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in self.NUMBER):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.read():
+                raise ValueError("Unexpected end of the JSON stream.")
+
+
+def iter_json_titles(chunks: Iterable[bytes]) -> Iterator[tuple[str, str]]:
+    """
+    Incrementally parse a JSON document of titles, yielding (Title ID, Name) pairs.
+
+    Supports Tinfoil's API format, i.e., a `data` array of objects with an `id` and
+    `name`, as well as a JSON registry export, i.e., an object of Title ID -> Name.
+    Malformed titles, e.g., without an `id` or `name` string, are skipped.
+
+    Only one title is decoded at a time, so memory use stays flat no matter how large
+    the document is. A canned document can be parsed by passing it in chunks, e.g.,
+    `iter(lambda: f.read(0x10000), b"")`.
+    """
+    stream = _JsonStream(chunks)
+    stream.expect("{")
+    while not stream.skip("}"):
+        key = stream.value()
+        stream.expect(":")
+        if key == "data" and stream.peek() == "[":
+            stream.expect("[")
+            while not stream.skip("]"):
+                title = stream.value()
+                if isinstance(title, dict) and isinstance(title.get("id"), str) and isinstance(title.get("name"), str):
+                    yield title["id"], title["name"]
+                stream.skip(",")
+        else:
+            value = stream.value()
+            if isinstance(value, str):
+                yield key, value
+        stream.skip(",")
+
+
+def iter_csv_titles(lines: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Parse CSV lines of Title ID and Name columns, yielding (Title ID, Name) pairs."""
+    for row in csv.reader(lines):
+        if len(row) >= 2:
+            yield row[0].strip(), row[1]
+
+
+class TitleIdProvider(ABC):
+    """
+    A source of Game Title IDs -> Game Names for the registry.
+
+    When multiple providers have a name for the same Title ID, the name from the
+    provider with the highest priority is used.
+    """
+
+    def __init__(self, source: str, priority: int = 0) -> None:
+        self.source = source
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.source!r}, priority={self.priority})"
+
+    @abstractmethod
+    def fetch(
+        self, session: requests.Session, previous: Optional[RegistryMetadata] = None
+    ) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
+        """
+        Get a mapping of Game Title IDs -> Game Names from the source.
+
+        None is returned in place of the mapping if the source has not been modified
+        since the previous fetch.
+        """
+
+
+class TinfoilProvider(TitleIdProvider):
+    """Game Title IDs from Tinfoil's API."""
+
+    def __init__(self, priority: int = 0) -> None:
+        super().__init__(TINFOIL_API_URL, priority)
+
+    def fetch(
+        self, session: requests.Session, previous: Optional[RegistryMetadata] = None
+    ) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
+        return get_game_title_ids(session, previous)
+
+
+class HttpMirrorProvider(TitleIdProvider):
+    """Game Title IDs from a JSON document on a plain HTTP server, e.g., a mirror of Tinfoil's API."""
+
+    def fetch(
+        self, session: requests.Session, previous: Optional[RegistryMetadata] = None
+    ) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
+        return fetch_json_titles(self.source, session, previous)
+
+
+class LocalMirrorProvider(TitleIdProvider):
+    """Game Title IDs from a local directory of JSON and CSV files, or a single such file."""
+
+    def __init__(self, path: Path, priority: int = 0) -> None:
+        super().__init__(path.resolve().as_uri(), priority)
+        self.path = path
+
+    def fetch(
+        self, session: requests.Session, previous: Optional[RegistryMetadata] = None
+    ) -> tuple[Optional[dict[str, str]], RegistryMetadata]:
+        if self.path.is_dir():
+            files = sorted(x for x in self.path.iterdir() if x.suffix.lower() in (".json", ".csv"))
+        else:
+            files = [self.path]
+
+        source_hash = hashlib.sha256()
+        title_ids: dict[str, str] = {}
+        for file in files:
+            with open(file, "rb") as f:
+                if file.suffix.lower() == ".csv":
+                    data = f.read()
+                    source_hash.update(data)
+                    pairs = iter_csv_titles(data.decode("utf8").splitlines())
+                else:
+                    pairs = iter_json_titles(_hashed(iter(lambda: f.read(0x10000), b""), source_hash))
+                title_ids.update(normalize_game_title_ids(pairs))
+
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        sha256 = source_hash.hexdigest()
+        if previous and previous.sha256 == sha256:
+            return None, replace(previous, fetched_at=fetched_at)
+
+        return title_ids, RegistryMetadata(
+            source=self.source, fetched_at=fetched_at, count=len(title_ids), sha256=sha256
         )
 
-    title_ids = {
-        title["id"].lower(): title["name"].removeprefix("<a>").removesuffix("</a>") for title in res.json()["data"]
-    }
 
-    return title_ids
+def get_provider(source: str, priority: int = 0) -> TitleIdProvider:
+    """
+    Get a Title ID provider for a source.
+
+    The source may be `tinfoil`, an HTTP(S) URL to a mirror, or a local directory or file.
+    """
+    if source.lower() == "tinfoil":
+        return TinfoilProvider(priority)
+    if source.lower().startswith(("http://", "https://")):
+        return HttpMirrorProvider(source, priority)
+    path = Path(source)
+    if not path.exists():
+        raise ValueError(f'The Title ID source "{source}" is not tinfoil, a URL, or an existing local path.')
+    return LocalMirrorProvider(path, priority)
+
+
+def fetch_providers(
+    providers: Sequence[TitleIdProvider],
+    session: Optional[requests.Session] = None,
+    previous: Optional[Mapping[str, RegistryMetadata]] = None,
+) -> dict[TitleIdProvider, Union[tuple[Optional[dict[str, str]], RegistryMetadata], Exception]]:
+    """Fetch from every provider concurrently, returning each provider's result or exception."""
+    session = session or get_session()
+    previous = previous or {}
+    results: dict[TitleIdProvider, Union[tuple[Optional[dict[str, str]], RegistryMetadata], Exception]] = {}
+    with ThreadPoolExecutor(max_workers=max(len(providers), 1)) as pool:
+        futures = {
+            pool.submit(provider.fetch, session, previous.get(provider.source)): provider for provider in providers
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+    return results
+
+
+def update_game_title_ids(
+    path: Path, providers: Sequence[TitleIdProvider], session: Optional[requests.Session] = None
+) -> RegistryUpdate:
+    """
+    Incrementally update a compiled Game Title ID registry file from one or more providers.
+
+    The providers are fetched concurrently, conditional on their last fetch, and conflicts
+    are resolved by provider priority. New or changed entries are merged into the existing
+    registry, while entries missing from the providers are kept, as a Title ID that was once
+    used should stay reserved. The registry and its metadata are written atomically.
+
+    A provider that fails is reported in the result, unless every provider fails.
+    """
+    session = session or get_session()
+    previous = RegistryMetadata.load(path) if path.exists() else {}
+
+    results = fetch_providers(providers, session, previous)
+    if any(not isinstance(x, Exception) and x[0] is not None for x in results.values()):
+        # a changed provider's names may conflict with an unchanged provider, so their data is needed too
+        unchanged = [p for p, x in results.items() if not isinstance(x, Exception) and x[0] is None]
+        results.update(fetch_providers(unchanged, session))
+
+    errors = {provider.source: str(x) for provider, x in results.items() if isinstance(x, Exception)}
+    if len(errors) == len(providers):
+        raise next(x for x in results.values() if isinstance(x, Exception))
+
+    fetched: dict[str, str] = {}
+    metadata = dict(previous)
+    for provider in sorted(providers, key=lambda p: p.priority):
+        result = results[provider]
+        if isinstance(result, Exception):
+            continue
+        fetched.update(result[0] or {})
+        metadata[provider.source] = result[1]
+
+    title_ids = read_game_title_ids(path) if path.exists() else {}
+    added = changed = 0
+    for title_id, name in fetched.items():
+        existing = title_ids.get(title_id)
+        if existing is None:
+            added += 1
+        elif existing != name:
+            changed += 1
+        else:
+            continue
+        title_ids[title_id] = name
+
+    if added or changed or not path.exists():
+        compile_game_title_ids(title_ids, path)
+    RegistryMetadata.save(path, metadata.values())
+
+    return RegistryUpdate(
+        modified=bool(added or changed),
+        added=added,
+        changed=changed,
+        count=len(title_ids),
+        metadata=list(metadata.values()),
+        errors=errors,
+    )
+
+
+def clean_title_name(name: str) -> str:
+    """
+    Clean a Game Name as returned by Tinfoil's API.
+
+    The names are wrapped in HTML markup, e.g., `<a href="/Title/...">Name`, and have HTML
+    entities like `&#39;`. This parses the markup and returns the unescaped plain text.
+    """
+    if "<" not in name and "&" not in name:
+        return name.strip()
+    import lxml.html
+
+    return lxml.html.fragment_fromstring(name, create_parent=True).text_content().strip()
+
+
+def normalize_game_title_ids(title_ids: Iterable[tuple[str, str]]) -> dict[str, str]:
+    """
+    Normalize (Game Title ID, Game Name) pairs for storage in the registry.
+
+    Title IDs are lowercased and must be 16 hex digits, while Game Names are cleaned of
+    any HTML markup and entities. Invalid Title IDs are skipped.
+    """
+    normalized = {}
+    for title_id, name in title_ids:
+        title_id = title_id.lower()
+        if len(title_id) != 16 or any(c not in string.hexdigits for c in title_id):
+            continue
+        normalized[title_id] = clean_title_name(name)
+    return normalized
+
+
+class CompiledTitleIds(Mapping[str, str]):
+    """
+    Read-only mapping of Game Title IDs -> Game Names over a compiled registry file.
+
+    The file is read into a single buffer and binary-searched, so lookups need no
+    parsing and no per-entry Python objects. It's not memory-mapped, as a mapped file
+    cannot be replaced on Windows, e.g., by `update_game_title_ids`, while it's loaded.
+    See `compile_game_title_ids` for the layout.
+    """
+
+    MAGIC = b"NTID"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHII")  # magic, version, reserved, count, names size
+    TITLE_ID = struct.Struct("<Q")
+    OFFSET = struct.Struct("<I")
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._data = path.read_bytes()
+        if len(self._data) < self.HEADER.size:
+            raise ValueError(f"The file {path} is not a compiled Title ID registry.")
+        magic, version, _, self._count, names_size = self.HEADER.unpack_from(self._data, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"The file {path} is not a compiled Title ID registry.")
+        if version != self.VERSION:
+            raise ValueError(f"The compiled Title ID registry {path} is an unsupported version, v{version}.")
+        self._ids_offset = self.HEADER.size
+        self._offsets_offset = self._ids_offset + self._count * self.TITLE_ID.size
+        self._names_offset = self._offsets_offset + (self._count + 1) * self.OFFSET.size
+        if self._names_offset + names_size > len(self._data):
+            raise ValueError(f"The compiled Title ID registry {path} is truncated.")
+
+    def _title_id(self, index: int) -> int:
+        return self.TITLE_ID.unpack_from(self._data, self._ids_offset + index * self.TITLE_ID.size)[0]
+
+    def _name(self, index: int) -> str:
+        start, end = struct.unpack_from("<II", self._data, self._offsets_offset + index * self.OFFSET.size)
+        return self._data[self._names_offset + start : self._names_offset + end].decode("utf8")
+
+    def _find(self, title_id: str) -> int:
+        try:
+            value = int(title_id, 16)
+        except ValueError:
+            return -1
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._title_id(mid) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._title_id(lo) == value:
+            return lo
+        return -1
+
+    def __contains__(self, title_id: object) -> bool:
+        return isinstance(title_id, str) and self._find(title_id) != -1
+
+    def __getitem__(self, title_id: str) -> str:
+        index = self._find(title_id)
+        if index == -1:
+            raise KeyError(title_id)
+        return self._name(index)
 
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield f"{self._title_id(index):016x}"
 
-if Files.game_title_ids.exists():
-    game_title_ids = jsonpickle.loads(Files.game_title_ids.read_text("utf8"))
-else:
-    game_title_ids = {}
+    def __len__(self) -> int:
+        return self._count
+
+
+def compile_game_title_ids(title_ids: Mapping[str, str], path: Path) -> None:
+    """
+    Write a mapping of Game Title IDs -> Game Names as a compiled registry file.
+
+    Layout (little-endian):
+        0x00: Header, magic "NTID", u16 version, u16 reserved, u32 count, u32 names size.
+        0x10: Sorted u64 Title IDs, one per entry.
+        ....: u32 offsets into the names blob, one per entry plus a final end offset.
+        ....: UTF-8 names blob.
+    """
+    entries = sorted((int(title_id, 16), name.encode("utf8")) for title_id, name in title_ids.items())
+
+    names = bytearray()
+    offsets = [0]
+    for _, name in entries:
+        names += name
+        offsets.append(len(names))
+
+    with atomic_path(path) as tmp, open(tmp, "wb") as f:
+        f.write(
+            CompiledTitleIds.HEADER.pack(CompiledTitleIds.MAGIC, CompiledTitleIds.VERSION, 0, len(entries), len(names))
+        )
+        f.write(struct.pack(f"<{len(entries)}Q", *(title_id for title_id, _ in entries)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(names)
+
+
+def export_game_title_ids(title_ids: Mapping[str, str], path: Path) -> None:
+    """Export a mapping of Game Title IDs -> Game Names as a JSON registry file."""
+    import jsonpickle
+
+    with atomic_path(path) as tmp:
+        tmp.write_text(jsonpickle.dumps(dict(title_ids)), encoding="utf8")
+
+
+def read_game_title_ids(path: Path) -> dict[str, str]:
+    """Read a compiled or JSON Game Title ID registry file into a dictionary."""
+    with open(path, "rb") as f:
+        compiled = f.read(len(CompiledTitleIds.MAGIC)) == CompiledTitleIds.MAGIC
+    if compiled:
+        return dict(CompiledTitleIds(path).items())
+    import jsonpickle
+
+    return jsonpickle.loads(path.read_text("utf8"))
+
+
+def migrate_game_title_ids(path: Path) -> int:
+    """
+    Normalize an existing compiled or JSON Game Title ID registry file in place.
+
+    Returns the amount of bytes saved by the migration.
+    """
+    with open(path, "rb") as f:
+        compiled = f.read(len(CompiledTitleIds.MAGIC)) == CompiledTitleIds.MAGIC
+    size = path.stat().st_size
+    title_ids = normalize_game_title_ids(read_game_title_ids(path).items())
+    if compiled:
+        compile_game_title_ids(title_ids, path)
+    else:
+        export_game_title_ids(title_ids, path)
+    return size - path.stat().st_size
+
+
+@functools.lru_cache(maxsize=None)
+def load_game_title_ids() -> Mapping[str, str]:
+    """
+    Load the Game Title ID registry from disk.
+
+    The registry is only loaded on first use and then memoized, as it's quite large
+    and most code paths, e.g., `--version`, never need it. The compiled registry is
+    preferred, falling back to a JSON registry if that's all that's available.
+    """
+    if Files.game_title_ids.exists():
+        return CompiledTitleIds(Files.game_title_ids)
+    if Files.game_title_ids_json.exists():
+        import jsonpickle
+
+        return jsonpickle.loads(Files.game_title_ids_json.read_text("utf8"))
+    return {}
 
 
 ALL_SYSTEM = (
@@ -486,4 +1093,63 @@ ALL_SYSTEM = (
     *pre_release_system_modules,
 )
 
-ALL = (*ALL_SYSTEM, *list(game_title_ids), *list(unofficial.values()))
+
+class TitleIdRegistry:
+    """
+    Hash-indexed registry of every known Title ID.
+
+    Each index is a frozenset or dict so that reservation and owner checks are
+    O(1) regardless of how many Game Title IDs are in the registry.
+
+    The Game Title IDs are loaded on first access unless explicitly given, so
+    System and pre-defined Homebrew Title ID checks never parse the registry.
+    """
+
+    def __init__(self, game_title_ids: Optional[Mapping[str, str]] = None) -> None:
+        self.system = frozenset(ALL_SYSTEM)
+        self.unofficial = dict(unofficial)
+        self.unofficial_names = {title_id: name for name, title_id in self.unofficial.items()}
+        self._games = game_title_ids
+
+    @property
+    def games(self) -> Mapping[str, str]:
+        """Mapping of Game Title IDs -> Game Names, loaded on first access."""
+        if self._games is None:
+            self._games = load_game_title_ids()
+        return self._games
+
+    def __contains__(self, title_id: object) -> bool:
+        return isinstance(title_id, str) and self.is_reserved(title_id)
+
+    def is_system(self, title_id: str) -> bool:
+        """Check if the Title ID is a reserved System Title."""
+        return title_id.lower() in self.system
+
+    def is_reserved(self, title_id: str) -> bool:
+        """Check if the Title ID is used by a System Title, Game, or pre-defined Homebrew."""
+        title_id = title_id.lower()
+        return title_id in self.system or title_id in self.unofficial_names or title_id in self.games
+
+    def owner_of(self, title_id: str) -> Optional[str]:
+        """Get the name of the Game or pre-defined Homebrew using the Title ID, if any."""
+        title_id = title_id.lower()
+        return self.unofficial_names.get(title_id) or self.games.get(title_id)
+
+    def unofficial_id(self, name: str) -> Optional[str]:
+        """Get the pre-defined Title ID for a Homebrew by its name (e.g., NRO filename stem)."""
+        return self.unofficial.get(name.lower())
+
+    def allocate_free_id(self) -> str:
+        """
+        Allocate a Random Title ID that is not used by any known Title.
+
+        The Title ID is ensured to begin with `01` and end with `000`.
+        A Base Title typically ends with `000` while a Patch ends with `800`.
+        """
+        title_id = "0100000000000000"
+        while self.is_reserved(title_id):
+            title_id = "01%s000" % os.urandom(6).hex()[:-1]
+        return title_id
+
+
+registry = TitleIdRegistry()
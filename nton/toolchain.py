@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from nton.constants import Directories
+from nton.helpers import atomic_path
+from nton.host import find_tool, get_bin_dirs
+
+# every external tool, with the arguments that make it print its version
+TOOLS = {
+    "nstool": (),
+    "hacbrewpack": ("--help",),
+}
+RE_VERSION = re.compile(r"\bv?(\d+\.\d+(?:\.\d+)*)\b")
+
+
+@dataclass(frozen=True)
+class Tool:
+    """An external tool, its path is None if it could not be found."""
+
+    name: str
+    path: Optional[str] = None
+    version: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+    search: Optional[str] = None  # digest of where the tool was searched for
+
+
+class Toolchain:
+    """
+    Resolves external tools lazily, probing each tool at most once.
+
+    A tool is only searched for when first used. Its path, version, and SHA-256 are
+    recorded in a cache file and re-used by later runs for as long as the tool's file
+    is unchanged, and it's searched for in the same places. A tool that could not be
+    found is only searched for again once a file was added to or removed from one of
+    those places. The cache file is only written when a probe changed something.
+    """
+
+    def __init__(self, cache_path: Path = Directories.cache / "toolchain.json", bin_dir: Path = Directories.bin):
+        self.cache_path = cache_path
+        self.bin_dir = bin_dir
+        self._tools: dict[str, Tool] = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Optional[str]:
+        """Get the path to a tool, None if it could not be found."""
+        return self.get(name).path
+
+    def get(self, name: str, refresh: bool = False) -> Tool:
+        """Get a tool, probing it only if it's not cached or has changed. Use `refresh` to always probe it."""
+        if name not in TOOLS:
+            raise ValueError(f'The tool "{name}" is not supported. Tools: {", ".join(TOOLS)}')
+        with self._lock:
+            if refresh or name not in self._tools:
+                self._tools[name] = self._resolve(name, refresh)
+            return self._tools[name]
+
+    def _search_digest(self, name: str, contents: bool = False) -> str:
+        """
+        Get a digest of where a tool is searched for.
+
+        With `contents`, the modification times of the directories are included, so that
+        it changes when a tool is added to any of them, e.g., to re-use a missing tool.
+        """
+        override = os.environ.get(f"NTON_{name.upper()}", "")
+        path = os.environ.get("PATH", "")
+        bin_dirs = [str(x) for x in get_bin_dirs(self.bin_dir)]
+        search = [override, path, *bin_dirs]
+        if contents:
+            for directory in [os.path.dirname(override), *path.split(os.pathsep), *bin_dirs]:
+                try:
+                    search.append(str(os.stat(directory or ".").st_mtime_ns))
+                except OSError:  # e.g., a PATH entry that does not exist
+                    search.append("")
+        return hashlib.sha256("\x00".join(search).encode("utf8")).hexdigest()
+
+    def _resolve(self, name: str, refresh: bool) -> Tool:
+        cache = self._read_cache()
+        cached = cache.get(name)
+
+        if not refresh and cached:
+            if cached.path and cached.search == self._search_digest(name):
+                try:
+                    stat = os.stat(cached.path)
+                    if stat.st_size == cached.size and stat.st_mtime_ns == cached.mtime_ns:
+                        return cached
+                except OSError:  # removed since
+                    pass
+            elif not cached.path and cached.search == self._search_digest(name, contents=True):
+                return cached  # still missing, nothing was added to where it's searched for
+
+        tool = self._probe(name)
+        if tool != cached:
+            cache[name] = tool
+            try:
+                with atomic_path(self.cache_path) as tmp:
+                    tmp.write_text(json.dumps({k: asdict(v) for k, v in cache.items()}, indent=2), encoding="utf8")
+            except OSError:  # the cache is only an optimization
+                pass
+        return tool
+
+    def _probe(self, name: str) -> Tool:
+        path = find_tool(name, self.bin_dir)
+        if not path:
+            return Tool(name, search=self._search_digest(name, contents=True))
+
+        stat = os.stat(path)
+        hash_ = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hash_.update(chunk)
+
+        return Tool(
+            name=name,
+            path=path,
+            version=self._probe_version(name, path),
+            sha256=hash_.hexdigest(),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            search=self._search_digest(name),
+        )
+
+    @staticmethod
+    def _probe_version(name: str, path: str) -> Optional[str]:
+        from nton import tools
+
+        try:
+            res = tools.get_runner().run_sync(name, [path, *TOOLS[name]], timeout=10, check=False)
+        except Exception:  # e.g., not executable on this platform, or it hung
+            return None
+        match = RE_VERSION.search((res.stdout + res.stderr).decode("utf8", errors="replace"))
+        return match.group(1) if match else None
+
+    def _read_cache(self) -> dict[str, Tool]:
+        try:
+            data: dict[str, Any] = json.loads(self.cache_path.read_text(encoding="utf8"))
+            return {k: Tool(**v) for k, v in data.items() if k in TOOLS}
+        except (OSError, ValueError, TypeError):  # missing, corrupt, or from another version
+            return {}
+
+
+toolchain = Toolchain()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+from nton import host
+
+DEFAULT_TIMEOUT = 300.0  # seconds
+
+
+@dataclass(frozen=True)
+class ToolResult:
+    args: Sequence[str]
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+
+
+class ToolRunner:
+    """
+    Runs external tools as asyncio subprocesses, with a concurrency limit per tool and a timeout.
+
+    Every tool runs on one event loop in a background thread, so the limits are shared by
+    every thread of the process, and waiting on tools never blocks the other builds.
+
+    The limit defaults to the NTON_TOOL_JOBS environment variable, or the amount of CPU
+    cores. The timeout defaults to the NTON_TOOL_TIMEOUT environment variable, or 300s.
+    Both can be changed later with `configure`.
+    """
+
+    def __init__(self, limit: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        # only used from the loop's thread
+        self._slots: Optional[asyncio.Condition] = None
+        self._running: dict[str, int] = {}
+        self.configure(limit, timeout)
+
+    def configure(self, limit: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        """
+        Change the concurrency limit and timeout, defaulting to the environment as in `__init__`.
+
+        Tools waiting for a slot follow the new limit right away, while tools that are
+        already running keep the timeout they started with.
+        """
+        self.limit = limit or int(os.environ.get("NTON_TOOL_JOBS") or os.cpu_count() or 1)
+        self.timeout = timeout or float(os.environ.get("NTON_TOOL_TIMEOUT") or DEFAULT_TIMEOUT)
+        with self._lock:
+            loop = self._loop
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._notify(), loop)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="nton-tools", daemon=True).start()
+            return self._loop
+
+    async def run(
+        self,
+        tool: str,
+        args: Sequence[str],
+        cwd: Optional[Path] = None,
+        timeout: Optional[float] = None,
+        check: bool = True,
+    ) -> ToolResult:
+        """
+        Run a tool and capture its output, waiting for a free slot of the tool first.
+
+        Parameters:
+            tool: Name of the tool, which every run of the tool shares a concurrency limit by.
+            args: The program and its arguments.
+            cwd: Working directory to run the tool in.
+            timeout: Seconds to wait for the tool before killing it, defaults to the runner's timeout.
+            check: Raise a CalledProcessError if the tool fails.
+
+        Raises a TimeoutExpired if the tool took too long. If cancelled, the tool is killed.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run(tool, args, cwd, timeout, check), self.loop)
+        return await asyncio.wrap_future(future)
+
+    def run_sync(
+        self,
+        tool: str,
+        args: Sequence[str],
+        cwd: Optional[Path] = None,
+        timeout: Optional[float] = None,
+        check: bool = True,
+    ) -> ToolResult:
+        """Run a tool and block until it finishes, see `run`."""
+        future = asyncio.run_coroutine_threadsafe(self._run(tool, args, cwd, timeout, check), self.loop)
+        try:
+            return future.result()
+        except BaseException:  # e.g., KeyboardInterrupt, make sure the tool does not outlive us
+            future.cancel()
+            raise
+
+    async def _run(
+        self,
+        tool: str,
+        args: Sequence[str],
+        cwd: Optional[Path],
+        timeout: Optional[float],
+        check: bool,
+    ) -> ToolResult:
+        args = [str(x) for x in args]
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._running.get(tool, 0) < self.limit)
+            self._running[tool] = self._running.get(tool, 0) + 1
+        timeout = timeout or self.timeout
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                **host.get_subprocess_kwargs(),
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await _kill(proc)
+                raise subprocess.TimeoutExpired(args, timeout)
+            except asyncio.CancelledError:
+                await _kill(proc)
+                raise
+        finally:
+            self._running[tool] -= 1
+            await self._notify()
+
+        returncode = proc.returncode if proc.returncode is not None else -1
+        if check and returncode:
+            raise subprocess.CalledProcessError(returncode, args, stdout, stderr)
+        return ToolResult(args, returncode, stdout, stderr)
+
+    async def _notify(self) -> None:
+        """Wake the tools waiting for a slot, to check the limit again."""
+        if self._slots is not None:
+            async with self._slots:
+                self._slots.notify_all()
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:  # it exited in the meantime
+            pass
+        await proc.wait()
+
+
+_runner: Optional[ToolRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> ToolRunner:
+    """Get the tool runner shared by the whole process."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ToolRunner()
+        return _runner
+
+
+def configure(limit: Optional[int] = None, timeout: Optional[float] = None) -> None:
+    """Change the concurrency limit and timeout of the tool runner shared by the whole process."""
+    get_runner().configure(limit, timeout)
@@ -0,0 +1,65 @@
+"""
+Benchmark the whole `nton build` path with the native packer.
+
+sdl-hello.nro is built in fresh interpreters with a fake prod.keys, reporting the
+median wall time of a full build (--no-cache) and of a rebuild from the build cache.
+Each run has its own home and cache directory, so nothing is written outside of it.
+Run with `python tests/bench_build.py [runs]`.
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from test_nca import FAKE_KEYS
+from test_pack import SDL_HELLO, TITLE_ID
+from test_startup import ROOT
+
+BUILD_ARGS = ["--sdmc", "/switch/sdl-hello.nro", "--id", TITLE_ID, "--packer", "native"]
+
+
+def time_build(work_dir: Path, *args: str) -> float:
+    """Build sdl-hello.nro in a work directory, returning the wall time in seconds."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "HOME": str(work_dir),
+        "USERPROFILE": str(work_dir),
+        "XDG_CACHE_HOME": str(work_dir / "cache"),
+        "LOCALAPPDATA": str(work_dir / "cache"),
+    }
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "nton", "build", str(SDL_HELLO), *BUILD_ARGS, *args],
+        cwd=work_dir,
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    full, cached = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory(prefix="nton-bench-") as t:
+            work_dir = Path(t)
+            (work_dir / "prod.keys").write_text(FAKE_KEYS)
+            full.append(time_build(work_dir, "--no-cache"))
+            time_build(work_dir)  # fill the caches
+            cached.append(time_build(work_dir))
+
+    print(f"{'Build':<32}{'Wall (ms)':>12}")
+    print(f"{'nton build --no-cache':<32}{statistics.median(full) * 1000:>12.1f}")
+    print(f"{'nton build (cached)':<32}{statistics.median(cached) * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark the cold start of every CLI subcommand.
+
+For each subcommand, `nton <subcommand> --help` is run in fresh interpreters, reporting
+the median wall time and the cumulative import time of nton.main from `-X importtime`.
+Run with `python tests/bench_startup.py [runs]`.
+"""
+
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+
+import click
+from test_startup import ROOT, get_import_time, run_python
+
+
+def get_subcommands() -> list[list[str]]:
+    sys.path.insert(0, str(ROOT))
+    from nton.main import main
+
+    def walk(group: click.Group, prefix: list[str]) -> list[list[str]]:
+        found = []
+        for name, command in sorted(group.commands.items()):
+            found.append([*prefix, name])
+            if isinstance(command, click.Group):
+                found += walk(command, [*prefix, name])
+        return found
+
+    return [[]] + walk(main, [])
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'Command':<32}{'Wall (ms)':>12}{'Import nton.main (ms)':>24}")
+    for subcommand in get_subcommands():
+        argv = [*subcommand, "--help"]
+        wall = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            run_python("-m", "nton", *argv)
+            wall.append(time.perf_counter() - start)
+        import_time = statistics.median(get_import_time("-m", "nton", *argv) for _ in range(runs))
+        print(f"{' '.join(['nton', *argv]):<32}{statistics.median(wall) * 1000:>12.1f}{import_time / 1000:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Tests of the NACP model and the NACPs built from the bundled template.
+
+The template was compiled from the control.nacp.xml that hptnacp used to build. Set
+`NTON_HPTNACP` to the path of an hptnacp binary to cross-check the two, otherwise
+that test is skipped.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import subprocess
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from nton.nacp import NACP_SIZE, TEMPLATE, TITLE, Nacp, Screenshot, StartupUserAccount, VideoCapture
+
+TITLE_ID = 0x0100F00D0000A000
+
+# every range of the template that from_template() may change, the rest must be untouched
+PATCHED = (
+    (0x0000, 0x3000),  # titles
+    (0x3038, 0x3040),  # presence group id
+    (0x3060, 0x3070),  # display version
+    (0x3070, 0x3080),  # add-on content base id, save data owner id
+    (0x30B0, 0x30B8),  # local communication id
+)
+
+# the former control.nacp.xml that hptnacp built new NACPs from
+TEMPLATE_XML = """<?xml version="1.0" encoding="utf-8"?>
+<Application>
+    <Title>
+        <Language>AmericanEnglish</Language>
+        <Name>Name</Name>
+        <Publisher>Publisher</Publisher>
+    </Title>
+    <Isbn/>
+    <StartupUserAccount>None</StartupUserAccount>
+    <UserAccountSwitchLock>Disable</UserAccountSwitchLock>
+    <ParentalControl>None</ParentalControl>
+    <SupportedLanguage>AmericanEnglish</SupportedLanguage>
+    <Screenshot>Allow</Screenshot>
+    <VideoCapture>Enable</VideoCapture>
+    <PresenceGroupId>0x0100000000000000</PresenceGroupId>
+    <DisplayVersion>1.0.0</DisplayVersion>
+    <Rating><Organization>CERO</Organization><Age>12</Age></Rating>
+    <Rating><Organization>ESRB</Organization><Age>10</Age></Rating>
+    <Rating><Organization>USK</Organization><Age>12</Age></Rating>
+    <Rating><Organization>PEGI</Organization><Age>12</Age></Rating>
+    <Rating><Organization>PEGIPortugal</Organization><Age>12</Age></Rating>
+    <Rating><Organization>PEGIBBFC</Organization><Age>12</Age></Rating>
+    <Rating><Organization>Russian</Organization><Age>12</Age></Rating>
+    <Rating><Organization>ACB</Organization><Age>13</Age></Rating>
+    <Rating><Organization>OFLC</Organization><Age>13</Age></Rating>
+    <DataLossConfirmation>Required</DataLossConfirmation>
+    <PlayLogPolicy>All</PlayLogPolicy>
+    <SaveDataOwnerId>0x0100000000000000</SaveDataOwnerId>
+    <UserAccountSaveDataSize>0x0000000000000000</UserAccountSaveDataSize>
+    <UserAccountSaveDataJournalSize>0x0000000000000000</UserAccountSaveDataJournalSize>
+    <DeviceSaveDataSize>0x0000000000000000</DeviceSaveDataSize>
+    <DeviceSaveDataJournalSize>0x0000000000000000</DeviceSaveDataJournalSize>
+    <BcatDeliveryCacheStorageSize>0x0000000000000000</BcatDeliveryCacheStorageSize>
+    <ApplicationErrorCodeCategory/>
+    <AddOnContentBaseId>0x0100000000001000</AddOnContentBaseId>
+    <LogoType>Nintendo</LogoType>
+    <LocalCommunicationId>0x0100000000000000</LocalCommunicationId>
+    <LogoHandling>Auto</LogoHandling>
+    <SeedForPseudoDeviceId>0x0000000000000000</SeedForPseudoDeviceId>
+    <BcatPassphrase/>
+    <AddOnContentRegistrationType>AllOnLaunch</AddOnContentRegistrationType>
+    <UserAccountSaveDataSizeMax>0x0000000000000000</UserAccountSaveDataSizeMax>
+    <UserAccountSaveDataJournalSizeMax>0x0000000000000000</UserAccountSaveDataJournalSizeMax>
+    <DeviceSaveDataSizeMax>0x0000000000000000</DeviceSaveDataSizeMax>
+    <DeviceSaveDataJournalSizeMax>0x0000000000000000</DeviceSaveDataJournalSizeMax>
+    <TemporaryStorageSize>0x0000000000000000</TemporaryStorageSize>
+    <CacheStorageSize>0x0000000000000000</CacheStorageSize>
+    <CacheStorageJournalSize>0x0000000000000000</CacheStorageJournalSize>
+    <CacheStorageDataAndJournalSizeMax>0x0000000000000000</CacheStorageDataAndJournalSizeMax>
+    <CacheStorageIndexMax>0x0000000000000000</CacheStorageIndexMax>
+    <Hdcp>None</Hdcp>
+    <CrashReport>Deny</CrashReport>
+    <RuntimeAddOnContentInstall>Deny</RuntimeAddOnContentInstall>
+    <PlayLogQueryableApplicationId>0x0000000000000000</PlayLogQueryableApplicationId>
+    <PlayLogQueryCapability>None</PlayLogQueryCapability>
+    <Repair>None</Repair>
+    <Attribute>None</Attribute>
+    <ProgramIndex>0</ProgramIndex>
+    <RequiredNetworkServiceLicenseOnLaunch>None</RequiredNetworkServiceLicenseOnLaunch>
+</Application>
+"""
+
+
+def build_xml(name: str, publisher: str, version: str, title_id: int) -> str:
+    """Fill the former XML template the same way nton did before hptnacp was removed."""
+    root = ET.fromstring(TEMPLATE_XML)
+    for key, value in (
+        ("Title/Name", name),
+        ("Title/Publisher", publisher),
+        ("DisplayVersion", version),
+        ("PresenceGroupId", f"0x{title_id:016x}"),
+        ("SaveDataOwnerId", f"0x{title_id:016x}"),
+        ("LocalCommunicationId", f"0x{title_id:016x}"),
+        ("AddOnContentBaseId", f"0x{title_id + 0x1000:016x}"),
+    ):
+        element = root.find(key)
+        assert element is not None
+        element.text = value
+    return '<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(root, encoding="unicode")
+
+
+class FromTemplateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.template = TEMPLATE.read_bytes()
+        self.nacp = Nacp.from_template("Hello World", "vgmoose", "1.1", TITLE_ID)
+        self.data = bytes(self.nacp)
+
+    def test_size(self) -> None:
+        self.assertEqual(len(self.template), NACP_SIZE)
+        self.assertEqual(len(self.data), NACP_SIZE)
+
+    def test_titles(self) -> None:
+        self.assertEqual(self.data[:0x200], b"Hello World".ljust(0x200, b"\x00"))
+        self.assertEqual(self.data[0x200:0x300], b"vgmoose".ljust(0x100, b"\x00"))
+        self.assertEqual(self.data[TITLE.size : 0x3000], b"\x00" * (0x3000 - TITLE.size))
+        self.assertEqual((self.nacp.name, self.nacp.publisher), ("Hello World", "vgmoose"))
+
+    def test_display_version(self) -> None:
+        self.assertEqual(self.data[0x3060:0x3070], b"1.1".ljust(0x10, b"\x00"))
+
+    def test_title_ids(self) -> None:
+        self.assertEqual(struct.unpack_from("<Q", self.data, 0x3038)[0], TITLE_ID)  # presence group id
+        self.assertEqual(struct.unpack_from("<Q", self.data, 0x3070)[0], TITLE_ID + 0x1000)  # add-on content base id
+        self.assertEqual(struct.unpack_from("<Q", self.data, 0x3078)[0], TITLE_ID)  # save data owner id
+        self.assertEqual(struct.unpack_from("<Q", self.data, 0x30B0)[0], TITLE_ID)  # local communication id
+
+    def test_template_settings(self) -> None:
+        self.assertEqual(self.data[0x3025], StartupUserAccount.NONE)
+        self.assertEqual(self.data[0x3034], Screenshot.ALLOW)
+        self.assertEqual(self.data[0x3035], VideoCapture.ENABLE)
+        self.assertEqual(set(self.nacp.storage_sizes.values()), {0})
+        self.assertEqual(self.nacp.cache_storage_index_max, 0)
+
+    def test_only_patched_ranges_change(self) -> None:
+        patched = {i for start, end in PATCHED for i in range(start, end)}
+        changed = {i for i, (a, b) in enumerate(zip(self.template, self.data)) if a != b}
+        self.assertLessEqual(changed, patched)
+
+    def test_too_large(self) -> None:
+        Nacp.from_template("N" * 0x200, "P" * 0x100, "V" * 0x10, TITLE_ID)
+        for name, publisher, version in (
+            ("N" * 0x201, "P", "V"),
+            ("é" * 0x101, "P", "V"),  # 0x202 bytes as UTF-8
+            ("N", "P" * 0x101, "V"),
+            ("N", "P", "V" * 0x11),
+            ("N", "P", "1.0.0-" + "é" * 6),
+        ):
+            with self.subTest(name=name, publisher=publisher, version=version):
+                with self.assertRaisesRegex(ValueError, "too large"):
+                    Nacp.from_template(name, publisher, version, TITLE_ID)
+
+
+class ForwarderPolicyTest(unittest.TestCase):
+    def test_apply_forwarder_policy(self) -> None:
+        nacp = Nacp.from_template("Hello World", "vgmoose", "1.1", TITLE_ID)
+        nacp.video_capture = VideoCapture.DISABLE
+        nacp.screenshot = Screenshot.DENY
+        nacp.startup_user_account = StartupUserAccount.REQUIRED
+        nacp.cache_storage_index_max = 1
+        struct.pack_into("<q", nacp.view, 0x3080, 0x100000)
+
+        changes = nacp.apply_forwarder_policy()
+        self.assertEqual(
+            changes, ["Enabled Video Capture", "Enabled Screenshots", "Removed User Account Save Data Allocation"]
+        )
+        self.assertEqual(bytes(nacp), bytes(Nacp.from_template("Hello World", "vgmoose", "1.1", TITLE_ID)))
+        self.assertEqual(nacp.apply_forwarder_policy(), [])
+
+
+@unittest.skipUnless(os.environ.get("NTON_HPTNACP"), "NTON_HPTNACP is not set")
+class HptnacpTest(unittest.TestCase):
+    def test_same_nacp_as_hptnacp(self) -> None:
+        for name, publisher, version in (("Hello World", "vgmoose", "1.1"), ("Ünïcödé", "パブリッシャー", "1.0.0")):
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as t:
+                xml = Path(t) / "control.nacp.xml"
+                xml.write_text(build_xml(name, publisher, version, TITLE_ID), encoding="utf8")
+                control = Path(t) / "control.nacp"
+                subprocess.run(
+                    [os.environ["NTON_HPTNACP"], "-a", "createnacp", "-i", str(xml), "-o", str(control)],
+                    capture_output=True,
+                    check=True,
+                )
+                self.assertEqual(bytes(Nacp.from_template(name, publisher, version, TITLE_ID)), control.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,290 @@
+"""
+Tests of the native NCA builder.
+
+The NCAs of sdl-hello.nro are built with a fake prod.keys, then decrypted and every
+hash of them is checked. The comparison against hacBrewPack needs hacBrewPack and a
+real prod.keys, and is skipped without them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import struct
+import tempfile
+import unittest
+from dataclasses import dataclass
+from pathlib import Path
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from test_pack import TITLE_ID, get_forwarder, parse_pfs0
+
+from nton import nca
+from nton.constants import Files
+from nton.forwarder import Forwarder, get_shared_assets
+from nton.keys import KeySet, load_keys
+from nton.pack import native
+from nton.toolchain import toolchain
+
+FAKE_KEYS = f"header_key = {bytes(range(0x20)).hex()}\nkey_area_key_application_00 = {bytes(range(0x20, 0x30)).hex()}\n"
+
+
+@dataclass
+class ParsedSection:
+    fs_type: nca.FsType
+    encrypted: bool
+    files: dict[str, bytes]
+
+
+@dataclass
+class ParsedNca:
+    content_type: nca.ContentType
+    title_id: int
+    sections: list[ParsedSection]
+
+
+def decrypt_header(data: bytes, header_key: bytes) -> bytes:
+    header = b""
+    for sector in range(nca.HEADER_SIZE // nca.MEDIA_SIZE):
+        decryptor = Cipher(algorithms.AES(header_key), modes.XTS(sector.to_bytes(16, "big"))).decryptor()
+        header += decryptor.update(data[sector * nca.MEDIA_SIZE : (sector + 1) * nca.MEDIA_SIZE]) + decryptor.finalize()
+    return header
+
+
+def parse_romfs(data: bytes) -> dict[str, bytes]:
+    """Get the files in the root directory of a RomFS image, checking that each is in the file hash table."""
+    header = nca.ROMFS_HEADER.unpack_from(data)
+    _, _, _, _, _, file_hash_offset, file_hash_size, file_table_offset, file_table_size, data_offset = header
+    file_hash_table = struct.unpack_from(f"<{file_hash_size // 4}I", data, file_hash_offset)
+    file_table = data[file_table_offset : file_table_offset + file_table_size]
+
+    files = {}
+    offset = 0
+    while offset < len(file_table):
+        _, _, file_offset, file_size, _, name_size = nca.ROMFS_FILE_ENTRY.unpack_from(file_table, offset)
+        name = file_table[offset + nca.ROMFS_FILE_ENTRY.size : offset + nca.ROMFS_FILE_ENTRY.size + name_size]
+
+        entry_offset = file_hash_table[nca._romfs_hash(0, name) % len(file_hash_table)]
+        while entry_offset != offset:
+            assert entry_offset != nca.ROMFS_NONE, f"{name!r} is not in the file hash table"
+            entry_offset = nca.ROMFS_FILE_ENTRY.unpack_from(file_table, entry_offset)[4]
+
+        files[name.decode("utf8")] = data[data_offset + file_offset : data_offset + file_offset + file_size]
+        offset += nca.ROMFS_FILE_ENTRY.size + (name_size + 3) // 4 * 4
+    return files
+
+
+class NcaChecker(unittest.TestCase):
+    """Decrypts NCAs and checks their structure and every hash, returning the files of each section."""
+
+    def check_nca(self, filename: str, data: bytes, key_set: KeySet) -> ParsedNca:
+        self.assertEqual(filename.split(".")[0], hashlib.sha256(data).hexdigest()[:32])
+
+        header = decrypt_header(data, key_set.header_key)
+        (
+            _,
+            _,
+            magic,
+            _,
+            content_type,
+            key_generation_old,
+            key_area_key_index,
+            content_size,
+            title_id,
+            _,
+            _,
+            key_generation,
+            _,
+            rights_id,
+            fs_entries,
+            fs_header_hashes,
+            key_area,
+        ) = nca.NCA_HEADER.unpack_from(header)
+        self.assertEqual(magic, b"NCA3")
+        self.assertEqual(content_size, len(data))
+        self.assertEqual(key_area_key_index, 0)
+        self.assertEqual(rights_id, b"\x00" * 0x10)
+        self.assertEqual(filename.endswith(".cnmt.nca"), content_type == nca.ContentType.META)
+
+        key_area_key = key_set.key_area_key(max(key_generation_old, key_generation))
+        decryptor = Cipher(algorithms.AES(key_area_key), modes.ECB()).decryptor()
+        key = (decryptor.update(key_area) + decryptor.finalize())[0x20:0x30]
+
+        sections = []
+        for i in range(4):
+            start, end = nca.FS_ENTRY.unpack_from(fs_entries, i * nca.FS_ENTRY.size)
+            if not start and not end:
+                continue
+            fs_header = header[nca.NCA_HEADER.size + i * nca.FS_HEADER.size :][: nca.FS_HEADER.size]
+            self.assertEqual(hashlib.sha256(fs_header).digest(), fs_header_hashes[i * 0x20 : (i + 1) * 0x20])
+            _, fs_type, hash_type, encryption_type, hash_data, generation, secure_value = nca.FS_HEADER.unpack(
+                fs_header
+            )
+
+            offset = start * nca.MEDIA_SIZE
+            section = data[offset : end * nca.MEDIA_SIZE]
+            if encryption_type == nca.EncryptionType.AES_CTR:
+                counter = struct.pack(">IIQ", secure_value, generation, offset >> 4)
+                decryptor = Cipher(algorithms.AES(key), modes.CTR(counter)).decryptor()
+                section = decryptor.update(section) + decryptor.finalize()
+            else:
+                self.assertEqual(encryption_type, nca.EncryptionType.NONE)
+
+            if fs_type == nca.FsType.PFS0:
+                self.assertEqual(hash_type, nca.HashType.HIERARCHICAL_SHA256)
+                files = self.check_pfs0_section(hash_data, section)
+            else:
+                self.assertEqual((fs_type, hash_type), (nca.FsType.ROMFS, nca.HashType.HIERARCHICAL_INTEGRITY))
+                files = self.check_romfs_section(hash_data, section)
+            sections.append(ParsedSection(nca.FsType(fs_type), encryption_type != nca.EncryptionType.NONE, files))
+
+        return ParsedNca(nca.ContentType(content_type), title_id, sections)
+
+    def check_pfs0_section(self, hash_data: bytes, section: bytes) -> dict[str, bytes]:
+        master_hash, block_size, layer_count, hash_table_offset, hash_table_size, pfs0_offset, pfs0_size = (
+            nca.PFS0_HASH_DATA.unpack_from(hash_data)
+        )
+        self.assertEqual(layer_count, 2)
+        hash_table = section[hash_table_offset : hash_table_offset + hash_table_size]
+        container = section[pfs0_offset : pfs0_offset + pfs0_size]
+        self.assertEqual(hashlib.sha256(hash_table).digest(), master_hash)
+        blocks = [container[i : i + block_size] for i in range(0, len(container), block_size)]
+        self.assertEqual(hash_table, b"".join(hashlib.sha256(block).digest() for block in blocks))
+        return parse_pfs0(container)
+
+    def check_romfs_section(self, hash_data: bytes, section: bytes) -> dict[str, bytes]:
+        magic, _, master_hash_size, layer_count = nca.IVFC_HEADER.unpack_from(hash_data)
+        self.assertEqual((magic, master_hash_size, layer_count), (b"IVFC", 0x20, nca.IVFC_LEVELS + 1))
+
+        levels = []
+        for i in range(nca.IVFC_LEVELS):
+            offset, size, block_size_log2 = nca.IVFC_LEVEL.unpack_from(
+                hash_data, nca.IVFC_HEADER.size + i * nca.IVFC_LEVEL.size
+            )
+            levels.append((section[offset : offset + size], 1 << block_size_log2))
+        master_hash_offset = nca.IVFC_HEADER.size + nca.IVFC_LEVELS * nca.IVFC_LEVEL.size + 0x20
+        master_hash = hash_data[master_hash_offset : master_hash_offset + 0x20]
+
+        level, block_size = levels[0]
+        self.assertEqual(hashlib.sha256(level.ljust(block_size, b"\x00")).digest(), master_hash)
+        for (hashes, _), (level, block_size) in zip(levels, levels[1:]):
+            expected = b"".join(
+                hashlib.sha256(level[i : i + block_size].ljust(block_size, b"\x00")).digest()
+                for i in range(0, len(level), block_size)
+            )
+            self.assertEqual(hashes, expected)
+
+        return parse_romfs(levels[-1][0])
+
+    def check_ncas(self, ncas: dict[str, bytes], key_set: KeySet) -> dict[nca.ContentType, ParsedNca]:
+        """Check a forwarder's NCAs, including the Meta NCA's content records of the others."""
+        parsed = {name: self.check_nca(name, data, key_set) for name, data in ncas.items()}
+        by_type = {x.content_type: x for x in parsed.values()}
+        self.assertEqual(set(by_type), set(nca.ContentType))
+        self.assertEqual(len(parsed), 3)
+
+        meta = by_type[nca.ContentType.META]
+        self.assertEqual(len(meta.sections), 1)
+        cnmt = meta.sections[0].files[f"Application_{meta.title_id:016x}.cnmt"]
+        title_id, _, meta_type, _, extended_header_size, content_count, _, _, _ = nca.CNMT_HEADER.unpack_from(cnmt)
+        self.assertEqual((title_id, meta_type, content_count), (meta.title_id, nca.CNMT_APPLICATION, 2))
+        patch_id = nca.CNMT_APPLICATION_HEADER.unpack_from(cnmt, nca.CNMT_HEADER.size)[0]
+        self.assertEqual(patch_id, title_id + 0x800)
+
+        records = {}
+        for i in range(content_count):
+            offset = nca.CNMT_HEADER.size + extended_header_size + i * nca.CNMT_CONTENT_RECORD.size
+            hash_, content_id, size, content_type, _ = nca.CNMT_CONTENT_RECORD.unpack_from(cnmt, offset)
+            records[content_type] = (hash_, content_id.hex(), int.from_bytes(size, "little"))
+        for content_type, cnmt_type in (
+            (nca.ContentType.PROGRAM, nca.CnmtContentType.PROGRAM),
+            (nca.ContentType.CONTROL, nca.CnmtContentType.CONTROL),
+        ):
+            (name,) = (name for name, x in parsed.items() if x.content_type == content_type)
+            data = ncas[name]
+            self.assertEqual(records[cnmt_type], (hashlib.sha256(data).digest(), name.split(".")[0], len(data)))
+
+        return by_type
+
+
+class NativeNcaTest(NcaChecker):
+    key_set: KeySet
+    forwarder: Forwarder
+    ncas: dict[str, bytes]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        with tempfile.TemporaryDirectory() as t:
+            keys = Path(t) / "prod.keys"
+            keys.write_text(FAKE_KEYS)
+            cls.key_set = load_keys(keys)
+            cls.forwarder = get_forwarder()
+            cls.ncas = native.build_ncas(cls.forwarder, keys)
+
+    def test_ncas(self) -> None:
+        parsed = self.check_ncas(self.ncas, self.key_set)
+        title_id = int(TITLE_ID, 16)
+        self.assertEqual({x.title_id for x in parsed.values()}, {title_id})
+        files = self.forwarder.files
+
+        program = parsed[nca.ContentType.PROGRAM]
+        self.assertEqual(
+            [(x.fs_type, x.encrypted) for x in program.sections],
+            [(nca.FsType.PFS0, True), (nca.FsType.ROMFS, True), (nca.FsType.PFS0, False)],
+        )
+        exefs, romfs, logo = (x.files for x in program.sections)
+        self.assertEqual(
+            exefs, {"main": files["exefs/main"], "main.npdm": nca.patch_npdm(files["exefs/main.npdm"], title_id)}
+        )
+        self.assertEqual(romfs, {"nextArgv": files["romfs/nextArgv"], "nextNroPath": files["romfs/nextNroPath"]})
+        self.assertEqual(
+            logo,
+            {"NintendoLogo.png": files["logo/NintendoLogo.png"], "StartupMovie.gif": files["logo/StartupMovie.gif"]},
+        )
+
+        control = parsed[nca.ContentType.CONTROL]
+        self.assertEqual([(x.fs_type, x.encrypted) for x in control.sections], [(nca.FsType.ROMFS, True)])
+        self.assertEqual(
+            control.sections[0].files,
+            {
+                "control.nacp": files["control/control.nacp"],
+                "icon_AmericanEnglish.dat": files["control/icon_AmericanEnglish.dat"],
+            },
+        )
+
+    def test_patch_npdm(self) -> None:
+        npdm = nca.patch_npdm(get_shared_assets()["exefs/main.npdm"], 0x0123456789ABCDEF)
+        aci0_offset, _, acid_offset = struct.unpack_from("<III", npdm, nca.NPDM_ACI0_OFFSET)
+        self.assertEqual(struct.unpack_from("<Q", npdm, aci0_offset + 0x10)[0], 0x0123456789ABCDEF)
+        self.assertEqual(struct.unpack_from("<QQ", npdm, acid_offset + 0x210), (0x0123456789ABCDEF,) * 2)
+
+    def test_reproducible(self) -> None:
+        with tempfile.TemporaryDirectory() as t:
+            keys = Path(t) / "prod.keys"
+            keys.write_text(FAKE_KEYS)
+            self.assertEqual(native.build_ncas(self.forwarder, keys), self.ncas)
+
+    def test_romfs_hash_table(self) -> None:
+        names = [f"file{i}" for i in range(40)]
+        files = parse_romfs(nca.build_romfs({name: name.encode() for name in names}))
+        self.assertEqual(files, {name: name.encode() for name in names})
+
+
+@unittest.skipUnless(toolchain.path("hacbrewpack"), "hacBrewPack is not installed")
+@unittest.skipUnless(Files.keys.is_file(), "prod.keys is missing")
+class HacBrewPackTest(NcaChecker):
+    def test_same_contents_as_hacbrewpack(self) -> None:
+        from nton.pack import hacbrewpack
+
+        forwarder = get_forwarder()
+        key_set = load_keys(Files.keys)
+        expected = self.check_ncas(hacbrewpack.build_ncas(forwarder, Files.keys), key_set)
+        actual = self.check_ncas(native.build_ncas(forwarder, Files.keys), key_set)
+
+        for content_type in (nca.ContentType.PROGRAM, nca.ContentType.CONTROL):
+            with self.subTest(content_type=content_type):
+                self.assertEqual(actual[content_type], expected[content_type])
+        self.assertEqual(actual[nca.ContentType.META].title_id, expected[nca.ContentType.META].title_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests of the native NSP (PFS0) packer.
+
+The comparison against hacBrewPack needs hacBrewPack and a real prod.keys, and is
+skipped without them. Run with `python -m unittest discover tests` or pytest.
+"""
+
+from __future__ import annotations
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from nton import nro
+from nton.constants import Files
+from nton.forwarder import Forwarder
+from nton.icon import normalize_icon
+from nton.nacp import Nacp
+from nton.pack import pfs0
+from nton.toolchain import toolchain
+
+ROOT = Path(__file__).resolve().parent.parent
+SDL_HELLO = ROOT / "sdl-hello.nro"
+TITLE_ID = "0100f00d0000a000"
+
+
+def get_forwarder(title_id: str = TITLE_ID) -> Forwarder:
+    """Get the forwarder of sdl-hello.nro, as `nton build` would build it."""
+    assets = nro.get_assets(SDL_HELLO)
+    assert assets.nacp
+    control = Nacp(assets.nacp)
+    control.apply_forwarder_policy()
+    return Forwarder(
+        title_id=title_id,
+        control=bytes(control),
+        icon=normalize_icon(assets.icon) if assets.icon else None,
+        next_nro_path="sdmc:/switch/sdl-hello.nro",
+        next_argv="sdmc:/switch/sdl-hello.nro",
+    )
+
+
+def parse_pfs0(data: bytes) -> dict[str, bytes]:
+    """Get the files of a PFS0 container by name, checking that its file data is contiguous."""
+    magic, count, string_table_size, reserved = pfs0.HEADER.unpack_from(data)
+    assert magic == b"PFS0" and reserved == 0
+    string_table_offset = pfs0.HEADER.size + count * pfs0.FILE_ENTRY.size
+    data_offset = string_table_offset + string_table_size
+    files = {}
+    expected_offset = 0
+    for i in range(count):
+        offset, size, name_offset, _ = pfs0.FILE_ENTRY.unpack_from(data, pfs0.HEADER.size + i * pfs0.FILE_ENTRY.size)
+        assert offset == expected_offset
+        expected_offset += size
+        name_start = string_table_offset + name_offset
+        name = data[name_start : data.index(b"\x00", name_start)].decode("utf8")
+        files[name] = data[data_offset + offset : data_offset + offset + size]
+    assert len(data) >= data_offset + expected_offset
+    return files
+
+
+class BuildHeaderTest(unittest.TestCase):
+    def test_layout(self) -> None:
+        header = pfs0.build_header([("a.nca", 0x100), ("bb.nca", 0x20), ("c.cnmt.nca", 0)])
+        magic, count, string_table_size, reserved = pfs0.HEADER.unpack_from(header)
+        self.assertEqual((magic, count, reserved), (b"PFS0", 3, 0))
+
+        entries = [
+            pfs0.FILE_ENTRY.unpack_from(header, pfs0.HEADER.size + i * pfs0.FILE_ENTRY.size) for i in range(count)
+        ]
+        self.assertEqual(entries, [(0, 0x100, 0, 0), (0x100, 0x20, 6, 0), (0x120, 0, 13, 0)])
+
+        string_table = header[pfs0.HEADER.size + count * pfs0.FILE_ENTRY.size :]
+        self.assertEqual(len(string_table), string_table_size)
+        self.assertEqual(string_table, b"a.nca\x00bb.nca\x00c.cnmt.nca\x00".ljust(string_table_size, b"\x00"))
+
+    def test_padding(self) -> None:
+        for count in range(4):
+            for name_size in range(1, 0x41):
+                with self.subTest(count=count, name_size=name_size):
+                    header = pfs0.build_header([("x" * name_size, 1)] * count)
+                    unpadded = pfs0.HEADER.size + count * (pfs0.FILE_ENTRY.size + name_size + 1)
+                    self.assertEqual(len(header) % 0x20, 0)
+                    self.assertGreaterEqual(len(header), unpadded)
+                    self.assertLess(len(header) - unpadded, 0x20)
+
+    def test_aligned_header_is_not_padded(self) -> None:
+        # 0x10 header + 0x18 entry + 0x18 string table (23 characters and a null) = 0x40
+        header = pfs0.build_header([("x" * 23, 1)])
+        self.assertEqual(len(header), 0x40)
+        self.assertEqual(pfs0.HEADER.unpack_from(header)[2], 0x18)
+
+    def test_no_files(self) -> None:
+        header = pfs0.build_header([])
+        self.assertEqual(header, pfs0.HEADER.pack(b"PFS0", 0, 0x10, 0) + b"\x00" * 0x10)
+
+    def test_utf8_names(self) -> None:
+        header = pfs0.build_header([("é.nca", 1), ("b.nca", 1)])
+        self.assertEqual(pfs0.FILE_ENTRY.unpack_from(header, pfs0.HEADER.size + pfs0.FILE_ENTRY.size)[2], 7)
+
+
+class WritePfs0Test(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        files = [("a.nca", b"\x01" * 0x123), ("b.nca", bytearray(b"\x02" * 7)), ("c.cnmt.nca", memoryview(b"\x03"))]
+        out = io.BytesIO()
+        written = pfs0.write_pfs0(files, out)
+        data = out.getvalue()
+
+        self.assertEqual(written, len(data))
+        self.assertEqual(parse_pfs0(data), {name: bytes(x) for name, x in files})
+        self.assertEqual(len(data), len(pfs0.build_header([(name, len(x)) for name, x in files])) + 0x123 + 7 + 1)
+
+
+@unittest.skipUnless(toolchain.path("hacbrewpack"), "hacBrewPack is not installed")
+@unittest.skipUnless(Files.keys.is_file(), "prod.keys is missing")
+class HacBrewPackTest(unittest.TestCase):
+    def test_same_container_as_hacbrewpack(self) -> None:
+        from nton.pack import hacbrewpack
+
+        with tempfile.TemporaryDirectory() as t:
+            work_dir = Path(t)
+            nca_dir = work_dir / "nca"
+            nsp_dir = hacbrewpack._run(
+                get_forwarder(), Files.keys, work_dir, "--ncadir", str(nca_dir.absolute()), "--keepncadir"
+            )
+            nsp = (nsp_dir / f"{TITLE_ID}.nsp").read_bytes()
+            ncas = {nca.name: nca.read_bytes() for nca in nca_dir.glob("*.nca")}
+
+        out = io.BytesIO()
+        pfs0.write_pfs0(sorted(ncas.items()), out)
+        self.assertEqual(parse_pfs0(nsp), ncas)
+        self.assertEqual(out.getvalue(), nsp)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Startup regression tests for the CLI.
+
+Every test runs in a fresh interpreter, as the modules imported by this one say nothing
+about a cold start. Run with `python -m unittest discover tests` or pytest.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# heavy dependencies that only the commands, or the GUI, that use them may import
+HEAVY_MODULES = ("PySide6", "PIL", "cryptography", "requests", "lxml", "jsonpickle")
+
+# budget for the cumulative import time of nton.main, well above its ~30ms so it's not flaky
+IMPORT_BUDGET_US = int(os.environ.get("NTON_IMPORT_BUDGET_US") or 100_000)
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def get_imported_modules(argv: list[str]) -> set[str]:
+    """Get the top-level modules imported by running the CLI with argv."""
+    code = (
+        "import json, sys\n"
+        "from nton.main import main\n"
+        "try:\n"
+        f"    main({argv!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(json.dumps(sorted({x.split('.')[0] for x in sys.modules})), file=sys.stderr)\n"
+    )
+    res = run_python("-c", code)
+    return set(json.loads(res.stderr.strip().splitlines()[-1]))
+
+
+def get_import_time(*args: str) -> int:
+    """Get the cumulative import time of nton.main in microseconds, from `python -X importtime`."""
+    res = run_python("-X", "importtime", *args)
+    for line in res.stderr.splitlines():
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == "nton.main":
+            return int(line.split("|")[1])
+    raise AssertionError("nton.main was not imported")
+
+
+class StartupTest(unittest.TestCase):
+    def test_import_main_is_light(self) -> None:
+        res = run_python("-c", "import json, sys, nton.main; print(json.dumps(sorted(sys.modules)))")
+        imported = {x.split(".")[0] for x in json.loads(res.stdout)}
+        self.assertFalse(imported & set(HEAVY_MODULES), "nton.main imports heavy dependencies")
+
+    def test_short_invocations_are_light(self) -> None:
+        for argv in (["--version"], ["build", "--help"], ["build-batch", "--help"]):
+            with self.subTest(argv=argv):
+                imported = get_imported_modules(argv)
+                self.assertFalse(imported & set(HEAVY_MODULES), f"nton {' '.join(argv)} imports heavy dependencies")
+
+    def test_import_time_budget(self) -> None:
+        for argv in (["--version"], ["build", "--help"]):
+            with self.subTest(argv=argv):
+                import_time = get_import_time("-m", "nton", *argv)
+                self.assertLess(
+                    import_time,
+                    IMPORT_BUDGET_US,
+                    f"nton.main took {import_time / 1000:.1f}ms to import for `nton {' '.join(argv)}`, "
+                    f"over the budget of {IMPORT_BUDGET_US / 1000:.0f}ms",
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
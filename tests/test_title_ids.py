@@ -0,0 +1,240 @@
+"""
+Tests of parsing and updating the Game Title ID registry.
+
+Remote sources are swapped for a local `http.server` fixture, so no request ever
+leaves the machine.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from nton import title_ids
+from nton.title_ids import CompiledTitleIds, HttpMirrorProvider, RegistryMetadata, get_last_updated, iter_json_titles
+
+
+def tinfoil_body(titles: dict[str, str]) -> bytes:
+    """Get a response body in Tinfoil's API format."""
+    return json.dumps({"data": [{"id": title_id, "name": name} for title_id, name in titles.items()]}).encode()
+
+
+# a canned Tinfoil API response, with escapes, multi-byte UTF-8, numbers, and nested values to split chunks within
+CANNED_RESPONSE = r"""{
+  "draw": 1, "recordsTotal": 1234567890, "ratio": -12.5e-3, "flags": [true, false, null],
+  "data": [
+    {"id": "0100000000010000", "name": "Super Mario Odyssey\u2122", "size": 5721038848, "tags": {"a": [1, 2.5]}},
+    {"id": "01007EF00011E000", "name": "The Legend of Zelda: \"Breath\" of the Wild \\ \/", "release": null},
+    {"id": "0100152000022000", "name": "Mario Kart\t8 Deluxe \ud83c\udfce\ufe0f", "rating": 3},
+    {"id": "01006F8002326000", "name": "Pokémon™ ✨ ポケモン", "price": 59.99},
+    {"name": "No ID"},
+    {"id": "0100000000020000"},
+    {"id": "0100000000030000", "name": null},
+    {"id": 72057594037993472, "name": "Numeric ID"},
+    "not a title",
+    12345,
+    {"id": "0100000000040000", "name": "<a href=\"/Title/0100000000040000\">Last &amp; Least</a>"}
+  ],
+  "recordsFiltered": 987654321
+}""".encode()
+
+
+class IterJsonTitlesTest(unittest.TestCase):
+    def expected(self, document: bytes) -> list[tuple[str, str]]:
+        data = json.loads(document)["data"]
+        return [
+            (x["id"], x["name"])
+            for x in data
+            if isinstance(x, dict) and isinstance(x.get("id"), str) and isinstance(x.get("name"), str)
+        ]
+
+    def test_chunk_sizes(self) -> None:
+        expected = self.expected(CANNED_RESPONSE)
+        self.assertEqual(len(expected), 5)
+        for size in (1, 2, 3, 5, 7, 13, 64, 0x10000):
+            with self.subTest(size=size):
+                chunks = [CANNED_RESPONSE[i : i + size] for i in range(0, len(CANNED_RESPONSE), size)]
+                self.assertEqual(list(iter_json_titles(chunks)), expected)
+
+    def test_every_split(self) -> None:
+        expected = self.expected(CANNED_RESPONSE)
+        for i in range(len(CANNED_RESPONSE) + 1):
+            with self.subTest(split=i):
+                self.assertEqual(list(iter_json_titles([CANNED_RESPONSE[:i], CANNED_RESPONSE[i:]])), expected)
+
+    def test_registry_export(self) -> None:
+        document = json.dumps({"0100000000010000": "Super Mario Odyssey™", "0100000000020000": 1}).encode()
+        for size in (1, 3, len(document)):
+            with self.subTest(size=size):
+                chunks = [document[i : i + size] for i in range(0, len(document), size)]
+                self.assertEqual(list(iter_json_titles(chunks)), [("0100000000010000", "Super Mario Odyssey™")])
+
+    def test_invalid_document(self) -> None:
+        for document in (b"", b"[]", b'{"data": [{"id": "0100000000010000", "name": "Truncated'):
+            with self.subTest(document=document):
+                with self.assertRaises(ValueError):
+                    list(iter_json_titles([document]))
+
+
+class CompiledTitleIdsTest(unittest.TestCase):
+    def test_replace_while_loaded(self) -> None:
+        titles = {"0100000000010000": "Super Mario Odyssey™", "0100152000022000": "Mario Kart 8 Deluxe"}
+        with tempfile.TemporaryDirectory() as t:
+            path = Path(t) / "game_title_ids.bin"
+            title_ids.compile_game_title_ids(titles, path)
+            loaded = CompiledTitleIds(path)
+            self.assertEqual(dict(loaded), titles)
+            self.assertNotIn("0100000000020000", loaded)
+
+            # the registry holds no handle on the file, so it can be replaced or removed while loaded
+            title_ids.compile_game_title_ids({**titles, "0100000000020000": "New"}, path)
+            self.assertEqual(len(CompiledTitleIds(path)), 3)
+            path.unlink()
+            self.assertEqual(loaded["0100000000010000"], "Super Mario Odyssey™")
+
+    def test_invalid(self) -> None:
+        with tempfile.TemporaryDirectory() as t:
+            path = Path(t) / "game_title_ids.bin"
+            for data in (b"", b"NTID", b"JSON" + bytes(12), CompiledTitleIds.HEADER.pack(b"NTID", 1, 0, 1, 0)):
+                with self.subTest(data=data):
+                    path.write_bytes(data)
+                    with self.assertRaises(ValueError):
+                        CompiledTitleIds(path)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """A local HTTP server of one JSON document with an ETag, answering conditional requests with a 304."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.body = b""
+        self.etag = ""
+        self.requests: list[Optional[str]] = []  # the If-None-Match header of every request
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/titles.json"
+
+    def serve(self, body: bytes, etag: str) -> None:
+        self.body = body
+        self.etag = etag
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: FixtureServer
+
+    def do_GET(self) -> None:
+        if_none_match = self.headers.get("If-None-Match")
+        self.server.requests.append(if_none_match)
+        if if_none_match == self.server.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.server.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.server.body)))
+        self.send_header("ETag", self.server.etag)
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *_: object) -> None:
+        pass
+
+
+class UpdateGameTitleIdsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FixtureServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = requests.Session()
+        self.session.trust_env = False  # never go through a proxy to the fixture
+        self.addCleanup(self.session.close)
+
+        t = tempfile.TemporaryDirectory()
+        self.addCleanup(t.cleanup)
+        self.path = Path(t.name) / "game_title_ids.bin"
+        self.provider = HttpMirrorProvider(self.server.url)
+
+    def update(self) -> tuple:
+        update = title_ids.update_game_title_ids(self.path, [self.provider], self.session)
+        return update.modified, update.added, update.changed, update.count
+
+    def test_update(self) -> None:
+        titles = {"0100000000010000": "Super Mario Odyssey", "01007EF00011E000": "<b>Breath</b> of the Wild"}
+        body = tinfoil_body(titles)
+        self.server.serve(body, '"v1"')
+
+        # first merge
+        self.assertEqual(self.update(), (True, 2, 0, 2))
+        self.assertEqual(
+            title_ids.read_game_title_ids(self.path),
+            {"0100000000010000": "Super Mario Odyssey", "01007ef00011e000": "Breath of the Wild"},
+        )
+        (metadata,) = RegistryMetadata.load(self.path).values()
+        self.assertEqual(metadata.source, self.server.url)
+        self.assertEqual(metadata.count, 2)
+        self.assertEqual(metadata.sha256, hashlib.sha256(body).hexdigest())
+        self.assertEqual(metadata.etag, '"v1"')
+        datetime.fromisoformat(metadata.fetched_at)
+        self.assertEqual(self.server.requests, [None])
+
+        # unchanged, a 304 that does not rewrite the registry
+        registry = self.path.read_bytes()
+        os.utime(self.path, (0, 0))
+        self.assertEqual(self.update(), (False, 0, 0, 2))
+        self.assertEqual(self.server.requests, [None, '"v1"'])
+        self.assertEqual(self.path.read_bytes(), registry)
+        self.assertEqual(self.path.stat().st_mtime, 0)
+        (revalidated,) = RegistryMetadata.load(self.path).values()
+        self.assertEqual((revalidated.count, revalidated.sha256, revalidated.etag), (2, metadata.sha256, '"v1"'))
+
+        # the registry's mtime is old, but it was revalidated just now
+        self.assertEqual(get_last_updated(self.path), datetime.fromisoformat(revalidated.fetched_at).timestamp())
+
+        # a changed ETag, merging only what was added or changed, and keeping what was removed
+        body = tinfoil_body({"0100000000010000": "Super Mario Odyssey™", "0100152000022000": "Mario Kart 8 Deluxe"})
+        self.server.serve(body, '"v2"')
+        self.assertEqual(self.update(), (True, 1, 1, 3))
+        self.assertEqual(self.server.requests, [None, '"v1"', '"v1"'])
+        self.assertEqual(
+            title_ids.read_game_title_ids(self.path),
+            {
+                "0100000000010000": "Super Mario Odyssey™",
+                "01007ef00011e000": "Breath of the Wild",
+                "0100152000022000": "Mario Kart 8 Deluxe",
+            },
+        )
+        (metadata,) = RegistryMetadata.load(self.path).values()
+        self.assertEqual((metadata.count, metadata.etag), (2, '"v2"'))
+        self.assertEqual(metadata.sha256, hashlib.sha256(body).hexdigest())
+        self.assertGreaterEqual(get_last_updated(self.path), self.path.stat().st_mtime)
+
+    def test_get_last_updated_without_metadata(self) -> None:
+        self.server.serve(tinfoil_body({"0100000000010000": "Super Mario Odyssey"}), '"v1"')
+        self.update()
+        RegistryMetadata.path_for(self.path).unlink()
+        self.assertEqual(get_last_updated(self.path), self.path.stat().st_mtime)
+
+    def test_failed_source(self) -> None:
+        self.server.serve(b"", '"v1"')
+        self.server.server_close()
+        with self.assertRaises(requests.ConnectionError):
+            self.update()
+        self.assertFalse(self.path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
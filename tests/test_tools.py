@@ -0,0 +1,67 @@
+"""Tests of the runner of external tools, using the current Python interpreter as the tool."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from nton import tools
+
+# fails if another run of it is running at the same time, by holding a file exclusively for a moment
+EXCLUSIVE = (
+    "import os, sys, time; fd = os.open(sys.argv[1], os.O_CREAT | os.O_EXCL); time.sleep(0.1); os.unlink(sys.argv[1])"
+)
+
+
+def get_tool_threads() -> list[threading.Thread]:
+    return [x for x in threading.enumerate() if x.name == "nton-tools"]
+
+
+class ToolRunnerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.addCleanup(tools.configure)
+
+    def test_limit(self) -> None:
+        runner = tools.get_runner()
+        runner.configure(limit=1)
+        with tempfile.TemporaryDirectory() as t, ThreadPoolExecutor(4) as pool:
+            lock = str(Path(t) / "lock")
+            results = list(
+                pool.map(lambda _: runner.run_sync("python", [sys.executable, "-c", EXCLUSIVE, lock]), range(4))
+            )
+        self.assertEqual([x.returncode for x in results], [0] * 4)
+
+    def test_timeout(self) -> None:
+        runner = tools.get_runner()
+        runner.configure(timeout=0.1)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            runner.run_sync("python", [sys.executable, "-c", "import time; time.sleep(10)"])
+
+        runner.configure(timeout=10)
+        self.assertEqual(
+            runner.run_sync("python", [sys.executable, "-c", "import time; time.sleep(0.2)"]).returncode, 0
+        )
+
+    def test_configure_in_place(self) -> None:
+        runner = tools.get_runner()
+        runner.run_sync("python", [sys.executable, "-c", "pass"])
+        threads = get_tool_threads()
+
+        for limit in (1, 2, 3):
+            tools.configure(limit, 5)
+            self.assertIs(tools.get_runner(), runner)
+            self.assertEqual((runner.limit, runner.timeout), (limit, 5))
+            runner.run_sync("python", [sys.executable, "-c", "pass"])
+        self.assertEqual(get_tool_threads(), threads)
+
+        tools.configure()
+        self.assertEqual(runner.timeout, tools.DEFAULT_TIMEOUT)
+
+
+if __name__ == "__main__":
+    unittest.main()